@@ -2,9 +2,15 @@
 # This script queries the budget settings of a campaign via GQL.
 ################################################################
 
-import json
-import requests
-from typing import Any, List, Tuple
+import os
+import sys
+from typing import Any, Tuple
+
+# Make the shared helpers in `Python/Common` importable when running this script directly.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+
+from Common import Transport
+from Common.Transport import GqlResponse
 
 ###########
 # Constants
@@ -31,43 +37,10 @@ target_campaign_id = 'TARGET_CAMPAIGN_ID_PLACEHOLDER'
 # Helper Methods
 ################
 
-# Represents a response from the GQL server.
-class GqlResponse:
-  def __init__(self, data: dict[Any, Any], errors: List[Any]) -> None:
-    # This is where the return data from the GQL operation is stored.
-    self.data = data
-    # This is where any errors from the GQL operation are stored.
-    self.errors = errors
-
 # Executes a GQL request to the specified gql_url, using the provided body definition and associated variables.
 # This indicates if the call was successful and returns the `GqlResponse`.
 def execute_gql_request(body, variables) -> Tuple[bool, GqlResponse]:
-  # Create headers with the authorization token.
-  headers: dict[str, str] = {
-    'TTD-Auth': token
-  }
-
-  # Create a dictionary for the GraphQL request.
-  data: dict[str, Any] = {
-    'query': body,
-    'variables': variables
-  }
-
-  # Send the GraphQL request.
-  response = requests.post(url=gql_url, json=data, headers=headers)
-  content = json.loads(response.content) if len(response.content) > 0 else {}
-
-  if not response.ok:
-    print('GQL request failed!')
-    # For more verbose error messaging, uncomment the following line:
-    #print(response)
-
-  # Parse any data if it exists, otherwise, return an empty dictionary.
-  resp_data = content.get('data', {})
-  # Parse any errors if they exist, otherwise, return an empty error list.
-  errors = content.get('errors', [])
-
-  return (response.ok, GqlResponse(resp_data, errors))
+  return Transport.execute_gql_request(gql_url, token, body, variables)
 
 # Retreives the first page of budget data for a campaign.
 def retrieve_campaign_budget_data(campaign_id: str) -> dict[Any, Any]:
@@ -2,11 +2,18 @@
 # This script upgrades a given campaign's budget to Kokai.
 ##########################################################
 
-import json
+import os
 import pandas as pd
-import requests
+import sys
 from typing import Any, List, Tuple
 
+# Make the shared helpers in `Python/Common` importable when running this script directly.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+
+from Common import Transport
+from Common.Queries import UPGRADE_CAMPAIGN_BUDGET_TO_KOKAI
+from Common.Transport import GqlResponse
+
 ###########
 # Constants
 ###########
@@ -32,43 +39,10 @@ target_campaign_id = 'TARGET_CAMPAIGN_ID_PLACEHOLDER'
 # Helper Methods
 ################
 
-# Represents a response from the GQL server.
-class GqlResponse:
-  def __init__(self, data: dict[Any, Any], errors: List[Any]) -> None:
-    # This is where the return data from the GQL operation is stored.
-    self.data = data
-    # This is where any errors from the GQL operation are stored.
-    self.errors = errors
-
 # Executes a GQL request to the specified gql_url, using the provided body definition and associated variables.
 # This indicates if the call was successful and returns the `GqlResponse`.
 def execute_gql_request(body, variables) -> Tuple[bool, GqlResponse]:
-  # Create headers with the authorization token.
-  headers: dict[str, str] = {
-    'TTD-Auth': token
-  }
-
-  # Create a dictionary for the GraphQL request.
-  data: dict[str, Any] = {
-    'query': body,
-    'variables': variables
-  }
-
-  # Send the GraphQL request.
-  response = requests.post(url=gql_url, json=data, headers=headers)
-  content = json.loads(response.content) if len(response.content) > 0 else {}
-
-  if not response.ok:
-    print('GQL request failed!')
-    # For more verbose error messaging, uncomment the following line:
-    #print(response)
-
-  # Parse any data if it exists, otherwise, return an empty dictionary.
-  resp_data = content.get('data', {})
-  # Parse any errors if they exist, otherwise, return an empty error list.
-  errors = content.get('errors', [])
-
-  return (response.ok, GqlResponse(resp_data, errors))
+  return Transport.execute_gql_request(gql_url, token, body, variables)
 
 # Represents the metadata of a specified ad group flight.
 class KokaiAdGroupFlightMigrationData:
@@ -173,86 +147,36 @@ def upgrade_to_kokai_budget(campaign_id: str, campaign_flight_to_adgroup_flight_
   # Aggregate the ad group flight data into the input.
   campaign_flights = []
 
-  # Go through the dictionary and construct the `campaignFlights` input field.
+  # Go through the dictionary and construct the `campaignFlights` input field. Unset values are left out.
   for mapping in campaign_flight_to_adgroup_flight_map:
-    campaign_flight_id = mapping.campaign_flight_id
-    adgroup_flights = mapping.adgroup_flights
-
-    adgroup_flights_formatted = [
-      '{' +
-      f'adGroupId: "{flight.adgroup_id}"' +
-      (f', budgetInImpressions: {flight.budget_in_impressions}' if pd.notna(flight.budget_in_impressions) else '') +
-      (f', campaignFlightId: {flight.campaign_flight_id}' if pd.notna(flight.campaign_flight_id) else '') +
-      (f', dailyTargetInAdvertiserCurrency: {flight.daily_target_in_advertiser_currency}' if pd.notna(flight.daily_target_in_advertiser_currency) else '') +
-      (f', dailyTargetInImpressions: {flight.daily_target_in_impressions}' if pd.notna(flight.daily_target_in_impressions) else '') +
-      (f', minimumSpendInAdvertiserCurrency: {flight.minimum_spend_in_advertiser_currency}' if pd.notna(flight.minimum_spend_in_advertiser_currency) else '') +
-      '}'
-      for flight in adgroup_flights
-    ]
-    adgroup_flights_formatted = ', '.join(adgroup_flights_formatted)
-
-    # Create a formatted string of the campaign flight ID and ad group flights.
-    graphql_part = f"""
-    {{
-      campaignFlightId: {campaign_flight_id}
-      adGroupFlights: [{adgroup_flights_formatted}]
-    }}
-    """
-
-    campaign_flights.append(graphql_part)
-
-  # Combine the data of the ad group flight and campaign flight into a single query string.
-  graphql_field = "\n".join(campaign_flights)
+    adgroup_flights = []
+    for flight in mapping.adgroup_flights:
+      adgroup_flight = {
+        'adGroupId': flight.adgroup_id,
+        'budgetInImpressions': flight.budget_in_impressions,
+        'campaignFlightId': flight.campaign_flight_id,
+        'dailyTargetInAdvertiserCurrency': flight.daily_target_in_advertiser_currency,
+        'dailyTargetInImpressions': flight.daily_target_in_impressions,
+        'minimumSpendInAdvertiserCurrency': flight.minimum_spend_in_advertiser_currency
+      }
+      adgroup_flights.append({ key: value for key, value in adgroup_flight.items() if key == 'adGroupId' or pd.notna(value) })
 
-  # Define the GraphQL query.
-  query = f"""
-  mutation UpgradeCampaignBudgetToKokai($campaignId: ID!) {{
-    campaignBudgetSettingsUpdate(
-      input: {{
-        campaignId: $campaignId
-        budgetingVersion: KOKAI
-        campaignFlights: [{graphql_field}]
-      }}
-    ) {{
-      data {{
-        campaign {{
-          pacingMode
-          flights {{
-            edges {{
-              node {{
-                budgetInAdvertiserCurrency
-                dailyTargetInAdvertiserCurrency
-                startDateInclusiveUTC
-                endDateExclusiveUTC
-                id
-                adGroupFlights {{
-                  edges {{
-                    node {{
-                      adGroupId
-                      dailyTargetInAdvertiserCurrency
-                      minimumSpendInAdvertiserCurrency
-                    }}
-                  }}
-                }}
-              }}
-            }}
-          }}
-        }}
-      }}
-      userErrors {{
-        field
-        message
-      }}
-    }}
-  }}"""
+    campaign_flights.append({
+      'campaignFlightId': mapping.campaign_flight_id,
+      'adGroupFlights': adgroup_flights
+    })
 
   # Define the variables in the query.
   variables: dict[str, Any] = {
-      'campaignId': campaign_id
+    'input': {
+      'campaignId': campaign_id,
+      'budgetingVersion': 'KOKAI',
+      'campaignFlights': campaign_flights
+    }
   }
 
   # Send the GraphQL request.
-  request_success, response = execute_gql_request(query, variables)
+  request_success, response = execute_gql_request(UPGRADE_CAMPAIGN_BUDGET_TO_KOKAI, variables)
 
   if not request_success:
     print(response.errors)
@@ -2,12 +2,18 @@
 # This script calls GraphQL to create a Kokai campaign.
 ###################################################################
 
-import requests
 import pandas as pd
-import json
 import time
-from enum import Enum
-from typing import Any, List, Tuple
+from typing import Any, Tuple
+import os
+import sys
+
+# Make the shared helpers in `Python/Common` importable when running this script directly.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+
+from Common import Transport
+from Common.Batching import GqlBatcher
+from Common.Transport import GqlResponse, RestOperation, RestResponse
 
 ###########
 # Constants
@@ -21,12 +27,6 @@ PROD_GQL_URL = 'https://desk.thetradedesk.com/graphql'
 EXTERNAL_SB_REST_URL = 'https://ext-api.sb.thetradedesk.com/v3'
 PROD_REST_URL = 'https://api.thetradedesk.com/v3'
 
-# Represents the REST operation to execute.
-class RestOperation(Enum):
-  GET = 1
-  POST = 2
-  PUT = 3
-
 #############################
 # Variables for YOU to define
 #############################
@@ -56,75 +56,15 @@ seed_id = 'SEED_ID_PLACEHOLDER'
 # Helper Methods
 ################
 
-# Represents a response from the GQL server.
-class GqlResponse:
-  def __init__(self, data: dict[Any, Any], errors: List[Any]) -> None:
-    # This is where the return data from the GQL operation is stored.
-    self.data = data
-    # This is where any errors from the GQL operation are stored.
-    self.errors = errors
-
 # Executes a GQL request to the specified gql_url, using the provided body definition and associated variables.
 # This indicates if the call was successful and returns the `GqlResponse`.
 def execute_gql_request(body, variables) -> Tuple[bool, GqlResponse]:
-  # Create headers with the authorization token.
-  headers: dict[str, str] = {
-    'TTD-Auth': token
-  }
-
-  # Create a dictionary for the GraphQL request.
-  data: dict[str, Any] = {
-    'query': body,
-    'variables': variables
-  }
-
-  # Send the GraphQL request.
-  response = requests.post(url=gql_url, json=data, headers=headers)
-  content = json.loads(response.content) if len(response.content) > 0 else {}
-
-  if not response.ok:
-    print('GQL request failed!')
-    # For more verbose error messaging, uncomment the following line:
-    #print(response)
-
-  # Parse any data if it exists, otherwise, return an empty dictionary.
-  resp_data = content.get('data', {})
-  # Parse any errors if they exist, otherwise, return an empty error list.
-  errors = content.get('errors', [])
-
-  return (response.ok, GqlResponse(resp_data, errors))
-
-# Represents a response from the REST server.
-class RestResponse:
-  def __init__(self, data: Any, errors: Any) -> None:
-    # This is where the data returned from the REST operation is stored.
-    self.data = data
-    # This is where any errors from the REST operation are stored.
-    self.errors = errors
+  return Transport.execute_gql_request(gql_url, token, body, variables)
 
 # Executes a REST request to the specified `rest_url` using the provided body definition and associated variables.
 # This indicates if the call was successful and returns the `RestResponse`.
-def execute_rest_request(operation: RestOperation, url: str, body: Any) -> Tuple[bool, RestResponse]:
-  if operation == RestOperation.GET:
-    response = requests.get(url, headers = rest_headers)
-  elif operation == RestOperation.POST:
-    response = requests.post(url, headers = rest_headers, json = body)
-  elif operation == RestOperation.PUT:
-    response = requests.put(url, headers = rest_headers, json = body)
-  else:
-    raise Exception(f'Unrecognized operation type: {operation}')
-
-  # Check if the response returned a 200.
-  if response.status_code != 200:
-    error_info = response.json()
-    # For more verbose error messaging, uncomment the following line:
-    #print(error_info)
-    error_message = error_info.get('Message', 'REST call failed. No error message provided.')
-    return (False, RestResponse(None, error_message))
-  else:
-    data = response.json()
-    return (True, RestResponse(data, None))
-
+def execute_rest_request(operation: RestOperation, url: str, body: Any = None) -> Tuple[bool, RestResponse]:
+  return Transport.execute_rest_request(operation, url, rest_headers, body)
 
 # Creates a new kokai Campaign and returns the ID.
 def create_kokai_campaign(advertiser_ID, seed_ID):
@@ -238,32 +178,25 @@ def create_and_associate_adgroup(campaign_id):
       print(response.errors)
       raise Exception(f"Ad Group failed to create!'")
 
+# Looks up campaign versions by ID, coalescing up to 100 `campaign(id:)` lookups into each GraphQL request.
+campaign_batcher = GqlBatcher(execute_gql_request, 'campaign', 'version budgetMigrationStatus { currentBudgetingVersion }')
+
 # Retrieves the new campaign and returns its version along with its budgeting version.
 def get_campaign(campaign_id):
+    return get_campaigns([campaign_id])[campaign_id]
 
-    # Define the GraphQL query.
-    query = """
-        query Campaign($campaignId: ID!) {
-            campaign(id: $campaignId) {
-                version
-                budgetMigrationStatus {
-                    currentBudgetingVersion
-                }
-            }
-        }
-    """
-    # Define the variables in the query.
-    variables: dict[str, Any] = { 'campaignId': campaign_id }
+# Retrieves the given campaigns in batched requests and returns each one's budgeting version along with its version.
+def get_campaigns(campaign_ids):
+    campaigns = campaign_batcher.load_many(campaign_ids)
 
-    request_success, response = execute_gql_request(query, variables)
+    versions = {}
+    for campaign_id, campaign in campaigns.items():
+        if isinstance(campaign, Exception) or campaign is None:
+            print(campaign)
+            raise Exception("Campaign failed to be retrieved!")
+        versions[campaign_id] = (campaign['budgetMigrationStatus']['currentBudgetingVersion'], campaign['version'])
 
-    if request_success:
-        budgetingVersion = response.data['campaign']['budgetMigrationStatus']['currentBudgetingVersion']
-        version = response.data['campaign']['version']
-        return (budgetingVersion, version)
-    else:
-        print(response.errors)
-        raise Exception("Campaign failed to be retrieved!")
+    return versions
 
 #########################################################################################
 # Execution Flow:
@@ -1,12 +1,17 @@
 ##############################################################
 # This script calls REST API to create a Kokai campaign.
 ##############################################################
-import requests
 import pandas as pd
-import json
 import time
-from enum import Enum
-from typing import Any, List, Tuple
+from typing import Any, Tuple
+import os
+import sys
+
+# Make the shared helpers in `Python/Common` importable when running this script directly.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+
+from Common import Transport
+from Common.Transport import RestOperation, RestResponse
 
 ###########
 # Constants
@@ -20,12 +25,6 @@ PROD_GQL_URL = 'https://desk.thetradedesk.com/graphql'
 EXTERNAL_SB_REST_URL = 'https://ext-api.sb.thetradedesk.com/v3'
 PROD_REST_URL = 'https://api.thetradedesk.com/v3'
 
-# Represents the REST operation to execute.
-class RestOperation(Enum):
-  GET = 1
-  POST = 2
-  PUT = 3
-
 #############################
 # Variables for YOU to define
 #############################
@@ -55,37 +54,10 @@ seed_id = 'SEED_ID_PLACEHOLDER'
 # Helper Methods
 ################
 
-# Represents a response from the REST server.
-class RestResponse:
-  def __init__(self, data: Any, errors: Any) -> None:
-    # This is where the data returned from the REST operation is stored.
-    self.data = data
-    # This is where any errors from the REST operation are stored.
-    self.errors = errors
-
 # Executes a REST request to the specified `rest_url` using the provided body definition and associated variables.
 # This indicates if the call was successful and returns the `RestResponse`.
-def execute_rest_request(operation: RestOperation, url: str, body: Any) -> Tuple[bool, RestResponse]:
-  if operation == RestOperation.GET:
-    response = requests.get(url, headers = rest_headers)
-  elif operation == RestOperation.POST:
-    response = requests.post(url, headers = rest_headers, json = body)
-  elif operation == RestOperation.PUT:
-    response = requests.put(url, headers = rest_headers, json = body)
-  else:
-    raise Exception(f'Unrecognized operation type: {operation}')
-
-  # Check if the response returned a 200.
-  if response.status_code != 200:
-    error_info = response.json()
-    # For more verbose error messaging, uncomment the following line:
-    #print(error_info)
-    error_message = error_info.get('Message', 'REST call failed. No error message provided.')
-    return (False, RestResponse(None, error_message))
-  else:
-    data = response.json()
-    return (True, RestResponse(data, None))
-
+def execute_rest_request(operation: RestOperation, url: str, body: Any = None) -> Tuple[bool, RestResponse]:
+  return Transport.execute_rest_request(operation, url, rest_headers, body)
 
 # Creates a new kokai Campaign and returns the ID.
 def create_kokai_campaign(advertiser_ID, seed_ID):
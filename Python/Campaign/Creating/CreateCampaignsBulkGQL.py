@@ -6,10 +6,17 @@ from datetime import datetime
 from datetime import timezone
 from datetime import timedelta
 import json
+import os
 import random
-import requests
+import sys
 import time
-from typing import Any, List, Tuple
+from typing import Any, Tuple
+
+# Make the shared helpers in `Python/Common` importable when running this script directly.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+
+from Common import Transport
+from Common.Transport import GqlResponse
 
 ###########
 # Constants
@@ -36,43 +43,10 @@ target_advertiser_id = 'ADVERTISER_ID_PLACEHOLDER'
 # Helper Methods
 ################
 
-# Represents a response from the GQL server.
-class GqlResponse:
-  def __init__(self, data: dict[Any, Any], errors: List[Any]) -> None:
-    # This is where the return data from the GQL operation is stored.
-    self.data = data
-    # This is where any errors from the GQL operation are stored.
-    self.errors = errors
-
 # Executes a GQL request to the specified gql_url, using the provided body definition and associated variables.
 # This indicates if the call was successful and returns the `GqlResponse`.
 def execute_gql_request(body, variables) -> Tuple[bool, GqlResponse]:
-  # Create headers with the authorization token.
-  headers: dict[str, str] = {
-    'TTD-Auth': token
-  }
-
-  # Create a dictionary for the GraphQL request.
-  data: dict[str, Any] = {
-    'query': body,
-    'variables': variables
-  }
-
-  # Send the GraphQL request.
-  response = requests.post(url=gql_url, json=data, headers=headers)
-  content = json.loads(response.content) if len(response.content) > 0 else {}
-
-  if not response.ok:
-    print('GQL request failed!')
-    # For more verbose error messaging, uncomment the following line:
-    #print(response)
-
-  # Parse any data if it exists, otherwise, return an empty dictionary.
-  resp_data = content.get('data', {})
-  # Parse any errors if they exist, otherwise, return an empty error list.
-  errors = content.get('errors', [])
-
-  return (response.ok, GqlResponse(resp_data, errors))
+  return Transport.execute_gql_request(gql_url, token, body, variables)
 
 # Outlines the creation of multiple campaigns and adds them to a JSONL file.
 def create_campaigns_jsonl(advertiser_id: str) -> str:
@@ -126,7 +100,7 @@ def request_upload() -> Tuple[str, str]:
 
 # Uploads the JSONL file to the upload URL.
 def upload_file(contents: str, upload_url: str) -> None:
-  response = requests.put(url=upload_url, data=contents)
+  response = Transport.get_session('upload', upload_url).put(url=upload_url, data=contents)
   if not response.ok:
     print(f"Request failed with status code: {response.status_code}")
     print(response.text)
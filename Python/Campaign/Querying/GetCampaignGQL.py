@@ -2,9 +2,16 @@
 # This script calls GQL to get the name and version of a Campaign.
 ##################################################################
 
-import json
-import requests
-from typing import Any, List, Tuple
+import os
+import sys
+from typing import List, Tuple
+
+# Make the shared helpers in `Python/Common` importable when running this script directly.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+
+from Common import Transport
+from Common.Batching import GqlBatcher
+from Common.Transport import GqlResponse
 
 ###########
 # Constants
@@ -27,78 +34,46 @@ token = 'AUTH_TOKEN_PLACEHOLDER'
 # Replace the placeholder with the ID of the campaign you want to query.
 target_campaign_id = 'TARGET_CAMPAIGN_ID_PLACEHOLDER'
 
+# To query several campaigns at once, list their IDs here instead; they are looked up in batches and `target_campaign_id` is ignored.
+target_campaign_ids = []
+
 ################
 # Helper Methods
 ################
 
-# Represents a response from the GQL server.
-class GqlResponse:
-  def __init__(self, data: dict[Any, Any], errors: List[Any]) -> None:
-    # This is where the return data from the GQL operation is stored.
-    self.data = data
-    # This is where any errors from the GQL operation are stored.
-    self.errors = errors
-
 # Executes a GQL request to the specified gql_url, using the provided body definition and associated variables.
 # This indicates if the call was successful and returns the `GqlResponse`.
 def execute_gql_request(body, variables) -> Tuple[bool, GqlResponse]:
-  # Create headers with the authorization token.
-  headers: dict[str, str] = {
-    'TTD-Auth': token
-  }
-
-  # Create a dictionary for the GraphQL request.
-  data: dict[str, Any] = {
-    'query': body,
-    'variables': variables
-  }
+  return Transport.execute_gql_request(gql_url, token, body, variables)
 
-  # Send the GraphQL request.
-  response = requests.post(url=gql_url, json=data, headers=headers)
-  content = json.loads(response.content) if len(response.content) > 0 else {}
+# Looks up campaigns by ID, coalescing up to 100 `campaign(id:)` lookups into each GraphQL request.
+campaign_batcher = GqlBatcher(execute_gql_request, 'campaign', 'id name version')
 
-  if not response.ok:
-    print('GQL request failed!')
-    # For more verbose error messaging, uncomment the following line:
-    #print(response)
+# Queries a given campaign by ID and prints the result.
+def query_campaign(campaign_id: str) -> None:
+  query_campaigns([campaign_id])
 
-  # Parse any data if it exists, otherwise, return an empty dictionary.
-  resp_data = content.get('data', {})
-  # Parse any errors if they exist, otherwise, return an empty error list.
-  errors = content.get('errors', [])
+# Queries the given campaigns by ID, batching the lookups, and prints the results.
+# A campaign that could not be queried does not stop the others; the IDs of all of them are raised at the end.
+def query_campaigns(campaign_ids: List[str]) -> None:
+  campaigns = campaign_batcher.load_many(campaign_ids)
 
-  return (response.ok, GqlResponse(resp_data, errors))
+  failed_campaign_ids = []
+  for campaign_id, campaign in campaigns.items():
+    # If the lookup failed or returned nothing, output the error.
+    if isinstance(campaign, Exception) or campaign is None:
+      print(campaign if campaign is not None else f'Campaign ID {campaign_id} was not found.')
+      failed_campaign_ids.append(campaign_id)
+      continue
 
-# Queries a given campaign by ID and prints the result.
-def query_campaign(campaign_id: str) -> None:
-  # Define the GraphQL query.
-  query = """
-  query GetCampaign($campaignId: ID!) {
-    campaign(id: $campaignId) {
-      id
-      name
-      version
-    }
-  }"""
-
-  # Define the variables in the query.
-  variables = {
-    "campaignId": campaign_id
-  }
-
-  # Send the GraphQL request.
-  request_success, response = execute_gql_request(query, variables)
-
-  # If the call was unsuccessful, output the error.
-  if not request_success:
-    print(response.errors)
-    raise Exception(f'Could not query campaign ID {campaign_id}')
-  else:
     print('Campaign successfully queried. Data below:')
-    print(response.data)
+    print(campaign)
+
+  if len(failed_campaign_ids) > 0:
+    raise Exception(f'Could not query campaign ID(s) {", ".join(failed_campaign_ids)}')
 
 ###########################################################
 # Execution Flow:
-#  1. Query the campaign ID specified and print the result.
+#  1. Query the campaign ID(s) specified and print the results.
 ###########################################################
-query_campaign(target_campaign_id)
\ No newline at end of file
+query_campaigns(target_campaign_ids if len(target_campaign_ids) > 0 else [target_campaign_id])
\ No newline at end of file
@@ -2,10 +2,15 @@
 # This script calls REST to get the name and version of a Campaign.
 ###################################################################
 
-from enum import Enum
-import json
-import requests
-from typing import Any, List, Tuple
+import os
+import sys
+from typing import Any, Tuple
+
+# Make the shared helpers in `Python/Common` importable when running this script directly.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+
+from Common import Transport
+from Common.Transport import RestOperation, RestResponse
 
 ###########
 # Constants
@@ -15,12 +20,6 @@ from typing import Any, List, Tuple
 EXTERNAL_SB_REST_URL = 'https://ext-desk.sb.thetradedesk.com/v3'
 PROD_REST_URL = 'https://api.thetradedesk.com/v3'
 
-# Represents the REST operation to execute.
-class RestOperation(Enum):
-  GET = 1
-  POST = 2
-  PUT = 3
-
 #############################
 # Variables for YOU to define
 #############################
@@ -44,36 +43,10 @@ target_campaign_id = 'TARGET_CAMPAIGN_ID_PLACEHOLDER'
 # Helper Methods
 ################
 
-# Represents a response from the REST server.
-class RestResponse:
-  def __init__(self, data: Any, errors: Any) -> None:
-    # This is where the data returned from the REST operation is stored.
-    self.data = data
-    # This is where any errors from the REST operation are stored.
-    self.errors = errors
-
 # Executes a REST request to the specified `rest_url` using the provided body definition and associated variables.
 # This indicates if the call was successful and returns the `RestResponse`.
-def execute_rest_request(operation: RestOperation, url: str, body: Any) -> Tuple[bool, RestResponse]:
-  if operation == RestOperation.GET:
-    response = requests.get(url, headers = rest_headers)
-  elif operation == RestOperation.POST:
-    response = requests.post(url, headers = rest_headers, json = body)
-  elif operation == RestOperation.PUT:
-    response = requests.put(url, headers = rest_headers, json = body)
-  else:
-    raise Exception(f'Unrecognized operation type: {operation}')
-
-  # Check if the response returned a 200.
-  if response.status_code != 200:
-    error_info = response.json()
-    # For more verbose error messaging, uncomment the following line:
-    #print(error_info)
-    error_message = error_info.get('Message', 'REST call failed. No error message provided.')
-    return (False, RestResponse(None, error_message))
-  else:
-    data = response.json()
-    return (True, RestResponse(data, None))
+def execute_rest_request(operation: RestOperation, url: str, body: Any = None) -> Tuple[bool, RestResponse]:
+  return Transport.execute_rest_request(operation, url, rest_headers, body)
 
 # Queries a given campaign by ID and prints the result.
 def query_campaign(campaign_id: str) -> None:
@@ -2,9 +2,16 @@
 # This script upgrades a Campaign to Kokai if it's eligible and outputs a subset of verified data upon completion.
 ##################################################################################################################
 
-import json
-import requests
-from typing import Any, List, Tuple
+import os
+import sys
+from typing import List, Tuple
+
+# Make the shared helpers in `Python/Common` importable when running this script directly.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+
+from Common import Transport
+from Common.Batching import GqlBatcher, GqlLookupError
+from Common.Transport import GqlResponse
 
 ###########
 # Constants
@@ -34,76 +41,38 @@ seed_id = ''
 # Helper Methods
 ################
 
-# Represents a response from the GQL server.
-class GqlResponse:
-  def __init__(self, data: dict[Any, Any], errors: List[Any]):
-    # This is where the return data from the GQL operation is stored.
-    self.data = data
-    # This is where any errors from the GQL operation are stored.
-    self.errors = errors
-
 # Executes a GQL request to the specified gql_url, using the provided body definition and associated variables.
 # This indicates if the call was successful and returns the `GqlResponse`.
 def execute_gql_request(body, variables) -> Tuple[bool, GqlResponse]:
-  # Create headers with the authorization token..
-  headers: dict[str, str] = {
-      'TTD-Auth': token
-  }
-
-  # Create a dictionary for the GraphQL request.
-  data: dict[str, Any] = {
-      'query': body,
-      'variables': variables
-  }
-
-  # Send the GraphQL request.
-  response = requests.post(url=gql_url, json=data, headers=headers)
-  content = json.loads(response.content) if len(response.content) > 0 else {}
-
-  if not response.ok:
-    print('GQL request failed!')
-    # For more verbose error messaging, uncomment the following line:
-    #print(response)
-
-  # Parse any data if it exists, otherwise, return an empty dictionary.
-  resp_data = content.get('data', {})
-  # Parse any data if it exists, otherwise, return an empty error list.
-  errors = content.get('errors', [])
-
-  return (response.ok, GqlResponse(resp_data, errors))
+  return Transport.execute_gql_request(gql_url, token, body, variables)
+
+# Looks up campaign versions by ID, coalescing up to 100 `campaign(id:)` lookups into each GraphQL request.
+campaign_version_batcher = GqlBatcher(execute_gql_request, 'campaign', 'id version')
+
+# Determines which of the given Campaigns are eligible for upgrade to Kokai based on their versions.
+def get_campaigns_eligible_for_upgrade(campaign_ids: List[str]) -> List[str]:
+  campaigns = campaign_version_batcher.load_many(campaign_ids)
+
+  # A Campaign is eligible if it was found and is not already Kokai. A failed request fails the whole lookup, rather
+  # than making its Campaigns look ineligible.
+  eligible_campaign_ids = []
+  for campaign_id, campaign in campaigns.items():
+    if isinstance(campaign, GqlLookupError):
+      print(f"Could not read Campaign ID '{campaign_id}' version from response.")
+      print(campaign.errors)
+    elif isinstance(campaign, Exception):
+      print(campaign)
+      raise Exception(f"Campaign ID '{campaign_id}' could not be queried.") from campaign
+    elif campaign is None:
+      print(f"Could not read Campaign ID '{campaign_id}' version from response.")
+    elif campaign['version'] != 'KOKAI':
+      eligible_campaign_ids.append(campaign_id)
+
+  return eligible_campaign_ids
 
 # Determines if a given Campaign is eligible for upgrade to Kokai based on its version.
 def is_campaign_eligible_for_upgrade(campaign_id: str) -> bool:
-  # Define the GraphQL query.
-  query = """
-  query GetCampaignUpgradeCandidate($campaignId: ID!) {
-    campaign(id: $campaignId) {
-      id
-      version
-    }
-  }
-  """
-
-  # Define the variables in the query.
-  variables: dict[str, str] = {
-    'campaignId': campaign_id
-  }
-
-  # Send the GraphQL request.
-  request_success, response = execute_gql_request(query, variables)
-
-  # If the request succeeded and the Campaign is not already Kokai, it is eligible.
-  if request_success:
-    try:
-      is_kokai = response.data['campaign']['version'] == 'KOKAI'
-      return not is_kokai
-    except:
-      print("Could not read Campaign's version from response.")
-      print(response.errors)
-      return False
-  else:
-    print(response.errors)
-    raise Exception(f"Campaign ID '{campaign_id}' could not be queried.")
+  return campaign_id in get_campaigns_eligible_for_upgrade([campaign_id])
 
 # Upgrades an eligible Campaign to Kokai with an optional Seed to assign to it.
 # Returns true if upgraded, false if not.
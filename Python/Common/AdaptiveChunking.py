@@ -0,0 +1,126 @@
+###################################################################################
+# Adaptive advertiser chunk sizing for delta walks.
+# Instead of a fixed number of advertiser IDs per delta query, the chunk size is
+# tuned from the pages actually received: from one walk to the next it hill-climbs
+# towards the size with the best throughput and backs off when pages get slow or
+# large, while within a walk chunks whose query fails (e.g. on a complexity or size
+# limit) are split. Advertisers are packed by how many changes they produced
+# before, so mostly-idle advertisers share large chunks while hot ones are isolated.
+###################################################################################
+
+import threading
+from typing import Any, Dict, List
+
+import requests
+
+from .CircuitBreaker import CircuitOpenError
+
+# Chooses and tunes the size of the advertiser chunks of one delta entity type.
+class AdaptiveChunker:
+  def __init__(self, initial_size: int = 100, min_size: int = 10, max_size: int = 500, target_page_seconds: float = 10.0, max_response_bytes: int = 20 * 1024 * 1024,
+               target_records_per_chunk: int = 2000, step: float = 1.25, window: int = 4) -> None:
+    # The number of advertiser IDs per chunk, as tuned so far.
+    self.chunk_size = initial_size
+    # The bounds of the chunk size.
+    self.min_size = min_size
+    self.max_size = max_size
+    # A page slower than this, or a response larger than `max_response_bytes`, halves the chunk size.
+    self.target_page_seconds = target_page_seconds
+    self.max_response_bytes = max_response_bytes
+    # The number of changed entities a chunk is packed up to, estimated from each advertiser's activity.
+    self.target_records_per_chunk = target_records_per_chunk
+    # The factor the chunk size grows or shrinks by at each step of the hill climb.
+    self.step = step
+    # The number of full-size pages measured before each step of the hill climb.
+    self.window = window
+    # The smoothed number of changed entities per walk of each advertiser ID.
+    self.activity: Dict[str, float] = {}
+    self._direction = 1
+    self._previous_throughput = None
+    self._samples: List[float] = []
+    self._lock = threading.Lock()
+
+  # Packs advertiser IDs into chunks: each chunk holds up to `chunk_size` IDs, and is closed early once the estimated
+  # number of changes of its advertisers reaches `target_records_per_chunk`. The most active advertisers come first,
+  # so hot advertisers end up in small chunks of their own and idle ones fill large chunks.
+  def make_chunks(self, scope_ids: List[str]) -> List[List[str]]:
+    with self._lock:
+      chunk_size = self.chunk_size
+      activity = dict(self.activity)
+
+    chunks = []
+    chunk: List[str] = []
+    chunk_records = 0.0
+    # A stable sort keeps the given order among advertisers with the same activity.
+    for scope_id in sorted(scope_ids, key=lambda scope_id: -activity.get(scope_id, 0.0)):
+      chunk.append(scope_id)
+      chunk_records += activity.get(scope_id, 0.0)
+      if len(chunk) >= chunk_size or chunk_records >= self.target_records_per_chunk:
+        chunks.append(chunk)
+        chunk = []
+        chunk_records = 0.0
+
+    if len(chunk) > 0:
+      chunks.append(chunk)
+    return chunks
+
+  # Determines if a failed page query is worth retrying with fewer advertisers: a read timeout, or a GQL error
+  # response (which the delta engine raises as a plain `Exception`), as opposed to an unreachable endpoint.
+  def should_split(self, error: Exception) -> bool:
+    if isinstance(error, CircuitOpenError):
+      return False
+    return isinstance(error, requests.exceptions.ReadTimeout) or type(error) is Exception
+
+  # Splits a chunk whose query failed into two halves.
+  def split(self, scope_ids: List[str]) -> List[List[str]]:
+    middle = len(scope_ids) // 2
+    return [scope_ids[:middle], scope_ids[middle:]]
+
+  # Tunes the chunk size from one page of a chunk of `size` advertisers. The new size applies to the chunks of the
+  # next walk.
+  def observe_page(self, size: int, seconds: float, records: int, response_bytes: int, failed: bool = False) -> None:
+    with self._lock:
+      if failed or seconds > self.target_page_seconds or response_bytes > self.max_response_bytes:
+        # Halve the size of the chunk that struggled, without compounding over the other chunks of the same walk.
+        if size >= self.min_size * 2 or size > self.chunk_size:
+          self._resize(min(self.chunk_size, max(self.min_size, size // 2)))
+          self._direction = -1
+          self._previous_throughput = None
+        return
+
+      # Only full chunks of the current size measure it; smaller ones hold hot advertisers or the rest of a roster.
+      if size != self.chunk_size:
+        return
+
+      # Throughput counts both the entities received and the advertisers scanned, so idle chunks still score.
+      self._samples.append((records + size) / max(seconds, 0.001))
+      if len(self._samples) < self.window:
+        return
+
+      throughput = sum(self._samples) / len(self._samples)
+      # If the last step made things worse, step back the other way.
+      if self._previous_throughput is not None and throughput < self._previous_throughput:
+        self._direction = -self._direction
+      self._previous_throughput = throughput
+
+      new_size = self.chunk_size * self.step if self._direction > 0 else self.chunk_size / self.step
+      self._resize(min(self.max_size, max(self.min_size, round(new_size))))
+
+  def _resize(self, size: int) -> None:
+    if size != self.chunk_size:
+      print(f'Adjusting the advertiser chunk size from {self.chunk_size} to {size}.')
+    self.chunk_size = size
+    self._samples = []
+
+  # Adds the number of changed entities of each advertiser in `records` to `counts`.
+  def count_records(self, records: List[Any], counts: Dict[str, int]) -> None:
+    for record in records:
+      advertiser_id = (record.get('advertiser') or {}).get('id')
+      if advertiser_id is not None:
+        counts[advertiser_id] = counts.get(advertiser_id, 0) + 1
+
+  # Updates the activity of the advertisers of a completed chunk from the number of changed entities of each.
+  def observe_chunk(self, scope_ids: List[str], counts: Dict[str, int]) -> None:
+    with self._lock:
+      for scope_id in scope_ids:
+        self.activity[scope_id] = (self.activity.get(scope_id, 0.0) + counts.get(scope_id, 0)) / 2
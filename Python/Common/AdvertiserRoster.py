@@ -0,0 +1,120 @@
+###################################################################################
+# Local cache of each partner's advertiser IDs.
+# Enumerating a partner's advertisers pages through `advertisers` 1,000 at a time,
+# which for large partners is dozens of serial round trips before any delta query
+# can start. The roster is enumerated once, stored in a SQLite file and afterwards
+# kept current through `advertiserDelta`: new advertisers are added and archived
+# ones are dropped, usually with a single request.
+###################################################################################
+
+import sqlite3
+import time
+from typing import Any, List, Optional, Tuple
+
+from .DeltaEntities import ADVERTISER_DELTA, IDS_ONLY_PROFILE
+from .DeltaSync import DeltaSync
+from .Instrumentation import Instrumentation
+
+# Caches the advertiser IDs of partners in a SQLite file.
+class AdvertiserRoster:
+  def __init__(self, path: str, gql_url: str, token: str, max_age_seconds: float = 0, instrumentation: Optional[Instrumentation] = None) -> None:
+    # The SQLite file holding the rosters.
+    self.path = path
+    # A roster refreshed less than this many seconds ago is used as is. With 0, every use refreshes it.
+    self.max_age_seconds = max_age_seconds
+    # Walks the advertiser delta that keeps the rosters current. Only the IDs, partner and archived state are needed.
+    self.advertiser_sync = DeltaSync(gql_url, token, ADVERTISER_DELTA.get_profile(IDS_ONLY_PROFILE), instrumentation=instrumentation)
+
+    with self._connect() as connection:
+      connection.execute('CREATE TABLE IF NOT EXISTS advertiser_rosters (partner_id TEXT NOT NULL, advertiser_id TEXT NOT NULL, PRIMARY KEY (partner_id, advertiser_id))')
+      connection.execute('CREATE TABLE IF NOT EXISTS advertiser_roster_versions (partner_id TEXT PRIMARY KEY, change_tracking_version INTEGER NOT NULL, refreshed_at REAL NOT NULL)')
+
+  def _connect(self) -> sqlite3.Connection:
+    return sqlite3.connect(self.path, timeout=30)
+
+  # Returns the cached roster's change-tracking version and refresh time, or `None` if the partner is not cached yet.
+  def get_roster_version(self, partner_id: str) -> Optional[Tuple[int, float]]:
+    connection = self._connect()
+    try:
+      return connection.execute('SELECT change_tracking_version, refreshed_at FROM advertiser_roster_versions WHERE partner_id = ?', (partner_id,)).fetchone()
+    finally:
+      connection.close()
+
+  # Returns the advertiser IDs of a partner, in the order they were added to the roster, enumerating or refreshing
+  # the roster first as needed. A roster whose version the server no longer retains (it is older than the current
+  # minimum tracking version) cannot be refreshed, so it is enumerated again.
+  def get_advertiser_ids(self, partner_id: str) -> List[str]:
+    roster_version = self.get_roster_version(partner_id)
+    if roster_version is None:
+      self.load(partner_id)
+    elif time.time() - roster_version[1] >= self.max_age_seconds:
+      if roster_version[0] < self.advertiser_sync.get_current_minimum_tracking_version(partner_id):
+        print(f'The advertiser roster of partner {partner_id} is older than the retained changes. Enumerating it again.')
+        self.load(partner_id)
+      else:
+        self.refresh(partner_id, roster_version[0])
+
+    connection = self._connect()
+    try:
+      rows = connection.execute('SELECT advertiser_id FROM advertiser_rosters WHERE partner_id = ? ORDER BY rowid', (partner_id,)).fetchall()
+      return [row[0] for row in rows]
+    finally:
+      connection.close()
+
+  # Enumerates every advertiser of a partner into the roster, replacing any cached one.
+  def load(self, partner_id: str) -> None:
+    # Take the latest version before enumerating, so that the refresh below only applies the changes made while
+    # enumerating rather than every retained change.
+    change_tracking_version = self.advertiser_sync.get_latest_tracking_version(partner_id)
+    advertiser_ids = self.advertiser_sync.get_advertiser_ids(partner_id)
+
+    connection = self._connect()
+    try:
+      with connection:
+        connection.execute('DELETE FROM advertiser_rosters WHERE partner_id = ?', (partner_id,))
+        connection.executemany('INSERT OR IGNORE INTO advertiser_rosters (partner_id, advertiser_id) VALUES (?, ?)', [(partner_id, advertiser_id) for advertiser_id in advertiser_ids])
+    finally:
+      connection.close()
+
+    self.refresh(partner_id, change_tracking_version)
+
+  # Applies the advertiser changes since `change_tracking_version` to a partner's roster.
+  def refresh(self, partner_id: str, change_tracking_version: int) -> None:
+    added = 0
+    removed = 0
+    for page in self.advertiser_sync.iter_pages(partner_id, change_tracking_version):
+      added_page, removed_page = self.apply_changes(partner_id, page.records)
+      added += added_page
+      removed += removed_page
+
+    connection = self._connect()
+    try:
+      with connection:
+        connection.execute('INSERT OR REPLACE INTO advertiser_roster_versions (partner_id, change_tracking_version, refreshed_at) VALUES (?, ?, ?)',
+                           (partner_id, self.advertiser_sync.next_change_tracking_version, time.time()))
+    finally:
+      connection.close()
+
+    print(f'Refreshed the advertiser roster of partner {partner_id}: {added} added, {removed} removed.')
+
+  # Adds the changed advertisers of a partner to its roster, or drops them if they were archived or moved to another
+  # partner. Returns the number of advertisers added and removed.
+  def apply_changes(self, partner_id: str, advertisers: List[Any]) -> Tuple[int, int]:
+    removed_ids = []
+    added_ids = []
+    for advertiser in advertisers:
+      advertiser_partner_id = (advertiser.get('partner') or {}).get('id', partner_id)
+      if advertiser.get('isArchived') or advertiser_partner_id != partner_id:
+        removed_ids.append(advertiser['id'])
+      else:
+        added_ids.append(advertiser['id'])
+
+    connection = self._connect()
+    try:
+      with connection:
+        removed = connection.executemany('DELETE FROM advertiser_rosters WHERE partner_id = ? AND advertiser_id = ?', [(partner_id, advertiser_id) for advertiser_id in removed_ids]).rowcount
+        added = connection.executemany('INSERT OR IGNORE INTO advertiser_rosters (partner_id, advertiser_id) VALUES (?, ?)', [(partner_id, advertiser_id) for advertiser_id in added_ids]).rowcount
+    finally:
+      connection.close()
+
+    return (added, removed)
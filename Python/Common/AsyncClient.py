@@ -0,0 +1,60 @@
+##################################################################################
+# asyncio client for the GraphQL and REST Platform APIs.
+# Requests run on the shared pooled transport in worker threads, so they reuse the
+# same keep-alive connections as the synchronous helpers. A semaphore bounds how
+# many requests are in flight at once. Each client has its own thread pool with a
+# thread per concurrent request, as the default executor of the event loop is
+# capped at min(32, CPU count + 4) threads.
+##################################################################################
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, List, Tuple
+
+from . import Transport
+from .Transport import GqlResponse, RestOperation, RestResponse
+
+# Issues GQL and REST requests concurrently, with at most `max_concurrency` requests in flight.
+class AsyncClient:
+  def __init__(self, gql_url: str, token: str, rest_headers: dict[str, str] = None, max_concurrency: int = 10) -> None:
+    # The GraphQL Platform API endpoint URL to send GQL requests to.
+    self.gql_url = gql_url
+    # The API token used to authorize the requests.
+    self.token = token
+    # The headers to pass as part of the REST requests.
+    self.rest_headers = rest_headers if rest_headers is not None else { 'TTD-Auth': token, 'Content-Type': 'application/json' }
+    # The maximum number of requests in flight at once.
+    self.max_concurrency = max_concurrency
+    self._semaphore = asyncio.Semaphore(max_concurrency)
+    # The threads the requests run on, one per concurrent request.
+    self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix='AsyncClient')
+
+    # Make sure the connection pool can hold a keep-alive connection for every concurrent request.
+    if Transport.pool_maxsize < max_concurrency:
+      Transport.configure_pool(maxsize=max_concurrency)
+
+  # Executes a GQL request, waiting for a free concurrency slot first.
+  # This indicates if the call was successful and returns the `GqlResponse`.
+  async def execute_gql_request(self, body: str, variables: dict[str, Any], idempotent: bool = None) -> Tuple[bool, GqlResponse]:
+    async with self._semaphore:
+      return await asyncio.get_running_loop().run_in_executor(self._executor, Transport.execute_gql_request, self.gql_url, self.token, body, variables, idempotent)
+
+  # Executes a REST request, waiting for a free concurrency slot first.
+  # This indicates if the call was successful and returns the `RestResponse`.
+  async def execute_rest_request(self, operation: RestOperation, url: str, body: Any = None, idempotent: bool = None) -> Tuple[bool, RestResponse]:
+    async with self._semaphore:
+      return await asyncio.get_running_loop().run_in_executor(self._executor, Transport.execute_rest_request, operation, url, self.rest_headers, body, idempotent)
+
+  # Executes many independent GQL requests concurrently. Each entry is a `(body, variables)` pair.
+  # Results are returned in the same order as the requests.
+  async def execute_gql_requests(self, requests: List[Tuple[str, dict[str, Any]]]) -> List[Tuple[bool, GqlResponse]]:
+    return await asyncio.gather(*[self.execute_gql_request(body, variables) for body, variables in requests])
+
+  # Executes many independent REST requests concurrently. Each entry is an `(operation, url, body)` tuple.
+  # Results are returned in the same order as the requests.
+  async def execute_rest_requests(self, requests: List[Tuple[RestOperation, str, Any]]) -> List[Tuple[bool, RestResponse]]:
+    return await asyncio.gather(*[self.execute_rest_request(operation, url, body) for operation, url, body in requests])
+
+  # Stops the threads of the client once the requests in flight have finished.
+  def close(self) -> None:
+    self._executor.shutdown(wait=True)
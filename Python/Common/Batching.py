@@ -0,0 +1,130 @@
+###################################################################################
+# DataLoader-style batching of single-entity GQL lookups.
+# Lookups such as `campaign(id: ...)` that are issued close together are coalesced
+# into one aliased document (`e0: campaign(id: $id0) {...} e1: ...`) and the
+# results are fanned back out to each caller, turning N round trips into N/100.
+###################################################################################
+
+from concurrent.futures import Future
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Tuple
+
+from .Transport import GqlResponse
+
+# Raised for a lookup that the response of its batch reported errors for, e.g. an unknown ID, as opposed to a batch
+# whose request failed as a whole.
+class GqlLookupError(Exception):
+  def __init__(self, message: str, errors: List[Any]) -> None:
+    super().__init__(message)
+    # The errors the response reported for the lookup.
+    self.errors = errors
+
+# Coalesces lookups of a single root field by ID into aliased GQL documents.
+class GqlBatcher:
+  def __init__(self, execute: Callable[[str, dict[str, Any]], Tuple[bool, GqlResponse]], root_field: str, selection: str, id_type: str = 'ID!', max_batch_size: int = 100, window_seconds: float = 0.01) -> None:
+    # The function used to send the documents, e.g. a script's `execute_gql_request`.
+    self.execute = execute
+    # The root field looked up by ID, e.g. `campaign`.
+    self.root_field = root_field
+    # The selection set requested for each entity, e.g. `id name version`.
+    self.selection = selection
+    # The GraphQL type of the `id` argument.
+    self.id_type = id_type
+    # The maximum number of aliased lookups per document.
+    self.max_batch_size = max_batch_size
+    # How long `load` waits for further lookups before sending a batch.
+    self.window_seconds = window_seconds
+
+    self._documents: dict[int, str] = {}
+    self._pending: List[Tuple[str, Future]] = []
+    self._timer = None
+    self._lock = threading.Lock()
+
+  # Returns the aliased document for a batch of the given size. Documents are cached, so each size is built once.
+  def get_document(self, size: int) -> str:
+    document = self._documents.get(size)
+    if document is None:
+      arguments = ', '.join(f'$id{i}: {self.id_type}' for i in range(size))
+      lookups = '\n'.join(f'  e{i}: {self.root_field}(id: $id{i}) {{ {self.selection} }}' for i in range(size))
+      document = f'query Batch_{self.root_field}({arguments}) {{\n{lookups}\n}}'
+      self._documents[size] = document
+    return document
+
+  # Looks up many IDs right away, in as few documents as `max_batch_size` allows.
+  # Returns, for each ID, the entity (`None` if it was not found) or the exception its lookup failed with, so that one
+  # failed lookup (e.g. of an unknown ID) does not fail the others. Lookups the response reported errors for fail with
+  # a `GqlLookupError`; those of a batch whose request failed fail with the request's error.
+  def load_many(self, ids: Iterable[str]) -> Dict[str, Any]:
+    unique_ids = list(dict.fromkeys(ids))
+    results: Dict[str, Any] = {}
+
+    for start in range(0, len(unique_ids), self.max_batch_size):
+      batch = unique_ids[start:start + self.max_batch_size]
+      futures = [(id, Future()) for id in batch]
+      self._dispatch(futures)
+      for id, future in futures:
+        error = future.exception()
+        results[id] = error if error is not None else future.result()
+
+    return results
+
+  # Queues a lookup that is sent together with any others issued within `window_seconds`, or as soon as
+  # `max_batch_size` lookups are queued. Returns a future resolving to the entity (`None` if not found).
+  def load(self, id: str) -> Future:
+    future = Future()
+    batch = None
+
+    with self._lock:
+      self._pending.append((id, future))
+      if len(self._pending) >= self.max_batch_size:
+        batch = self._take_pending()
+      elif self._timer is None:
+        self._timer = threading.Timer(self.window_seconds, self.flush)
+        self._timer.daemon = True
+        self._timer.start()
+
+    if batch:
+      self._dispatch(batch)
+    return future
+
+  # Sends any queued lookups immediately.
+  def flush(self) -> None:
+    with self._lock:
+      batch = self._take_pending()
+    if batch:
+      self._dispatch(batch)
+
+  def _take_pending(self) -> List[Tuple[str, Future]]:
+    batch = self._pending
+    self._pending = []
+    if self._timer is not None:
+      self._timer.cancel()
+      self._timer = None
+    return batch
+
+  # Sends one aliased document for the batch and resolves each lookup's future.
+  def _dispatch(self, batch: List[Tuple[str, Future]]) -> None:
+    variables = { f'id{i}': id for i, (id, _) in enumerate(batch) }
+
+    try:
+      request_success, response = self.execute(self.get_document(len(batch)), variables)
+    except Exception as error:
+      for _, future in batch:
+        future.set_exception(error)
+      return
+
+    # Errors from individual lookups carry their alias as the first element of `path`.
+    errors_by_alias: dict[str, List[Any]] = {}
+    for error in response.errors:
+      path = error.get('path') if isinstance(error, dict) else None
+      errors_by_alias.setdefault(path[0] if path else None, []).append(error)
+
+    for i, (id, future) in enumerate(batch):
+      alias = f'e{i}'
+      data = response.data.get(alias) if response.data else None
+      if not request_success and data is None:
+        future.set_exception(Exception(f'Failed to look up {self.root_field} {id}: {response.errors}'))
+      elif data is None and alias in errors_by_alias:
+        future.set_exception(GqlLookupError(f'Failed to look up {self.root_field} {id}: {errors_by_alias[alias]}', errors_by_alias[alias]))
+      else:
+        future.set_result(data)
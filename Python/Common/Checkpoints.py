@@ -0,0 +1,183 @@
+###################################################################################
+# Durable checkpoints and watermarks for delta walks.
+# A SQLite file records, per partner and entity type, the chunks of the current
+# walk along with the last `nextChangeTrackingVersion` whose page has been handed
+# to the caller. If a walk dies part-way, a resumed walk continues every chunk from
+# its checkpoint instead of refetching everything from the starting version.
+# The same progress is also kept per advertiser (the watermark), so an incremental
+# walk can ask each advertiser only for the changes since its own last version.
+###################################################################################
+
+import hashlib
+import sqlite3
+import time
+from typing import List, Optional, Tuple
+
+# Returns the key a chunk of advertiser (or partner) IDs is checkpointed under.
+def get_chunk_key(scope_ids: List[str]) -> str:
+  return hashlib.sha1(','.join(scope_ids).encode('utf-8')).hexdigest()
+
+# The checkpoint of one chunk of a walk.
+class ChunkCheckpoint:
+  def __init__(self, chunk_index: int, scope_ids: List[str], change_tracking_version: int, completed: bool) -> None:
+    # The index of the chunk within the walk. The parts of a split chunk share the index of the chunk they replaced.
+    self.chunk_index = chunk_index
+    # The advertiser (or partner) IDs of the chunk.
+    self.scope_ids = scope_ids
+    # The version to query the chunk's next page with.
+    self.change_tracking_version = change_tracking_version
+    # Whether the chunk has no more pages.
+    self.completed = completed
+
+# Stores the progress of delta walks in a SQLite file.
+class CheckpointStore:
+  def __init__(self, path: str) -> None:
+    # The SQLite file holding the checkpoints.
+    self.path = path
+
+    with self._connect() as connection:
+      connection.execute('CREATE TABLE IF NOT EXISTS delta_runs (partner_id TEXT NOT NULL, entity TEXT NOT NULL, minimum_tracking_version INTEGER NOT NULL, next_change_tracking_version INTEGER, completed INTEGER NOT NULL, updated_at REAL NOT NULL, PRIMARY KEY (partner_id, entity))')
+      connection.execute('CREATE TABLE IF NOT EXISTS delta_chunk_checkpoints (partner_id TEXT NOT NULL, entity TEXT NOT NULL, chunk_key TEXT NOT NULL, chunk_index INTEGER NOT NULL, scope_ids TEXT NOT NULL, change_tracking_version INTEGER NOT NULL, completed INTEGER NOT NULL, updated_at REAL NOT NULL, PRIMARY KEY (partner_id, entity, chunk_key))')
+      connection.execute('CREATE TABLE IF NOT EXISTS delta_activity (partner_id TEXT NOT NULL, entity TEXT NOT NULL, scope_id TEXT NOT NULL, records REAL NOT NULL, PRIMARY KEY (partner_id, entity, scope_id))')
+      connection.execute('CREATE TABLE IF NOT EXISTS delta_chunk_sizes (partner_id TEXT NOT NULL, entity TEXT NOT NULL, chunk_size INTEGER NOT NULL, PRIMARY KEY (partner_id, entity))')
+      connection.execute('CREATE TABLE IF NOT EXISTS delta_watermarks (partner_id TEXT NOT NULL, entity TEXT NOT NULL, scope_id TEXT NOT NULL, change_tracking_version INTEGER NOT NULL, updated_at REAL NOT NULL, PRIMARY KEY (partner_id, entity, scope_id))')
+
+  def _connect(self) -> sqlite3.Connection:
+    return sqlite3.connect(self.path, timeout=30)
+
+  # Records the start of a new walk from `minimum_tracking_version` over the given (IDs, starting version) chunks,
+  # discarding the chunk checkpoints of any previous walk.
+  def start_run(self, partner_id: str, entity: str, minimum_tracking_version: int, chunks: List[Tuple[List[str], int]]) -> None:
+    now = time.time()
+    connection = self._connect()
+    try:
+      with connection:
+        connection.execute('DELETE FROM delta_chunk_checkpoints WHERE partner_id = ? AND entity = ?', (partner_id, entity))
+        connection.executemany('INSERT INTO delta_chunk_checkpoints (partner_id, entity, chunk_key, chunk_index, scope_ids, change_tracking_version, completed, updated_at) VALUES (?, ?, ?, ?, ?, ?, 0, ?)',
+                               [(partner_id, entity, get_chunk_key(scope_ids), chunk_index, ','.join(scope_ids), version, now) for chunk_index, (scope_ids, version) in enumerate(chunks)])
+        connection.execute('INSERT OR REPLACE INTO delta_runs (partner_id, entity, minimum_tracking_version, next_change_tracking_version, completed, updated_at) VALUES (?, ?, ?, NULL, 0, ?)',
+                           (partner_id, entity, minimum_tracking_version, now))
+    finally:
+      connection.close()
+
+  # Returns the starting version of the walk that was started but never completed, or `None` if there is none.
+  def get_incomplete_run(self, partner_id: str, entity: str) -> Optional[int]:
+    connection = self._connect()
+    try:
+      row = connection.execute('SELECT minimum_tracking_version FROM delta_runs WHERE partner_id = ? AND entity = ? AND completed = 0', (partner_id, entity)).fetchone()
+      return row[0] if row is not None else None
+    finally:
+      connection.close()
+
+  # Returns the version to start the next walk from, as recorded by the last completed walk, or `None` if there is none.
+  def get_completed_version(self, partner_id: str, entity: str) -> Optional[int]:
+    connection = self._connect()
+    try:
+      row = connection.execute('SELECT next_change_tracking_version FROM delta_runs WHERE partner_id = ? AND entity = ? AND completed = 1', (partner_id, entity)).fetchone()
+      return row[0] if row is not None else None
+    finally:
+      connection.close()
+
+  # Returns the checkpoints of the chunks of the current walk, in chunk order. The parts of a split chunk share its
+  # index and come in the order they were split into.
+  def get_chunk_checkpoints(self, partner_id: str, entity: str) -> List[ChunkCheckpoint]:
+    connection = self._connect()
+    try:
+      rows = connection.execute('SELECT chunk_index, scope_ids, change_tracking_version, completed FROM delta_chunk_checkpoints WHERE partner_id = ? AND entity = ? ORDER BY chunk_index, rowid', (partner_id, entity)).fetchall()
+      return [ChunkCheckpoint(chunk_index, scope_ids.split(','), version, bool(completed)) for chunk_index, scope_ids, version, completed in rows]
+    finally:
+      connection.close()
+
+  # Records that a chunk's pages have been processed up to `change_tracking_version`, and whether it has no more pages.
+  # The watermark of every advertiser (or partner) of the chunk moves to that version as well.
+  def save_chunk_checkpoint(self, partner_id: str, entity: str, scope_ids: List[str], change_tracking_version: int, completed: bool) -> None:
+    now = time.time()
+    connection = self._connect()
+    try:
+      with connection:
+        connection.execute('UPDATE delta_chunk_checkpoints SET change_tracking_version = ?, completed = ?, updated_at = ? WHERE partner_id = ? AND entity = ? AND chunk_key = ?',
+                           (change_tracking_version, int(completed), now, partner_id, entity, get_chunk_key(scope_ids)))
+        connection.executemany('INSERT OR REPLACE INTO delta_watermarks (partner_id, entity, scope_id, change_tracking_version, updated_at) VALUES (?, ?, ?, ?, ?)',
+                               [(partner_id, entity, scope_id, change_tracking_version, now) for scope_id in scope_ids])
+    finally:
+      connection.close()
+
+  # Replaces the checkpoint of a chunk that was split part-way by the checkpoints of its parts, all continuing from
+  # `change_tracking_version`.
+  def split_chunk(self, partner_id: str, entity: str, chunk_index: int, scope_ids: List[str], parts: List[List[str]], change_tracking_version: int) -> None:
+    now = time.time()
+    connection = self._connect()
+    try:
+      with connection:
+        connection.execute('DELETE FROM delta_chunk_checkpoints WHERE partner_id = ? AND entity = ? AND chunk_key = ?', (partner_id, entity, get_chunk_key(scope_ids)))
+        connection.executemany('INSERT OR REPLACE INTO delta_chunk_checkpoints (partner_id, entity, chunk_key, chunk_index, scope_ids, change_tracking_version, completed, updated_at) VALUES (?, ?, ?, ?, ?, ?, 0, ?)',
+                               [(partner_id, entity, get_chunk_key(part), chunk_index, ','.join(part), change_tracking_version, now) for part in parts])
+    finally:
+      connection.close()
+
+  # Records that the current walk has completed, along with the version to start the next walk from.
+  def complete_run(self, partner_id: str, entity: str, next_change_tracking_version: int) -> None:
+    connection = self._connect()
+    try:
+      with connection:
+        connection.execute('UPDATE delta_runs SET next_change_tracking_version = ?, completed = 1, updated_at = ? WHERE partner_id = ? AND entity = ?',
+                           (next_change_tracking_version, time.time(), partner_id, entity))
+    finally:
+      connection.close()
+
+  # Returns the watermark of every advertiser (or partner) walked so far, as an ID to version dictionary.
+  def get_watermarks(self, partner_id: str, entity: str) -> dict[str, int]:
+    connection = self._connect()
+    try:
+      rows = connection.execute('SELECT scope_id, change_tracking_version FROM delta_watermarks WHERE partner_id = ? AND entity = ?', (partner_id, entity)).fetchall()
+      return dict(rows)
+    finally:
+      connection.close()
+
+  # Stores the watermark of every advertiser (or partner) in `watermarks`, an ID to version dictionary.
+  def save_watermarks(self, partner_id: str, entity: str, watermarks: dict[str, int]) -> None:
+    now = time.time()
+    connection = self._connect()
+    try:
+      with connection:
+        connection.executemany('INSERT OR REPLACE INTO delta_watermarks (partner_id, entity, scope_id, change_tracking_version, updated_at) VALUES (?, ?, ?, ?, ?)',
+                               [(partner_id, entity, scope_id, version, now) for scope_id, version in watermarks.items()])
+    finally:
+      connection.close()
+
+  # Returns the activity (smoothed number of changed entities per walk) of every advertiser walked so far.
+  def get_activity(self, partner_id: str, entity: str) -> dict[str, float]:
+    connection = self._connect()
+    try:
+      rows = connection.execute('SELECT scope_id, records FROM delta_activity WHERE partner_id = ? AND entity = ?', (partner_id, entity)).fetchall()
+      return dict(rows)
+    finally:
+      connection.close()
+
+  # Stores the activity of the given advertisers.
+  def save_activity(self, partner_id: str, entity: str, activity: dict[str, float]) -> None:
+    connection = self._connect()
+    try:
+      with connection:
+        connection.executemany('INSERT OR REPLACE INTO delta_activity (partner_id, entity, scope_id, records) VALUES (?, ?, ?, ?)',
+                               [(partner_id, entity, scope_id, records) for scope_id, records in activity.items()])
+    finally:
+      connection.close()
+
+  # Returns the advertiser chunk size tuned by previous walks, or `None` if there is none.
+  def get_chunk_size(self, partner_id: str, entity: str) -> Optional[int]:
+    connection = self._connect()
+    try:
+      row = connection.execute('SELECT chunk_size FROM delta_chunk_sizes WHERE partner_id = ? AND entity = ?', (partner_id, entity)).fetchone()
+      return row[0] if row is not None else None
+    finally:
+      connection.close()
+
+  # Stores the advertiser chunk size for the next walk.
+  def save_chunk_size(self, partner_id: str, entity: str, chunk_size: int) -> None:
+    connection = self._connect()
+    try:
+      with connection:
+        connection.execute('INSERT OR REPLACE INTO delta_chunk_sizes (partner_id, entity, chunk_size) VALUES (?, ?, ?)', (partner_id, entity, chunk_size))
+    finally:
+      connection.close()
@@ -0,0 +1,115 @@
+###################################################################################
+# Per-endpoint circuit breakers for the shared transport.
+# After a run of consecutive failures (connection errors, timeouts, gateway errors)
+# the breaker of that base URL opens and requests to it fail immediately with a
+# `CircuitOpenError` instead of each waiting out a full timeout. Once the cool-down
+# has passed, a limited number of probe requests are let through (half-open); a
+# successful probe closes the breaker again, a failed one reopens it.
+###################################################################################
+
+import threading
+import time
+from typing import Optional
+
+# Status codes that indicate the endpoint itself is unhealthy. Throttling (429) is not counted.
+FAILURE_STATUS_CODES = (500, 502, 503, 504)
+
+# The states a circuit breaker can be in.
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+# Raised instead of sending a request while the breaker of its endpoint is open.
+class CircuitOpenError(Exception):
+  def __init__(self, base_url: str, retry_in_seconds: float) -> None:
+    super().__init__(f'The circuit breaker for {base_url} is open after repeated failures. Retry in {retry_in_seconds:.1f}s.')
+    # The base URL whose breaker is open.
+    self.base_url = base_url
+    # The number of seconds until the breaker lets a probe request through.
+    self.retry_in_seconds = retry_in_seconds
+
+# Tracks the health of one endpoint.
+class CircuitBreaker:
+  def __init__(self, base_url: str, failure_threshold: int = 5, reset_timeout_seconds: float = 30.0, half_open_max_probes: int = 1) -> None:
+    # The base URL (scheme and host) this breaker guards.
+    self.base_url = base_url
+    # The number of consecutive failures that opens the breaker.
+    self.failure_threshold = failure_threshold
+    # How long the breaker stays open before letting probe requests through.
+    self.reset_timeout_seconds = reset_timeout_seconds
+    # The number of probe requests allowed in flight while half-open.
+    self.half_open_max_probes = half_open_max_probes
+    self.state = CLOSED
+    self.consecutive_failures = 0
+    self._opened_at = 0.0
+    self._probes_in_flight = 0
+    self._lock = threading.Lock()
+
+  # Checks that a request may be sent, raising `CircuitOpenError` if the breaker is open.
+  def before_request(self) -> None:
+    with self._lock:
+      if self.state == OPEN:
+        remaining = self._opened_at + self.reset_timeout_seconds - time.monotonic()
+        if remaining > 0:
+          raise CircuitOpenError(self.base_url, remaining)
+        self.state = HALF_OPEN
+        self._probes_in_flight = 0
+
+      if self.state == HALF_OPEN:
+        if self._probes_in_flight >= self.half_open_max_probes:
+          raise CircuitOpenError(self.base_url, 0)
+        self._probes_in_flight += 1
+
+  # Records a request that reached a healthy endpoint, closing the breaker.
+  def record_success(self) -> None:
+    with self._lock:
+      if self.state != CLOSED:
+        print(f'Circuit breaker for {self.base_url} closed.')
+      self.state = CLOSED
+      self.consecutive_failures = 0
+      self._probes_in_flight = 0
+
+  # Records a failed request, opening the breaker once the threshold is reached or if a probe failed.
+  def record_failure(self) -> None:
+    with self._lock:
+      self.consecutive_failures += 1
+      if self.state == HALF_OPEN or (self.state == CLOSED and self.consecutive_failures >= self.failure_threshold):
+        print(f'Circuit breaker for {self.base_url} opened after {self.consecutive_failures} consecutive failure(s).')
+        self.state = OPEN
+        self._opened_at = time.monotonic()
+        self._probes_in_flight = 0
+
+# Holds one circuit breaker per base URL, all created with the same settings.
+class CircuitBreakers:
+  def __init__(self, failure_threshold: int = 5, reset_timeout_seconds: float = 30.0, half_open_max_probes: int = 1, failure_status_codes: tuple = FAILURE_STATUS_CODES) -> None:
+    # The number of consecutive failures that opens a breaker. Set to 0 to disable circuit breaking.
+    self.failure_threshold = failure_threshold
+    # How long a breaker stays open before letting probe requests through.
+    self.reset_timeout_seconds = reset_timeout_seconds
+    # The number of probe requests allowed in flight while half-open.
+    self.half_open_max_probes = half_open_max_probes
+    # The response status codes that count as failures.
+    self.failure_status_codes = failure_status_codes
+    self._breakers: dict[str, CircuitBreaker] = {}
+    self._lock = threading.Lock()
+
+  # Returns the breaker for the given base URL, creating it on first use, or `None` if circuit breaking is disabled.
+  def get_breaker(self, base_url: str) -> Optional[CircuitBreaker]:
+    if self.failure_threshold <= 0:
+      return None
+
+    with self._lock:
+      breaker = self._breakers.get(base_url)
+      if breaker is None:
+        breaker = CircuitBreaker(base_url, self.failure_threshold, self.reset_timeout_seconds, self.half_open_max_probes)
+        self._breakers[base_url] = breaker
+      return breaker
+
+  # Determines if a response status code counts as a failure of its endpoint.
+  def is_failure(self, status_code: int) -> bool:
+    return status_code in self.failure_status_codes
+
+  # Closes every breaker, e.g. after an outage is known to be over.
+  def reset(self) -> None:
+    with self._lock:
+      self._breakers.clear()
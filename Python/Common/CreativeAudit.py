@@ -0,0 +1,134 @@
+###################################################################################
+# Compact in-memory model of creative delta records.
+# Every creative of a delta carries the same handful of audit status structures,
+# and as nested dicts each creative holds its own copy of them. Here a creative is
+# a slotted object whose audit statuses are shared: each distinct status (feedback,
+# status and enum), and each distinct list of statuses, exists once no matter how
+# many creatives have it. Audit status counts per advertiser are computed once per
+# distinct status list rather than once per creative.
+###################################################################################
+
+import sys
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from .Sinks import DeltaSink
+
+# The audit status of a creative with one supply vendor (or supply vendor publisher). Instances are shared.
+class AuditStatus:
+  __slots__ = ('audit_feedback', 'audit_status', 'audit_status_enum')
+
+  def __init__(self, audit_feedback: Optional[str], audit_status: Optional[str], audit_status_enum: Optional[str]) -> None:
+    self.audit_feedback = audit_feedback
+    self.audit_status = audit_status
+    self.audit_status_enum = audit_status_enum
+
+  def to_dict(self) -> dict[str, Any]:
+    return { 'auditFeedback': self.audit_feedback, 'auditStatus': self.audit_status, 'auditStatusEnum': self.audit_status_enum }
+
+# One creative of a creative delta.
+class CreativeAudit:
+  __slots__ = ('id', 'advertiser_id', 'name', 'created_at', 'last_updated_at', 'supply_vendor_audit_statuses', 'supply_vendor_publisher_audit_statuses')
+
+  def __init__(self, id: str, advertiser_id: Optional[str], name: Optional[str], created_at: Optional[str], last_updated_at: Optional[str],
+               supply_vendor_audit_statuses: Tuple[AuditStatus, ...], supply_vendor_publisher_audit_statuses: Tuple[AuditStatus, ...]) -> None:
+    self.id = id
+    self.advertiser_id = advertiser_id
+    self.name = name
+    self.created_at = created_at
+    self.last_updated_at = last_updated_at
+    # The shared tuples of audit statuses.
+    self.supply_vendor_audit_statuses = supply_vendor_audit_statuses
+    self.supply_vendor_publisher_audit_statuses = supply_vendor_publisher_audit_statuses
+
+  # Returns the creative in the shape of a `creativeDelta` record.
+  def to_dict(self) -> dict[str, Any]:
+    return {
+      'advertiser': { 'id': self.advertiser_id },
+      'id': self.id,
+      'name': self.name,
+      'createdAt': self.created_at,
+      'lastUpdatedAt': self.last_updated_at,
+      'auditStatuses': {
+        'supplyVendorAuditStatuses': [status.to_dict() for status in self.supply_vendor_audit_statuses],
+        'supplyVendorPublisherAuditStatuses': [status.to_dict() for status in self.supply_vendor_publisher_audit_statuses]
+      }
+    }
+
+# Holds the latest state of every creative seen in creative delta records, by creative ID.
+class CreativeAuditModel:
+  def __init__(self) -> None:
+    self.creatives: Dict[str, CreativeAudit] = {}
+    self._statuses: Dict[Tuple[Optional[str], Optional[str], Optional[str]], AuditStatus] = {}
+    self._status_lists: Dict[Tuple[AuditStatus, ...], Tuple[AuditStatus, ...]] = {}
+    self._status_counts: Dict[int, Dict[str, int]] = {}
+
+  def __len__(self) -> int:
+    return len(self.creatives)
+
+  def __iter__(self) -> Iterator[CreativeAudit]:
+    return iter(self.creatives.values())
+
+  # Returns the shared instance of a string that repeats across creatives, such as an advertiser ID or an enum.
+  def _intern(self, value: Optional[str]) -> Optional[str]:
+    return sys.intern(value) if isinstance(value, str) else value
+
+  # Returns the shared tuple of audit statuses for a list of `auditStatuses` entries.
+  def _intern_statuses(self, statuses: Optional[List[Any]]) -> Tuple[AuditStatus, ...]:
+    interned = []
+    for status in statuses or []:
+      key = (status.get('auditFeedback'), status.get('auditStatus'), status.get('auditStatusEnum'))
+      audit_status = self._statuses.get(key)
+      if audit_status is None:
+        audit_status = AuditStatus(*(self._intern(value) for value in key))
+        self._statuses[key] = audit_status
+      interned.append(audit_status)
+
+    key = tuple(interned)
+    return self._status_lists.setdefault(key, key)
+
+  # Adds (or replaces, by creative ID) the creatives of `creativeDelta` records. Records of the slimmer projection
+  # profiles are accepted as well; the fields they do not select are `None` or empty.
+  def add_records(self, records: List[Any]) -> None:
+    for record in records:
+      audit_statuses = record.get('auditStatuses') or {}
+      self.creatives[record['id']] = CreativeAudit(
+        record['id'],
+        self._intern((record.get('advertiser') or {}).get('id')),
+        record.get('name'),
+        record.get('createdAt'),
+        record.get('lastUpdatedAt'),
+        self._intern_statuses(audit_statuses.get('supplyVendorAuditStatuses')),
+        self._intern_statuses(audit_statuses.get('supplyVendorPublisherAuditStatuses')))
+
+  def get(self, creative_id: str) -> Optional[CreativeAudit]:
+    return self.creatives.get(creative_id)
+
+  # Returns the number of statuses of each `auditStatusEnum` in a shared tuple of audit statuses.
+  def _count_statuses(self, statuses: Tuple[AuditStatus, ...]) -> Dict[str, int]:
+    counts = self._status_counts.get(id(statuses))
+    if counts is None:
+      counts = {}
+      for status in statuses:
+        counts[status.audit_status_enum] = counts.get(status.audit_status_enum, 0) + 1
+      # The tuples live as long as the model, so their IDs stay unique.
+      self._status_counts[id(statuses)] = counts
+    return counts
+
+  # Returns, for each advertiser, the number of supply vendor audit statuses of its creatives by `auditStatusEnum`.
+  # With `publisher` set, the supply vendor publisher audit statuses are counted instead.
+  def get_status_counts_by_advertiser(self, publisher: bool = False) -> Dict[str, Dict[str, int]]:
+    summary: Dict[str, Dict[str, int]] = {}
+    for creative in self.creatives.values():
+      statuses = creative.supply_vendor_publisher_audit_statuses if publisher else creative.supply_vendor_audit_statuses
+      advertiser_counts = summary.setdefault(creative.advertiser_id, {})
+      for status_enum, count in self._count_statuses(statuses).items():
+        advertiser_counts[status_enum] = advertiser_counts.get(status_enum, 0) + count
+    return summary
+
+# Adds every page of a creative delta walk to a `CreativeAuditModel`.
+class CreativeAuditSink(DeltaSink):
+  def __init__(self, model: CreativeAuditModel) -> None:
+    self.model = model
+
+  def write_records(self, records: List[Any]) -> None:
+    self.model.add_records(records)
@@ -0,0 +1,176 @@
+###################################################################################
+# Continuous delta sync.
+# Instead of a one-shot walk per cron run, which pays for startup, advertiser
+# enumeration and the minimum-version bootstrap every time, a `DeltaDaemon` stays
+# up and polls each entity type on its own interval. The connection pool and the
+# advertiser IDs stay warm between polls, and every advertiser's watermark is
+# carried forward in memory and only checkpointed every so often.
+###################################################################################
+
+import random
+import threading
+import time
+from typing import List, Optional
+
+from .Checkpoints import CheckpointStore
+from .DeltaEntities import ADVERTISER_SCOPE
+from .DeltaSync import DeltaSync
+from .Sinks import DeltaSink
+
+# The polling state of one entity type.
+class DeltaPoller:
+  def __init__(self, delta_sync: DeltaSync, sinks: List[DeltaSink], poll_interval_seconds: float, jitter_seconds: float) -> None:
+    # Walks the delta of the entity type.
+    self.delta_sync = delta_sync
+    # Receive every page of every poll.
+    self.sinks = sinks
+    # The time between two polls, plus a random delay of up to `jitter_seconds` so that pollers drift apart.
+    self.poll_interval_seconds = poll_interval_seconds
+    self.jitter_seconds = jitter_seconds
+    # The version of every advertiser (or partner) walked so far, as an ID to version dictionary.
+    self.watermarks: dict[str, int] = {}
+    # The current minimum (earliest) tracking version, which IDs without a watermark start from.
+    self.minimum_tracking_version = 0
+    # When the next poll is due, as returned by `time.monotonic()`.
+    self.next_poll_time = 0.0
+    # The number of polls completed and of changed entities retrieved so far.
+    self.poll_count = 0
+    self.record_count = 0
+
+  # Schedules the next poll one interval (plus jitter) from now.
+  def schedule(self) -> None:
+    self.next_poll_time = time.monotonic() + self.poll_interval_seconds + random.uniform(0, self.jitter_seconds)
+
+# Polls the deltas of several entity types of a partner until stopped.
+class DeltaDaemon:
+  def __init__(self, partner_id: str, checkpoint_store: Optional[CheckpointStore] = None, checkpoint_interval_seconds: float = 300, roster_refresh_seconds: float = 300) -> None:
+    # The partner whose deltas are polled.
+    self.partner_id = partner_id
+    # If set, the watermarks start from the ones stored here and are written back every `checkpoint_interval_seconds`
+    # and when the daemon stops. The current minimum tracking version is refreshed at the same time.
+    self.checkpoint_store = checkpoint_store
+    self.checkpoint_interval_seconds = checkpoint_interval_seconds
+    # The partner's advertiser IDs are kept in memory and refreshed this often, through the advertiser roster of the
+    # delta syncs if they have one.
+    self.roster_refresh_seconds = roster_refresh_seconds
+    self.pollers: List[DeltaPoller] = []
+    self._advertiser_ids: Optional[List[str]] = None
+    self._advertiser_ids_time = 0.0
+    self._checkpoint_time = 0.0
+    self._stopped = threading.Event()
+
+  # Adds an entity type to poll. Its `delta_sync` should not have a checkpoint store of its own: the daemon
+  # checkpoints the watermarks itself, periodically instead of after every page.
+  def add_entity(self, delta_sync: DeltaSync, sinks: List[DeltaSink] = (), poll_interval_seconds: float = 60, jitter_seconds: float = 10) -> DeltaPoller:
+    poller = DeltaPoller(delta_sync, list(sinks), poll_interval_seconds, jitter_seconds)
+    self.pollers.append(poller)
+    return poller
+
+  # Returns the partner's advertiser IDs, refreshing them if they are older than `roster_refresh_seconds`.
+  def get_advertiser_ids(self, delta_sync: DeltaSync) -> List[str]:
+    if self._advertiser_ids is None or time.monotonic() - self._advertiser_ids_time >= self.roster_refresh_seconds:
+      if delta_sync.advertiser_roster is not None:
+        self._advertiser_ids = delta_sync.advertiser_roster.get_advertiser_ids(self.partner_id)
+      else:
+        self._advertiser_ids = delta_sync.get_advertiser_ids(self.partner_id)
+      self._advertiser_ids_time = time.monotonic()
+      print(f'Number of advertiserIds: {len(self._advertiser_ids)}')
+
+    return self._advertiser_ids
+
+  # Returns the IDs the delta of a poller's entity type is queried for.
+  def get_scope_ids(self, poller: DeltaPoller) -> List[str]:
+    if poller.delta_sync.entity.scope == ADVERTISER_SCOPE:
+      return self.get_advertiser_ids(poller.delta_sync)
+    return [self.partner_id]
+
+  # Fetches the current minimum tracking version of a poller's entity type and moves the watermarks that have
+  # expired up to it.
+  def refresh_minimum_tracking_version(self, poller: DeltaPoller) -> None:
+    scope_ids = self.get_scope_ids(poller)
+    if len(scope_ids) == 0:
+      return
+
+    minimum_tracking_version = poller.delta_sync.get_current_minimum_tracking_version(scope_ids[0])
+    poller.minimum_tracking_version = minimum_tracking_version
+    for scope_id, version in poller.watermarks.items():
+      if version < minimum_tracking_version:
+        poller.watermarks[scope_id] = minimum_tracking_version
+
+  # Writes the watermarks of every poller to the checkpoint store and refreshes their minimum tracking versions.
+  def checkpoint(self) -> None:
+    self._checkpoint_time = time.monotonic()
+    if self.checkpoint_store is not None:
+      for poller in self.pollers:
+        self.checkpoint_store.save_watermarks(self.partner_id, poller.delta_sync.entity.name, poller.watermarks)
+      print(f'Checkpointed the watermarks of {len(self.pollers)} entity type(s).')
+
+    for poller in self.pollers:
+      self.refresh_minimum_tracking_version(poller)
+
+  # Walks the delta of a poller's entity type from its watermarks and hands the pages to its sinks. Returns the
+  # number of changed entities retrieved.
+  def poll(self, poller: DeltaPoller) -> int:
+    delta_sync = poller.delta_sync
+    start_time = time.time()
+    chunks = delta_sync.plan_chunks(self.partner_id, poller.minimum_tracking_version, scope_ids=self.get_scope_ids(poller), watermarks=poller.watermarks)
+    tasks = [(chunk_index, chunk, version) for chunk_index, (chunk, version) in enumerate(chunks)]
+
+    record_count = 0
+    for page in delta_sync.walk_chunks(tasks):
+      for sink in poller.sinks:
+        sink.write_page(page)
+      record_count += len(page.records)
+      # Partial pages of a streamed response are followed by the rest of their page, which moves the watermarks.
+      if page.partial:
+        continue
+      for scope_id in page.scope_ids:
+        poller.watermarks[scope_id] = page.next_change_tracking_version
+
+    poller.poll_count += 1
+    poller.record_count += record_count
+    print(f'Polled {delta_sync.entity.name}: {record_count} changed in {len(chunks)} chunk(s) in {time.time() - start_time:.1f}s.')
+    return record_count
+
+  # Polls every entity type whenever it is due until `stop` is called (or, if set, `max_polls` polls were made).
+  # A failed poll is reported and retried at the next interval. The watermarks are checkpointed one last time when
+  # the daemon stops, including on `KeyboardInterrupt`.
+  def run(self, max_polls: Optional[int] = None) -> None:
+    if len(self.pollers) == 0:
+      return
+
+    for poller in self.pollers:
+      if self.checkpoint_store is not None:
+        poller.watermarks = self.checkpoint_store.get_watermarks(self.partner_id, poller.delta_sync.entity.name)
+      self.refresh_minimum_tracking_version(poller)
+      # Spread the first polls over the jitter as well.
+      poller.next_poll_time = time.monotonic() + random.uniform(0, poller.jitter_seconds)
+    self._checkpoint_time = time.monotonic()
+
+    poll_count = 0
+    try:
+      while not self._stopped.is_set() and (max_polls is None or poll_count < max_polls):
+        poller = min(self.pollers, key=lambda poller: poller.next_poll_time)
+        if self._stopped.wait(max(0.0, poller.next_poll_time - time.monotonic())):
+          break
+
+        try:
+          self.poll(poller)
+        except Exception as error:
+          print(f'Failed to poll {poller.delta_sync.entity.name}: {error}')
+        poller.schedule()
+        poll_count += 1
+
+        if time.monotonic() - self._checkpoint_time >= self.checkpoint_interval_seconds:
+          try:
+            self.checkpoint()
+          except Exception as error:
+            print(f'Failed to checkpoint: {error}')
+    finally:
+      if self.checkpoint_store is not None:
+        for poller in self.pollers:
+          self.checkpoint_store.save_watermarks(self.partner_id, poller.delta_sync.entity.name, poller.watermarks)
+
+  # Makes `run` return once the poll in progress, if any, has finished.
+  def stop(self) -> None:
+    self._stopped.set()
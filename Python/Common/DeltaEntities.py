@@ -0,0 +1,415 @@
+###################################################################################
+# Descriptors of the entity types that can be synced with the delta engine.
+# Each delta query only differs in its root field, the key of the changed-entity
+# list and the selection set, so those are all a `DeltaEntity` holds. The GQL
+# documents are built and registered once, when the descriptor is created.
+###################################################################################
+
+import re
+import textwrap
+from typing import List, Optional, Tuple
+
+from .NestedConnections import NestedConnection
+from .Queries import register_operation
+
+# The delta is queried per chunk of advertiser IDs (`input: { advertiser: { ... } }`).
+ADVERTISER_SCOPE = 'advertiser'
+# The delta is queried per partner ID (`input: { ... }`).
+PARTNER_SCOPE = 'partner'
+
+# Projection profiles: the full selection set, the fields most consumers need, or just enough to invalidate caches
+# (the IDs, the advertiser and whether the entity was archived).
+FULL_PROFILE = 'full'
+CORE_PROFILE = 'core'
+IDS_ONLY_PROFILE = 'ids-only'
+
+# The suffix of the operation names of each slimmer profile.
+_PROFILE_OPERATION_SUFFIXES = { CORE_PROFILE: 'Core', IDS_ONLY_PROFILE: 'IdsOnly' }
+
+# The suffix of the operation names of the descriptors that also select the paging of their nested connections.
+_CONNECTION_PAGING_OPERATION_SUFFIX = 'Paged'
+
+# The types a column can be declared with. A field under a list is a list column, e.g. `list<string>`.
+COLUMN_TYPES = ('string', 'int64', 'float64', 'bool')
+
+# Returns the path of every leaf field of a selection set, e.g. `('advertiser', 'id')` for `advertiser { id }`.
+def get_selection_paths(selection: str) -> List[Tuple[str, ...]]:
+  paths = []
+  parents: List[str] = []
+  # Arguments do not select anything.
+  for token in re.findall(r'[{}]|[A-Za-z_]\w*', re.sub(r'\([^)]*\)', '', selection)):
+    if token == '{':
+      # The field before the brace has fields of its own, so it is not a leaf.
+      parents.append(paths.pop()[-1])
+    elif token == '}':
+      parents.pop()
+    else:
+      paths.append(tuple(parents) + (token,))
+  return paths
+
+# Returns a selection set that also selects what completing the connection `field` needs (see
+# `Common/NestedConnections.py`): its `totalCount` and the cursor of its last node. The selection is returned unchanged
+# if it does not select the connection.
+def add_connection_paging(selection: str, field: str) -> str:
+  lines = selection.split('\n')
+  if f'{field} {{' not in lines:
+    return selection
+  start = lines.index(f'{field} {{')
+  end = lines.index('}', start)
+  paging = ['  pageInfo {', '    endCursor', '  }'] if (field, 'pageInfo', 'endCursor') not in get_selection_paths(selection) else []
+  total_count = ['  totalCount'] if (field, 'totalCount') not in get_selection_paths(selection) else []
+  return '\n'.join(lines[:start + 1] + total_count + lines[start + 1:end] + paging + lines[end:])
+
+# Describes one entity type of the delta API.
+class DeltaEntity:
+  def __init__(self, name: str, root_field: str, items_key: str, selection: str, scope: str, operation_name: str, minimum_version_operation_name: str,
+               column_types: dict[str, str], profiles: dict[str, str] = None, profile: str = FULL_PROFILE, nested_connections: List[NestedConnection] = None) -> None:
+    # A human readable name of the entity type, e.g. 'adGroups'.
+    self.name = name
+    # The delta root field, e.g. `adGroupDelta`.
+    self.root_field = root_field
+    # The key of the list of changed entities in the delta result, e.g. `adGroups`.
+    self.items_key = items_key
+    # The fields selected for each changed entity.
+    self.selection = textwrap.dedent(selection).strip()
+    # Whether the delta is queried by advertiser IDs or by partner IDs.
+    self.scope = scope
+    # The name of the GQL variable holding the scope IDs.
+    self.ids_variable = 'advertiserIds' if scope == ADVERTISER_SCOPE else 'partnerIds'
+    # The registered operation retrieving one page of the delta.
+    self.delta_operation = register_operation(operation_name, self.build_document(operation_name, '$changeTrackingVersion', self.build_page_selection(self.selection)))
+    # The registered operation retrieving the current minimum (earliest) tracking version.
+    self.minimum_version_operation = register_operation(minimum_version_operation_name, self.build_document(minimum_version_operation_name, '0', 'currentMinimumTrackingVersion'))
+    # The registered operation walking the pages of the delta without selecting any entities, to find the latest version.
+    latest_version_operation_name = operation_name + 'LatestVersion'
+    self.latest_version_operation = register_operation(latest_version_operation_name, self.build_document(latest_version_operation_name, '$changeTrackingVersion', 'nextChangeTrackingVersion\nmoreAvailable'))
+    # The type of each column of the selection (see `column_paths`), by column name, e.g. `{ 'budget.total': 'float64' }`.
+    # Columnar sinks write the columns with these types, so they must be declared for every leaf field.
+    self.column_types = column_types
+    for path in self.column_paths:
+      column_type = column_types.get('.'.join(path), '')
+      if column_type.removeprefix('list<').removesuffix('>') not in COLUMN_TYPES:
+        raise Exception(f"The column '{'.'.join(path)}' of {name} ({profile}) has no valid type.")
+    # The projection profile of `selection`.
+    self.profile = profile
+    # The nested connections of the selection that are returned without paging, see `Common/NestedConnections.py`.
+    # Profiles that do not select a connection simply have nothing to complete.
+    self.nested_connections = nested_connections or []
+    # The operation names, and the descriptor also selecting the paging of the nested connections, built on first use.
+    self._operation_name = operation_name
+    self._minimum_version_operation_name = minimum_version_operation_name
+    self._connection_paging: Optional[DeltaEntity] = None
+    # The descriptor of each projection profile, selecting the same entities with a slimmer selection set.
+    self.projections: dict[str, DeltaEntity] = { profile: self }
+    for profile_name, profile_selection in (profiles or {}).items():
+      self.projections[profile_name] = DeltaEntity(name, root_field, items_key, profile_selection, scope, operation_name + _PROFILE_OPERATION_SUFFIXES[profile_name],
+                                                   minimum_version_operation_name, column_types, profile=profile_name, nested_connections=nested_connections)
+
+  # Returns the descriptor selecting the fields of a projection profile. A profile that is not defined for the entity
+  # type selects everything, like `FULL_PROFILE`. Walks with different profiles still share checkpoints and watermarks.
+  def get_profile(self, profile: str) -> 'DeltaEntity':
+    if profile not in (FULL_PROFILE, CORE_PROFILE, IDS_ONLY_PROFILE):
+      raise Exception(f"Unknown projection profile '{profile}'.")
+    return self.projections.get(profile, self.projections[FULL_PROFILE])
+
+  # Returns the descriptor whose selection also selects the `totalCount` and the cursor of the last node of each nested
+  # connection, which `DeltaSync` needs to complete them. The default selections leave these out, so the delta queries
+  # only select them when completing is enabled. Returns this descriptor if it selects no nested connection.
+  def get_connection_paging(self) -> 'DeltaEntity':
+    if self._connection_paging is None:
+      selection = self.selection
+      for connection in self.nested_connections:
+        selection = add_connection_paging(selection, connection.field)
+      if selection == self.selection:
+        self._connection_paging = self
+      else:
+        self._connection_paging = DeltaEntity(self.name, self.root_field, self.items_key, selection, self.scope, self._operation_name + _CONNECTION_PAGING_OPERATION_SUFFIX,
+                                              self._minimum_version_operation_name, self.column_types, profile=self.profile, nested_connections=self.nested_connections)
+    return self._connection_paging
+
+  # Returns the fields selected on the delta result for one page of entities with the given selection.
+  def build_page_selection(self, selection: str) -> str:
+    return f'nextChangeTrackingVersion\nmoreAvailable\n{self.items_key} {{\n{textwrap.indent(selection, "  ")}\n}}'
+
+  # Builds a delta document selecting `result_selection` on the root field.
+  def build_document(self, operation_name: str, change_tracking_version: str, result_selection: str) -> str:
+    variables = f'$changeTrackingVersion: Long!, ${self.ids_variable}: [ID!]!' if change_tracking_version.startswith('$') else f'${self.ids_variable}: [ID!]!'
+    input_fields = f'changeTrackingVersion: {change_tracking_version}\nids: ${self.ids_variable}'
+    if self.scope == ADVERTISER_SCOPE:
+      input_fields = f'advertiser: {{\n{textwrap.indent(input_fields, "  ")}\n}}'
+
+    return f"""
+  query {operation_name}({variables}) {{
+    {self.root_field}(
+      input: {{
+{textwrap.indent(input_fields, ' ' * 8)}
+      }}
+    ) {{
+{textwrap.indent(result_selection, ' ' * 6)}
+    }}
+  }}"""
+
+  # The path of every leaf field of the selection, i.e. the columns of the entity type when flattened.
+  @property
+  def column_paths(self) -> List[Tuple[str, ...]]:
+    return get_selection_paths(self.selection)
+
+  # The path of the changed-entity list within a response, as used for streaming.
+  @property
+  def items_path(self) -> str:
+    return f'data.{self.root_field}.{self.items_key}'
+
+ADVERTISER_DELTA = DeltaEntity(
+  name='advertisers',
+  root_field='advertiserDelta',
+  items_key='advertisers',
+  selection="""
+    id
+    name
+    partner {
+      id
+    }
+    isArchived""",
+  scope=PARTNER_SCOPE,
+  operation_name='GetAdvertisersDelta',
+  minimum_version_operation_name='GetAdvertisersDeltaMinimumVersion',
+  column_types={
+    'id': 'string',
+    'name': 'string',
+    'partner.id': 'string',
+    'isArchived': 'bool'
+  },
+  profiles={
+    IDS_ONLY_PROFILE: """
+      id
+      partner {
+        id
+      }
+      isArchived"""
+  })
+
+AD_GROUP_DELTA = DeltaEntity(
+  name='adGroups',
+  root_field='adGroupDelta',
+  items_key='adGroups',
+  selection="""
+    id
+    name
+    advertiser {
+      id
+    }
+    campaign {
+      id
+    }
+    isHighFillRate
+    isArchived
+    creatives {
+      nodes {
+        id
+      }
+    }""",
+  scope=ADVERTISER_SCOPE,
+  operation_name='GetAdGroupsDelta',
+  minimum_version_operation_name='GetAdGroupsDeltaMinimumVersion',
+  column_types={
+    'id': 'string',
+    'name': 'string',
+    'advertiser.id': 'string',
+    'campaign.id': 'string',
+    'isHighFillRate': 'bool',
+    'isArchived': 'bool',
+    'creatives.totalCount': 'int64',
+    'creatives.nodes.id': 'list<string>',
+    'creatives.pageInfo.endCursor': 'string'
+  },
+  nested_connections=[NestedConnection('adGroup', 'creatives', 'id')],
+  profiles={
+    CORE_PROFILE: """
+      id
+      name
+      advertiser {
+        id
+      }
+      campaign {
+        id
+      }
+      isHighFillRate
+      isArchived""",
+    IDS_ONLY_PROFILE: """
+      id
+      advertiser {
+        id
+      }
+      campaign {
+        id
+      }
+      isArchived"""
+  })
+
+CAMPAIGN_DELTA = DeltaEntity(
+  name='campaigns',
+  root_field='campaignDelta',
+  items_key='campaigns',
+  selection="""
+    id
+    advertiser {
+      id
+    }
+    name
+    timeZone
+    timeZoneIANA
+    isArchived
+    createdAtUtc
+    lastUpdatedAtUtc
+    conversionReportingColumns {
+      totalCount
+      nodes {
+        reportingColumnId
+        trackingTag {
+          id
+        }
+      }
+    }
+    budget {
+      total
+    }""",
+  scope=ADVERTISER_SCOPE,
+  operation_name='GetCampaignsDelta',
+  minimum_version_operation_name='GetCampaignsDeltaMinimumVersion',
+  column_types={
+    'id': 'string',
+    'advertiser.id': 'string',
+    'name': 'string',
+    'timeZone': 'string',
+    'timeZoneIANA': 'string',
+    'isArchived': 'bool',
+    'createdAtUtc': 'string',
+    'lastUpdatedAtUtc': 'string',
+    'conversionReportingColumns.totalCount': 'int64',
+    'conversionReportingColumns.nodes.reportingColumnId': 'list<int64>',
+    'conversionReportingColumns.nodes.trackingTag.id': 'list<string>',
+    'conversionReportingColumns.pageInfo.endCursor': 'string',
+    'budget.total': 'float64'
+  },
+  nested_connections=[NestedConnection('campaign', 'conversionReportingColumns', 'reportingColumnId trackingTag { id }')],
+  profiles={
+    CORE_PROFILE: """
+      id
+      advertiser {
+        id
+      }
+      name
+      timeZone
+      timeZoneIANA
+      isArchived
+      createdAtUtc
+      lastUpdatedAtUtc
+      budget {
+        total
+      }""",
+    IDS_ONLY_PROFILE: """
+      id
+      advertiser {
+        id
+      }
+      isArchived"""
+  })
+
+CREATIVE_DELTA = DeltaEntity(
+  name='creatives',
+  root_field='creativeDelta',
+  items_key='creatives',
+  selection="""
+    advertiser {
+      id
+    }
+    id
+    name
+    createdAt
+    lastUpdatedAt
+    auditStatuses {
+      supplyVendorAuditStatuses {
+        auditFeedback
+        auditStatus
+        auditStatusEnum
+      }
+      supplyVendorPublisherAuditStatuses {
+        auditFeedback
+        auditStatus
+        auditStatusEnum
+      }
+    }""",
+  scope=ADVERTISER_SCOPE,
+  operation_name='GetCreativeDelta',
+  minimum_version_operation_name='GetCreativeDeltaMinimumVersion',
+  column_types={
+    'advertiser.id': 'string',
+    'id': 'string',
+    'name': 'string',
+    'createdAt': 'string',
+    'lastUpdatedAt': 'string',
+    'auditStatuses.supplyVendorAuditStatuses.auditFeedback': 'list<string>',
+    'auditStatuses.supplyVendorAuditStatuses.auditStatus': 'list<string>',
+    'auditStatuses.supplyVendorAuditStatuses.auditStatusEnum': 'list<string>',
+    'auditStatuses.supplyVendorPublisherAuditStatuses.auditFeedback': 'list<string>',
+    'auditStatuses.supplyVendorPublisherAuditStatuses.auditStatus': 'list<string>',
+    'auditStatuses.supplyVendorPublisherAuditStatuses.auditStatusEnum': 'list<string>'
+  },
+  profiles={
+    # The audit statuses without their feedback text and display strings.
+    CORE_PROFILE: """
+      advertiser {
+        id
+      }
+      id
+      name
+      createdAt
+      lastUpdatedAt
+      auditStatuses {
+        supplyVendorAuditStatuses {
+          auditStatusEnum
+        }
+        supplyVendorPublisherAuditStatuses {
+          auditStatusEnum
+        }
+      }""",
+    IDS_ONLY_PROFILE: """
+      advertiser {
+        id
+      }
+      id"""
+  })
+
+TRACKING_TAG_DELTA = DeltaEntity(
+  name='trackingTags',
+  root_field='trackingTagDelta',
+  items_key='trackingTags',
+  selection="""
+    id
+    name
+    type
+    isArchived
+    advertiser {
+      id
+    }""",
+  scope=ADVERTISER_SCOPE,
+  operation_name='GetTrackingTagDeltas',
+  minimum_version_operation_name='GetTrackingTagDelta',
+  column_types={
+    'id': 'string',
+    'name': 'string',
+    'type': 'string',
+    'isArchived': 'bool',
+    'advertiser.id': 'string'
+  },
+  profiles={
+    IDS_ONLY_PROFILE: """
+      id
+      isArchived
+      advertiser {
+        id
+      }"""
+  })
+
+# Every entity type, by name.
+DELTA_ENTITIES: dict[str, DeltaEntity] = { entity.name: entity for entity in (ADVERTISER_DELTA, AD_GROUP_DELTA, CAMPAIGN_DELTA, CREATIVE_DELTA, TRACKING_TAG_DELTA) }
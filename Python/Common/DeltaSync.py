@@ -0,0 +1,487 @@
+###################################################################################
+# Generic delta sync engine shared by the Delta scripts.
+# Given a `DeltaEntity` it enumerates the partner's advertisers, bootstraps the
+# minimum tracking version, splits the advertisers into chunks and walks the
+# `moreAvailable` pages of every chunk (optionally several chunks at once),
+# tracking the change-tracking version to resume from on the next run.
+###################################################################################
+
+from concurrent.futures import ThreadPoolExecutor
+import functools
+import itertools
+import queue
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Callable, Iterator, List, Optional, Tuple
+
+from . import Transport
+from .AdaptiveChunking import AdaptiveChunker
+from .Checkpoints import CheckpointStore
+from .DeltaEntities import ADVERTISER_SCOPE, DeltaEntity
+from .Instrumentation import Instrumentation
+from .NestedConnections import complete_connections
+from .Queries import GET_PARTNER_ADVERTISERS
+from .Sinks import DeltaSink
+from .Transport import GqlResponse
+
+if TYPE_CHECKING:
+  from .AdvertiserRoster import AdvertiserRoster
+
+# One page of a delta walk.
+class DeltaPage:
+  def __init__(self, chunk_index: int, scope_ids: List[str], change_tracking_version: int, next_change_tracking_version: int, more_available: bool, records: List[Any]) -> None:
+    # The index of the chunk this page belongs to.
+    self.chunk_index = chunk_index
+    # The advertiser (or partner) IDs the page was queried for.
+    self.scope_ids = scope_ids
+    # The change-tracking version the page was queried with.
+    self.change_tracking_version = change_tracking_version
+    # The change-tracking version to query the chunk's next page with.
+    self.next_change_tracking_version = next_change_tracking_version
+    # Whether the chunk has more pages after this one.
+    self.more_available = more_available
+    # The changed entities.
+    self.records = records
+    # The (IDs, parts, version) of the chunks that were split before this page, the first of their parts, was retrieved.
+    self.splits: List[Tuple[List[str], List[List[str]], int]] = []
+    # Whether this only holds some of the records of a page that is still being streamed. A partial page is not
+    # checkpointed: it keeps `change_tracking_version` as its next version and claims more are available. The page
+    # itself follows with the remaining records.
+    self.partial = False
+
+# The outcome of a complete delta walk.
+class DeltaResult:
+  def __init__(self, records: List[Any], record_count: int, minimum_tracking_version: int, next_change_tracking_version: int) -> None:
+    # The changed entities, in page order, if they were collected.
+    self.records = records
+    # The number of changed entities retrieved.
+    self.record_count = record_count
+    # The change-tracking version the walk started from.
+    self.minimum_tracking_version = minimum_tracking_version
+    # The change-tracking version to start the next walk from.
+    self.next_change_tracking_version = next_change_tracking_version
+
+# Runs each task (a function returning an iterator, such as the pages of one chunk), `max_workers` at a time in the
+# order given, and yields the items of all of them as they arrive. Each task's items are yielded in order, but items
+# of concurrent tasks interleave. If a task raises, the others are stopped and the error is raised to the caller.
+def walk_concurrently(tasks: List[Callable[[], Iterator[Any]]], max_workers: int) -> Iterator[Any]:
+  if max_workers == 1:
+    for task in tasks:
+      yield from task()
+    return
+
+  # Make sure every worker can hold its own keep-alive connection.
+  if max_workers > Transport.pool_maxsize:
+    Transport.configure_pool(maxsize=max_workers)
+
+  # The workers hand their items over through a bounded queue, so they pause while the caller falls behind
+  # instead of buffering the whole walk. Each worker ends its task with `None`, or with the error it raised.
+  items: queue.Queue = queue.Queue(maxsize=max_workers * 2)
+  stopped = threading.Event()
+
+  def put(item: Any) -> None:
+    while not stopped.is_set():
+      try:
+        items.put(item, timeout=0.1)
+        return
+      except queue.Full:
+        pass
+
+  def run_task(task: Callable[[], Iterator[Any]]) -> None:
+    try:
+      for item in task():
+        if stopped.is_set():
+          return
+        put(item)
+      put(None)
+    except Exception as error:
+      put(error)
+
+  executor = ThreadPoolExecutor(max_workers=max_workers)
+  try:
+    for task in tasks:
+      executor.submit(run_task, task)
+
+    remaining = len(tasks)
+    while remaining > 0:
+      item = items.get()
+      if item is None:
+        remaining -= 1
+      elif isinstance(item, Exception):
+        raise item
+      else:
+        yield item
+  finally:
+    # Stop the workers if the caller stopped early or a task failed.
+    stopped.set()
+    executor.shutdown(wait=True, cancel_futures=True)
+
+# Walks the delta of one entity type for a partner.
+class DeltaSync:
+  def __init__(self, gql_url: str, token: str, entity: DeltaEntity, advertisers_chunk_size: int = 100, max_workers: int = 1, stream_responses: bool = False, instrumentation: Optional[Instrumentation] = None,
+               checkpoint_store: Optional[CheckpointStore] = None, advertiser_roster: Optional['AdvertiserRoster'] = None, chunker: Optional[AdaptiveChunker] = None,
+               complete_nested_connections: bool = False, connection_batch_size: int = 50, connection_max_workers: int = 4, stream_batch_size: int = 500) -> None:
+    self.gql_url = gql_url
+    self.token = token
+    # The entity type to sync. Completing its nested connections needs their paging to be selected as well.
+    self.entity = entity.get_connection_paging() if complete_nested_connections else entity
+    # The number of advertiser IDs sent with each delta query.
+    self.advertisers_chunk_size = advertisers_chunk_size
+    # The number of chunks walked concurrently. Each chunk still walks its own pages in order.
+    self.max_workers = max(1, max_workers)
+    # If `True`, each delta page is decoded incrementally as it arrives instead of being buffered and decoded in full,
+    # and every `stream_batch_size` records are handed over as a partial page while the rest is still being read.
+    self.stream_responses = stream_responses
+    self.stream_batch_size = max(1, stream_batch_size)
+    # Receives the page and chunk timings of the walk, if set.
+    self.instrumentation = instrumentation
+    # If set, the progress of every chunk is checkpointed after each page, so that an interrupted walk can be resumed.
+    self.checkpoint_store = checkpoint_store
+    # If set, the partner's advertiser IDs are taken from this cached roster instead of being enumerated on every walk.
+    self.advertiser_roster = advertiser_roster
+    # If set, chunk sizes adapt to the observed pages instead of being fixed to `advertisers_chunk_size`, and chunks
+    # whose query fails are split in two.
+    self.chunker = chunker
+    # If `True`, the nested connections of the entity type (see `DeltaEntity.nested_connections`) that a record holds
+    # only part of are completed before its page is handed over, `connection_batch_size` records per query with up to
+    # `connection_max_workers` queries in flight.
+    self.complete_nested_connections = complete_nested_connections
+    self.connection_batch_size = connection_batch_size
+    self.connection_max_workers = connection_max_workers
+    # The change-tracking version the last walk started from, and the one to start the next walk from.
+    self.minimum_tracking_version = 0
+    self.next_change_tracking_version = 0
+    self._chunk_next_versions: List[int] = []
+
+  # Executes a GQL request and raises an exception with the given message if it failed, including when the request
+  # itself succeeded but its errors left no data (e.g. a query rejected for its size or complexity).
+  def execute_gql_request(self, body: Any, variables: dict[str, Any], error_message: str) -> GqlResponse:
+    request_success, response = Transport.execute_gql_request(self.gql_url, self.token, body, variables)
+
+    if not request_success or (len(response.errors) > 0 and not response.data):
+      print(response.errors)
+      raise Exception(error_message)
+
+    return response
+
+  # Retrieves the IDs of every advertiser of a partner, 1,000 per page.
+  def get_advertiser_ids(self, partner_id: str) -> List[str]:
+    advertiser_ids = []
+    has_next = True
+    cursor = None
+
+    while has_next:
+      print(f'Retrieving advertisers after cursor: {cursor}')
+      # The cursor is `None` for the first page.
+      response = self.execute_gql_request(GET_PARTNER_ADVERTISERS, { 'partnerId': partner_id, 'after': cursor }, 'Failed to fetch advertisers.')
+      advertisers = response.data['advertisers']
+
+      for node in advertisers['nodes']:
+        advertiser_ids.append(node['id'])
+
+      # Update pagination information.
+      has_next = advertisers['pageInfo']['hasNextPage']
+      cursor = advertisers['pageInfo']['endCursor']
+
+    return advertiser_ids
+
+  # Retrieves the current minimum (earliest) tracking version for an advertiser (or partner) ID.
+  def get_current_minimum_tracking_version(self, scope_id: str) -> int:
+    variables = { self.entity.ids_variable: [scope_id] }
+    response = self.execute_gql_request(self.entity.minimum_version_operation, variables, 'Failed to retrieve current minimum tracking version.')
+    return response.data[self.entity.root_field]['currentMinimumTrackingVersion']
+
+  # Retrieves the latest change-tracking version for an advertiser (or partner) ID, i.e. the version a walk starting
+  # now would end at. The delta is walked from the current minimum tracking version without selecting any entities,
+  # so the pages are small.
+  def get_latest_tracking_version(self, scope_id: str) -> int:
+    change_tracking_version = self.get_current_minimum_tracking_version(scope_id)
+    more_available = True
+
+    while more_available:
+      variables = { 'changeTrackingVersion': change_tracking_version, self.entity.ids_variable: [scope_id] }
+      response = self.execute_gql_request(self.entity.latest_version_operation, variables, 'Failed to retrieve latest tracking version.')
+      data = response.data[self.entity.root_field]
+      change_tracking_version = data['nextChangeTrackingVersion']
+      more_available = data['moreAvailable']
+
+    return change_tracking_version
+
+  # Retrieves one page of the delta for a chunk of advertiser (or partner) IDs, buffered and decoded in full.
+  def get_delta_page(self, chunk_index: int, scope_ids: List[str], change_tracking_version: int) -> DeltaPage:
+    variables: dict[str, Any] = {
+      'changeTrackingVersion': change_tracking_version,
+      self.entity.ids_variable: scope_ids
+    }
+
+    start_time = time.time()
+    response = self.execute_gql_request(self.entity.delta_operation, variables, f'Failed to retrieve {self.entity.name} delta.')
+    data = response.data[self.entity.root_field]
+    records = data[self.entity.items_key]
+
+    self.observe_page(scope_ids, time.time() - start_time, len(records), response)
+    if self.complete_nested_connections and len(self.entity.nested_connections) > 0:
+      self.complete_page_connections(records)
+
+    return DeltaPage(chunk_index, scope_ids, change_tracking_version, data['nextChangeTrackingVersion'], data['moreAvailable'], records)
+
+  # Retrieves one page of the delta for a chunk of advertiser (or partner) IDs and yields it. With `stream_responses`,
+  # the records are yielded as partial pages of `stream_batch_size` as soon as they are decoded, and the page itself
+  # follows with the remaining records once the response has been read to the end.
+  def iter_delta_page(self, chunk_index: int, scope_ids: List[str], change_tracking_version: int) -> Iterator[DeltaPage]:
+    if not self.stream_responses:
+      yield self.get_delta_page(chunk_index, scope_ids, change_tracking_version)
+      return
+
+    variables: dict[str, Any] = {
+      'changeTrackingVersion': change_tracking_version,
+      self.entity.ids_variable: scope_ids
+    }
+    error_message = f'Failed to retrieve {self.entity.name} delta.'
+
+    start_time = time.time()
+    request_success, response = Transport.execute_gql_request_streaming(self.gql_url, self.token, self.entity.delta_operation, variables, self.entity.items_path)
+    if not request_success:
+      print(response.errors)
+      raise Exception(error_message)
+
+    record_count = 0
+    records = []
+    for record in response.items:
+      records.append(record)
+      if len(records) == self.stream_batch_size:
+        if self.complete_nested_connections and len(self.entity.nested_connections) > 0:
+          self.complete_page_connections(records)
+        page = DeltaPage(chunk_index, scope_ids, change_tracking_version, change_tracking_version, True, records)
+        page.partial = True
+        yield page
+        record_count += len(records)
+        records = []
+
+    # The rest of the page is only available once the streamed entities have been read. Like with a buffered
+    # response, errors that left no data (e.g. a query rejected for its size or complexity) fail the page.
+    if not response.data or response.data.get(self.entity.root_field) is None:
+      print(response.errors)
+      raise Exception(error_message)
+    data = response.data[self.entity.root_field]
+
+    record_count += len(records)
+    self.observe_page(scope_ids, time.time() - start_time, record_count, response)
+    if self.complete_nested_connections and len(self.entity.nested_connections) > 0:
+      self.complete_page_connections(records)
+
+    yield DeltaPage(chunk_index, scope_ids, change_tracking_version, data['nextChangeTrackingVersion'], data['moreAvailable'], records)
+
+  # Reports a retrieved page of `record_count` records to the chunker and the instrumentation.
+  def observe_page(self, scope_ids: List[str], seconds: float, record_count: int, response: GqlResponse) -> None:
+    if self.chunker is not None:
+      self.chunker.observe_page(len(scope_ids), seconds, record_count, response.transfer_stats.response_bytes)
+    if self.instrumentation is not None:
+      self.instrumentation.record_page(self.entity.delta_operation.name, record_count)
+
+  # Completes the nested connections of the records of one page that were truncated. A failed query fails the page,
+  # like a failed delta query.
+  def complete_page_connections(self, records: List[Any]) -> None:
+    start_time = time.time()
+    execute = lambda document, variables: Transport.execute_gql_request(self.gql_url, self.token, document, variables)
+    completed = complete_connections(records, self.entity.nested_connections, execute, self.connection_batch_size, self.connection_max_workers)
+
+    if completed > 0:
+      print(f'Completed the nested connections of {completed} {self.entity.name}.')
+      if self.instrumentation is not None:
+        self.instrumentation.record_stage('Nested connection completion', time.time() - start_time)
+
+  # Walks every page of the delta for one chunk, starting at `change_tracking_version`.
+  # With a `chunker`, a chunk whose query fails is split in two and the parts are walked in its place; the first page
+  # of the first part then carries the `splits` that led to it, so that they can be checkpointed in order. A streamed
+  # page that fails after some of its records were handed over is retried (or split) as a whole, so those records
+  # are handed over again, as they would be when resuming from the last checkpoint.
+  def iter_chunk_pages(self, chunk_index: int, scope_ids: List[str], change_tracking_version: int, splits: List[Tuple[List[str], List[List[str]], int]] = None) -> Iterator[DeltaPage]:
+    print(f'Processing chunk {chunk_index}')
+    chunk_start_time = time.time()
+    counts: dict[str, int] = {}
+    more_available = True
+
+    while more_available:
+      try:
+        for page in self.iter_delta_page(chunk_index, scope_ids, change_tracking_version):
+          if page.partial:
+            if self.chunker is not None:
+              self.chunker.count_records(page.records, counts)
+            yield page
+      except Exception as error:
+        if self.chunker is None or len(scope_ids) < 2 or not self.chunker.should_split(error):
+          raise
+
+        self.chunker.observe_page(len(scope_ids), time.time() - chunk_start_time, 0, 0, failed=True)
+        parts = self.chunker.split(scope_ids)
+        print(f'Splitting chunk {chunk_index} into parts of {" and ".join(str(len(part)) for part in parts)} IDs after: {error}')
+        split = (scope_ids, parts, change_tracking_version)
+        yield from self.iter_chunk_pages(chunk_index, parts[0], change_tracking_version, (splits or []) + [split])
+        for part in parts[1:]:
+          yield from self.iter_chunk_pages(chunk_index, part, change_tracking_version)
+        return
+
+      if splits:
+        page.splits = splits
+        splits = None
+      if self.chunker is not None:
+        self.chunker.count_records(page.records, counts)
+      yield page
+
+      more_available = page.more_available
+      change_tracking_version = page.next_change_tracking_version
+
+    if self.chunker is not None:
+      self.chunker.observe_chunk(scope_ids, counts)
+    if self.instrumentation is not None:
+      self.instrumentation.record_stage('Chunk processing', time.time() - chunk_start_time)
+
+  # Splits the partner's advertisers (or, for partner-scoped entities, the partner itself) into chunks, each paired
+  # with the version to start walking it at. If `starting_minimum_tracking_version` is 0, the current minimum tracking
+  # version is fetched. If `incremental` is set, each advertiser starts at its watermark from the checkpoint store
+  # instead, and advertisers are grouped by watermark so that no chunk re-reads changes most of its advertisers have
+  # already seen.
+  # Callers that keep the advertiser IDs and watermarks in memory (see `DeltaDaemon`) pass them as `scope_ids` and
+  # `watermarks`, in which case neither the advertisers nor the checkpoint store are queried.
+  def plan_chunks(self, partner_id: str, starting_minimum_tracking_version: int = 0, incremental: bool = False, scope_ids: Optional[List[str]] = None,
+                  watermarks: Optional[dict[str, int]] = None) -> List[Tuple[List[str], int]]:
+    if self.entity.scope != ADVERTISER_SCOPE:
+      scope_ids = [partner_id]
+    elif scope_ids is None:
+      scope_ids = self.advertiser_roster.get_advertiser_ids(partner_id) if self.advertiser_roster is not None else self.get_advertiser_ids(partner_id)
+      print(f'Number of advertiserIds: {len(scope_ids)}')
+
+    if len(scope_ids) == 0:
+      return []
+
+    if watermarks is None:
+      watermarks = self.checkpoint_store.get_watermarks(partner_id, self.entity.name) if incremental and self.checkpoint_store is not None else {}
+
+    # Pick up where the tuning of previous walks left off.
+    if self.chunker is not None and self.checkpoint_store is not None:
+      self.chunker.activity.update(self.checkpoint_store.get_activity(partner_id, self.entity.name))
+      chunk_size = self.checkpoint_store.get_chunk_size(partner_id, self.entity.name)
+      if chunk_size is not None:
+        self.chunker.chunk_size = chunk_size
+
+    # Get the current minimum (earliest) tracking version if a `starting_minimum_tracking_version` is not specified.
+    # Watermarks older than it have expired, so they are moved up to it.
+    minimum_tracking_version = starting_minimum_tracking_version
+    if minimum_tracking_version == 0:
+      minimum_tracking_version = self.get_current_minimum_tracking_version(scope_ids[0])
+      watermarks = { scope_id: max(version, minimum_tracking_version) for scope_id, version in watermarks.items() }
+
+    if len(watermarks) > 0:
+      print(f'Continuing {sum(1 for scope_id in scope_ids if scope_id in watermarks)} of {len(scope_ids)} ID(s) from their watermarks.')
+      # A stable sort keeps the roster order among IDs with the same starting version.
+      scope_ids = sorted(scope_ids, key=lambda scope_id: watermarks.get(scope_id, minimum_tracking_version))
+
+    if self.chunker is not None and self.entity.scope == ADVERTISER_SCOPE:
+      # Pack each group of IDs with the same starting version separately, so that no chunk starts earlier than its IDs need.
+      chunks = []
+      for _, group in itertools.groupby(scope_ids, key=lambda scope_id: watermarks.get(scope_id, minimum_tracking_version)):
+        chunks.extend(self.chunker.make_chunks(list(group)))
+      print(f'Packed {len(scope_ids)} advertisers into {len(chunks)} chunks of up to {self.chunker.chunk_size}.')
+    else:
+      # Split the IDs into chunks of advertisers_chunk_size, each starting at the earliest version one of its IDs needs.
+      chunks = [scope_ids[i:i + self.advertisers_chunk_size] for i in range(0, len(scope_ids), self.advertisers_chunk_size)]
+    return [(chunk, min(watermarks.get(scope_id, minimum_tracking_version) for scope_id in chunk)) for chunk in chunks]
+
+  # Starts (or, if `resume` is set, continues) a walk of the delta for a partner and returns its (chunk index, IDs,
+  # starting version) tasks, or `None` if there is nothing to walk. See `plan_chunks` for how the chunks and their
+  # starting versions are chosen.
+  # With a `checkpoint_store`, if `resume` is set and the previous walk did not complete, it is continued from its
+  # checkpoints instead: completed chunks are skipped and the others restart at their last checkpointed version.
+  def start_walk(self, partner_id: str, starting_minimum_tracking_version: int = 0, resume: bool = False, incremental: bool = False) -> Optional[List[Tuple[int, List[str], int]]]:
+    tasks = None
+    # Completed chunks are not walked again, but their final versions still bound the version to resume from.
+    self._chunk_next_versions = []
+
+    if self.checkpoint_store is not None and resume:
+      resumed_minimum_tracking_version = self.checkpoint_store.get_incomplete_run(partner_id, self.entity.name)
+      if resumed_minimum_tracking_version is not None:
+        self.minimum_tracking_version = resumed_minimum_tracking_version
+        checkpoints = self.checkpoint_store.get_chunk_checkpoints(partner_id, self.entity.name)
+        self._chunk_next_versions = [checkpoint.change_tracking_version for checkpoint in checkpoints if checkpoint.completed]
+        tasks = [(checkpoint.chunk_index, checkpoint.scope_ids, checkpoint.change_tracking_version) for checkpoint in checkpoints if not checkpoint.completed]
+        print(f'Resuming the walk from tracking version {self.minimum_tracking_version}: {len(self._chunk_next_versions)} of {len(checkpoints)} chunk(s) already completed.')
+
+    if tasks is None:
+      chunks = self.plan_chunks(partner_id, starting_minimum_tracking_version, incremental)
+      if len(chunks) == 0:
+        self.minimum_tracking_version = self.next_change_tracking_version = starting_minimum_tracking_version
+        return None
+
+      self.minimum_tracking_version = min(version for _, version in chunks)
+      if self.checkpoint_store is not None:
+        self.checkpoint_store.start_run(partner_id, self.entity.name, self.minimum_tracking_version, chunks)
+      tasks = [(chunk_index, chunk, version) for chunk_index, (chunk, version) in enumerate(chunks)]
+
+    print(f'Minimum tracking version: {self.minimum_tracking_version}')
+    return tasks
+
+  # Records that a page of the walk has been processed: with a `checkpoint_store`, the page is checkpointed. Partial
+  # pages are checkpointed with the page they belong to.
+  def finish_page(self, partner_id: str, page: DeltaPage) -> None:
+    if page.partial:
+      return
+    if self.checkpoint_store is not None:
+      for split_scope_ids, parts, split_version in page.splits:
+        self.checkpoint_store.split_chunk(partner_id, self.entity.name, page.chunk_index, split_scope_ids, parts, split_version)
+      self.checkpoint_store.save_chunk_checkpoint(partner_id, self.entity.name, page.scope_ids, page.next_change_tracking_version, not page.more_available)
+    if not page.more_available:
+      self._chunk_next_versions.append(page.next_change_tracking_version)
+
+  # Records that every chunk of the walk has been processed and sets `next_change_tracking_version`.
+  def finish_walk(self, partner_id: str) -> None:
+    # Chunks finish at different times, so the earliest of their final versions is the one to resume from:
+    # starting the next walk there re-reads at most a few changes but never skips any.
+    self.next_change_tracking_version = min(self._chunk_next_versions) if len(self._chunk_next_versions) > 0 else self.minimum_tracking_version
+    if self.checkpoint_store is not None:
+      self.checkpoint_store.complete_run(partner_id, self.entity.name, self.next_change_tracking_version)
+      if self.chunker is not None:
+        self.checkpoint_store.save_activity(partner_id, self.entity.name, self.chunker.activity)
+        self.checkpoint_store.save_chunk_size(partner_id, self.entity.name, self.chunker.chunk_size)
+
+  # Walks the delta for a partner and yields its pages as they arrive, in order within each chunk. Once exhausted,
+  # `next_change_tracking_version` holds the version to start the next walk from. See `start_walk` for how the walk
+  # starts or resumes.
+  # With a `checkpoint_store`, each page is checkpointed once the caller asks for the next one, i.e. after it has been
+  # processed.
+  def iter_pages(self, partner_id: str, starting_minimum_tracking_version: int = 0, resume: bool = False, incremental: bool = False) -> Iterator[DeltaPage]:
+    tasks = self.start_walk(partner_id, starting_minimum_tracking_version, resume, incremental)
+    if tasks is None:
+      return
+
+    for page in self.walk_chunks(tasks):
+      yield page
+      self.finish_page(partner_id, page)
+
+    self.finish_walk(partner_id)
+
+  # Walks the pages of each (chunk index, IDs, starting version) task, `max_workers` chunks at a time, and yields
+  # the pages as they arrive. Each chunk's pages are yielded in order, but pages of concurrent chunks interleave.
+  def walk_chunks(self, tasks: List[Tuple[int, List[str], int]]) -> Iterator[DeltaPage]:
+    return walk_concurrently([functools.partial(self.iter_chunk_pages, *task) for task in tasks], self.max_workers)
+
+  # Walks the delta for a partner and yields each changed entity as it arrives.
+  def iter_records(self, partner_id: str, starting_minimum_tracking_version: int = 0, resume: bool = False, incremental: bool = False) -> Iterator[Any]:
+    for page in self.iter_pages(partner_id, starting_minimum_tracking_version, resume, incremental):
+      yield from page.records
+
+  # Walks the delta for a partner, handing every page to `sinks` as it arrives, and returns the changed entities
+  # (unless `collect_records` is `False`) along with the version to resume from. Pages are checkpointed only after
+  # every sink has consumed them. A resumed walk only returns the entities retrieved after the checkpoints of the
+  # interrupted one.
+  def run(self, partner_id: str, starting_minimum_tracking_version: int = 0, resume: bool = False, sinks: List[DeltaSink] = (), collect_records: bool = True, incremental: bool = False) -> DeltaResult:
+    records = []
+    record_count = 0
+    for page in self.iter_pages(partner_id, starting_minimum_tracking_version, resume, incremental):
+      for sink in sinks:
+        sink.write_page(page)
+      if collect_records:
+        records.extend(page.records)
+      record_count += len(page.records)
+
+    return DeltaResult(records, record_count, self.minimum_tracking_version, self.next_change_tracking_version)
@@ -0,0 +1,158 @@
+###################################################################################
+# Local materialized view of delta entities.
+# Delta pages list every change, so an entity changed five times shows up five
+# times. The entity store folds the pages into the current state of each entity:
+# records are upserted by ID into a SQLite file, a record only replacing one from
+# the same or an older `nextChangeTrackingVersion`, and archived entities are kept
+# as tombstones. Lookups by ID, advertiser or campaign are served from indexes,
+# without touching the API.
+###################################################################################
+
+import sqlite3
+import threading
+from typing import Any, List, Optional
+
+from .DeltaEntities import DeltaEntity
+from .Sinks import DeltaSink
+from .Streaming import dumps, loads
+
+# Returns the fields of `record` merged into those of `stored`: nested objects are merged field by field, while
+# scalars and lists are replaced.
+def merge_records(stored: Any, record: Any) -> Any:
+  merged = dict(stored)
+  for key, value in record.items():
+    if isinstance(value, dict) and isinstance(merged.get(key), dict):
+      merged[key] = merge_records(merged[key], value)
+    else:
+      merged[key] = value
+  return merged
+
+# Holds the current state of delta entities in a SQLite file.
+class EntityStore:
+  def __init__(self, path: str) -> None:
+    # The SQLite file holding the entities.
+    self.path = path
+    self._local = threading.local()
+
+    connection = self._get_connection()
+    with connection:
+      connection.execute('CREATE TABLE IF NOT EXISTS delta_entities (entity TEXT NOT NULL, id TEXT NOT NULL, advertiser_id TEXT, campaign_id TEXT, change_tracking_version INTEGER NOT NULL, is_archived INTEGER NOT NULL, data BLOB NOT NULL, PRIMARY KEY (entity, id))')
+      connection.execute('CREATE INDEX IF NOT EXISTS delta_entities_advertiser ON delta_entities (entity, advertiser_id)')
+      connection.execute('CREATE INDEX IF NOT EXISTS delta_entities_campaign ON delta_entities (entity, campaign_id)')
+      connection.execute('CREATE INDEX IF NOT EXISTS delta_entities_version ON delta_entities (entity, change_tracking_version)')
+
+  # Returns the connection of the calling thread. Connections are kept open, as opening one per lookup would cost more
+  # than the lookup itself, and use write-ahead logging so that readers are not blocked while pages are upserted.
+  def _get_connection(self) -> sqlite3.Connection:
+    connection = getattr(self._local, 'connection', None)
+    if connection is None:
+      connection = sqlite3.connect(self.path, timeout=30)
+      connection.execute('PRAGMA journal_mode=WAL')
+      connection.execute('PRAGMA synchronous=NORMAL')
+      self._local.connection = connection
+    return connection
+
+  # Closes the connection of the calling thread.
+  def close(self) -> None:
+    connection = getattr(self._local, 'connection', None)
+    if connection is not None:
+      connection.close()
+      self._local.connection = None
+
+  # Upserts the records of one delta page of an entity type. A record only replaces a stored one from the same or an
+  # older version, so replaying an older page never reverts newer state. Archived records are kept as tombstones.
+  # Records are merged into the stored ones, so that a walk with a slimmer projection profile (e.g. ids-only) updates
+  # the fields it selects and leaves the others at their last known value instead of dropping them.
+  # Returns the number of records stored; records without an `id` cannot be stored.
+  def upsert(self, entity: str, records: List[Any], change_tracking_version: int) -> int:
+    records = [record for record in records if record.get('id') is not None]
+
+    connection = self._get_connection()
+    with connection:
+      # Hold the write lock while reading the stored records, so that no other writer changes them before the merge.
+      connection.execute('BEGIN IMMEDIATE')
+      stored_records = {}
+      record_ids = list(dict.fromkeys(record['id'] for record in records))
+      for i in range(0, len(record_ids), 500):
+        chunk = record_ids[i:i + 500]
+        rows = connection.execute(f'SELECT id, data FROM delta_entities WHERE entity = ? AND change_tracking_version <= ? AND id IN ({", ".join("?" * len(chunk))})',
+                                  (entity, change_tracking_version) + tuple(chunk)).fetchall()
+        stored_records.update((row[0], loads(row[1])) for row in rows)
+
+      rows = []
+      for record in records:
+        stored_record = stored_records.get(record['id'])
+        if stored_record is not None:
+          record = merge_records(stored_record, record)
+          # A record listed twice on a page is merged into its latest state.
+          stored_records[record['id']] = record
+        rows.append((entity, record['id'], (record.get('advertiser') or {}).get('id'), (record.get('campaign') or {}).get('id'),
+                     change_tracking_version, int(bool(record.get('isArchived'))), dumps(record)))
+
+      connection.executemany("""
+        INSERT INTO delta_entities (entity, id, advertiser_id, campaign_id, change_tracking_version, is_archived, data) VALUES (?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (entity, id) DO UPDATE SET
+          advertiser_id = excluded.advertiser_id,
+          campaign_id = excluded.campaign_id,
+          change_tracking_version = excluded.change_tracking_version,
+          is_archived = excluded.is_archived,
+          data = excluded.data
+        WHERE excluded.change_tracking_version >= delta_entities.change_tracking_version""", rows)
+
+    return len(rows)
+
+  def _select(self, entity: str, condition: str, parameters: tuple, include_archived: bool) -> List[Any]:
+    query = f'SELECT data FROM delta_entities WHERE entity = ? AND {condition}'
+    if not include_archived:
+      query += ' AND is_archived = 0'
+    rows = self._get_connection().execute(query, (entity,) + parameters).fetchall()
+    return [loads(row[0]) for row in rows]
+
+  # Returns the current state of an entity, or `None` if it is unknown (or archived, unless `include_archived` is set).
+  def get(self, entity: str, entity_id: str, include_archived: bool = False) -> Optional[Any]:
+    records = self._select(entity, 'id = ?', (entity_id,), include_archived)
+    return records[0] if len(records) > 0 else None
+
+  # Returns the current state of the given entities that are known, in no particular order.
+  def get_many(self, entity: str, entity_ids: List[str], include_archived: bool = False) -> List[Any]:
+    records = []
+    # Stay well below SQLite's limit on the number of query parameters.
+    for i in range(0, len(entity_ids), 500):
+      chunk = entity_ids[i:i + 500]
+      records.extend(self._select(entity, f'id IN ({", ".join("?" * len(chunk))})', tuple(chunk), include_archived))
+    return records
+
+  # Returns the current state of every entity of an advertiser.
+  def get_by_advertiser(self, entity: str, advertiser_id: str, include_archived: bool = False) -> List[Any]:
+    return self._select(entity, 'advertiser_id = ?', (advertiser_id,), include_archived)
+
+  # Returns the current state of every entity of a campaign.
+  def get_by_campaign(self, entity: str, campaign_id: str, include_archived: bool = False) -> List[Any]:
+    return self._select(entity, 'campaign_id = ?', (campaign_id,), include_archived)
+
+  # Returns the IDs of the entities archived at or after `since_version` (the tombstones), e.g. to propagate deletions.
+  def get_archived_ids(self, entity: str, since_version: int = 0) -> List[str]:
+    rows = self._get_connection().execute('SELECT id FROM delta_entities WHERE entity = ? AND is_archived = 1 AND change_tracking_version >= ?', (entity, since_version)).fetchall()
+    return [row[0] for row in rows]
+
+  # Returns the number of entities of a type that are stored, and not archived unless `include_archived` is set.
+  def count(self, entity: str, include_archived: bool = False) -> int:
+    query = 'SELECT COUNT(*) FROM delta_entities WHERE entity = ?' + ('' if include_archived else ' AND is_archived = 0')
+    return self._get_connection().execute(query, (entity,)).fetchone()[0]
+
+# Upserts every page of a delta walk into an entity store.
+class EntityStoreSink(DeltaSink):
+  def __init__(self, store: EntityStore, entity: DeltaEntity) -> None:
+    # The store the pages are upserted into.
+    self.store = store
+    # The entity type of the pages.
+    self.entity = entity
+
+  def write_page(self, page: Any) -> None:
+    self.store.upsert(self.entity.name, page.records, page.next_change_tracking_version)
+
+  def write_records(self, records: List[Any]) -> None:
+    raise Exception('Entity store sinks need whole pages, for their change-tracking version.')
+
+  def close(self) -> None:
+    self.store.close()
@@ -0,0 +1,218 @@
+###################################################################################
+# Per-operation instrumentation for the shared transport.
+# The transport reports every request to the registered hooks as a `RequestEvent`.
+# `Instrumentation` is a hook that aggregates those events per GraphQL operation
+# name / REST path (latency histogram, time spent decoding, request and response
+# bytes, status codes and retries) together with page and stage timings recorded
+# by the scripts, and exports them as a summary table or a JSON file.
+###################################################################################
+
+from contextlib import contextmanager
+import json
+import re
+import threading
+import time
+from typing import Any, Callable, Iterator, List, Optional
+from urllib.parse import urlsplit
+
+# The upper bounds (in seconds) of the latency histogram buckets. The last bucket holds everything slower.
+LATENCY_BUCKETS_SECONDS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Describes one request sent by the transport, after its final attempt.
+class RequestEvent:
+  def __init__(self, kind: str, operation: str, method: str, url: str) -> None:
+    # The kind of traffic, 'gql' or 'rest'.
+    self.kind = kind
+    # The GraphQL operation name, or the REST method and path.
+    self.operation = operation
+    # The HTTP method.
+    self.method = method
+    # The requested URL.
+    self.url = url
+    # The status code of the final attempt, or `None` if no response was received.
+    self.status_code: Optional[int] = None
+    # The number of attempts made, including the first one.
+    self.attempts = 0
+    # The time from sending the final attempt until its response was read.
+    self.latency_seconds = 0.0
+    # The total time spent on the request, including retries and backoff waits.
+    self.total_seconds = 0.0
+    # The time spent decoding the response body.
+    self.decode_seconds = 0.0
+    # The request and response sizes, before and after compression.
+    self.request_bytes = 0
+    self.request_wire_bytes = 0
+    self.response_bytes = 0
+    self.response_wire_bytes = 0
+    # The error raised by the final attempt, if it did not receive a response.
+    self.error: Optional[str] = None
+
+# Returns the operation name of a GQL document (e.g. `GetAdGroupsDelta`), or its operation type if it is anonymous.
+def get_gql_operation_name(document: str) -> str:
+  match = re.search(r'\b(query|mutation|subscription)\s*(\w*)', document)
+  if match is None:
+    return 'query'
+  return match.group(2) or match.group(1)
+
+# Matches path segments that are entity IDs: numbers, GUIDs and Platform IDs (e.g. `1ab2cd3`). API versions such as
+# `v3` are too short to match.
+_ID_SEGMENT = re.compile(r'\d+|[0-9a-fA-F]{8}(-[0-9a-fA-F]{4}){3}-[0-9a-fA-F]{12}|(?=[a-z]*\d)[a-z0-9]{7,12}')
+
+# Returns the REST method and path of a URL, with path segments that are IDs replaced by `{id}`.
+def get_rest_operation_name(method: str, url: str) -> str:
+  segments = ['{id}' if _ID_SEGMENT.fullmatch(segment) else segment for segment in urlsplit(url).path.split('/')]
+  return f"{method} {'/'.join(segments)}"
+
+# Aggregated metrics for one operation.
+class OperationStats:
+  def __init__(self, operation: str) -> None:
+    self.operation = operation
+    self.requests = 0
+    self.failures = 0
+    self.retries = 0
+    self.pages = 0
+    self.records = 0
+    self.latency_histogram = [0] * (len(LATENCY_BUCKETS_SECONDS) + 1)
+    self.total_latency_seconds = 0.0
+    self.max_latency_seconds = 0.0
+    self.total_decode_seconds = 0.0
+    self.request_bytes = 0
+    self.request_wire_bytes = 0
+    self.response_bytes = 0
+    self.response_wire_bytes = 0
+    self.status_codes: dict[str, int] = {}
+
+  # Adds a request event to the aggregates.
+  def add_request(self, event: RequestEvent) -> None:
+    self.requests += 1
+    self.retries += max(0, event.attempts - 1)
+    if event.error is not None or event.status_code is None or event.status_code >= 400:
+      self.failures += 1
+
+    bucket = 0
+    while bucket < len(LATENCY_BUCKETS_SECONDS) and event.latency_seconds > LATENCY_BUCKETS_SECONDS[bucket]:
+      bucket += 1
+    self.latency_histogram[bucket] += 1
+    self.total_latency_seconds += event.latency_seconds
+    self.max_latency_seconds = max(self.max_latency_seconds, event.latency_seconds)
+    self.total_decode_seconds += event.decode_seconds
+
+    self.request_bytes += event.request_bytes
+    self.request_wire_bytes += event.request_wire_bytes
+    self.response_bytes += event.response_bytes
+    self.response_wire_bytes += event.response_wire_bytes
+
+    status = str(event.status_code) if event.status_code is not None else (event.error or 'error')
+    self.status_codes[status] = self.status_codes.get(status, 0) + 1
+
+  # Estimates a latency percentile (0-100) from the histogram, as the upper bound of the bucket it falls in.
+  def get_latency_percentile(self, percentile: float) -> float:
+    if self.requests == 0:
+      return 0.0
+
+    threshold = self.requests * percentile / 100
+    seen = 0
+    for bucket, count in enumerate(self.latency_histogram):
+      seen += count
+      if seen >= threshold and count > 0:
+        return LATENCY_BUCKETS_SECONDS[bucket] if bucket < len(LATENCY_BUCKETS_SECONDS) else self.max_latency_seconds
+    return self.max_latency_seconds
+
+  def to_dict(self) -> dict[str, Any]:
+    return {
+      'operation': self.operation,
+      'requests': self.requests,
+      'failures': self.failures,
+      'retries': self.retries,
+      'pages': self.pages,
+      'records': self.records,
+      'latencySeconds': {
+        'total': self.total_latency_seconds,
+        'mean': self.total_latency_seconds / self.requests if self.requests else 0.0,
+        'p50': self.get_latency_percentile(50),
+        'p95': self.get_latency_percentile(95),
+        'max': self.max_latency_seconds,
+        'histogram': { (f'<={bound}' if i < len(LATENCY_BUCKETS_SECONDS) else f'>{LATENCY_BUCKETS_SECONDS[-1]}'): count
+                       for i, (bound, count) in enumerate(zip(LATENCY_BUCKETS_SECONDS + (None,), self.latency_histogram)) }
+      },
+      'decodeSeconds': self.total_decode_seconds,
+      'requestBytes': self.request_bytes,
+      'requestWireBytes': self.request_wire_bytes,
+      'responseBytes': self.response_bytes,
+      'responseWireBytes': self.response_wire_bytes,
+      'statusCodes': self.status_codes
+    }
+
+# Collects per-operation metrics from the transport hooks and from the scripts.
+class Instrumentation:
+  def __init__(self) -> None:
+    self.operations: dict[str, OperationStats] = {}
+    # The accumulated duration and count of each named stage measured with `measure`.
+    self.stages: dict[str, List[float]] = {}
+    self.started_at = time.time()
+    self._lock = threading.Lock()
+
+  def _get_operation(self, operation: str) -> OperationStats:
+    stats = self.operations.get(operation)
+    if stats is None:
+      stats = OperationStats(operation)
+      self.operations[operation] = stats
+    return stats
+
+  # The transport hook. Register with `Transport.add_request_hook(instrumentation.record_request)`.
+  def record_request(self, event: RequestEvent) -> None:
+    with self._lock:
+      self._get_operation(event.operation).add_request(event)
+
+  # Records that a page of `records` records was processed for the given operation.
+  def record_page(self, operation: str, records: int) -> None:
+    with self._lock:
+      stats = self._get_operation(operation)
+      stats.pages += 1
+      stats.records += records
+
+  # Records the duration of one occurrence of a named stage of the run (e.g. 'Chunk processing').
+  def record_stage(self, name: str, seconds: float) -> None:
+    with self._lock:
+      stage = self.stages.setdefault(name, [0.0, 0])
+      stage[0] += seconds
+      stage[1] += 1
+
+  # Measures the duration of the enclosed block as one occurrence of the named stage.
+  @contextmanager
+  def measure(self, name: str) -> Iterator[None]:
+    start_time = time.time()
+    try:
+      yield
+    finally:
+      self.record_stage(name, time.time() - start_time)
+
+  def to_dict(self) -> dict[str, Any]:
+    with self._lock:
+      return {
+        'elapsedSeconds': time.time() - self.started_at,
+        'operations': [stats.to_dict() for stats in self.operations.values()],
+        'stages': { name: { 'totalSeconds': total, 'count': count } for name, (total, count) in self.stages.items() }
+      }
+
+  # Writes the metrics to a JSON file.
+  def write_json(self, path: str) -> None:
+    with open(path, 'w') as file:
+      json.dump(self.to_dict(), file, indent=2)
+
+  # Prints the metrics as a table with one row per operation, followed by the stage timings.
+  def print_summary(self, print_line: Callable[[str], None] = print) -> None:
+    summary = self.to_dict()
+
+    print_line(f"{'Operation':<40} {'Reqs':>6} {'Fail':>5} {'Retry':>5} {'Pages':>6} {'Records':>9} {'Mean s':>7} {'p95 s':>7} {'Max s':>7} {'Decode s':>8} {'Sent KB':>9} {'Recv KB':>9} Status codes")
+    for stats in summary['operations']:
+      latency = stats['latencySeconds']
+      status_codes = ', '.join(f'{code}: {count}' for code, count in stats['statusCodes'].items())
+      print_line(
+        f"{stats['operation'][:40]:<40} {stats['requests']:>6} {stats['failures']:>5} {stats['retries']:>5} {stats['pages']:>6} {stats['records']:>9} "
+        f"{latency['mean']:>7.3f} {latency['p95']:>7.3f} {latency['max']:>7.3f} {stats['decodeSeconds']:>8.3f} "
+        f"{stats['requestWireBytes'] / 1024:>9.1f} {stats['responseWireBytes'] / 1024:>9.1f} {status_codes}")
+
+    for name, stage in summary['stages'].items():
+      print_line(f"{name}: {stage['totalSeconds']:.2f} seconds over {stage['count']} run(s)")
+    print_line(f"Total processing time: {summary['elapsedSeconds']:.2f} seconds")
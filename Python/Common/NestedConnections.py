@@ -0,0 +1,106 @@
+###################################################################################
+# Completion of nested connections that a delta record only holds the first page of.
+# The delta queries select nested connections such as the creatives of an ad group
+# without paging them, so a large ad group comes back with only part of its
+# creatives. Records whose `totalCount` exceeds the nodes they hold are completed
+# with follow-up queries that page the connection from where the record left off:
+# up to `batch_size` records per aliased document (`e0: adGroup(id: $id0) {...}`),
+# with several documents in flight at once.
+###################################################################################
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, List, Optional, Tuple
+
+from .Transport import GqlResponse
+
+# A nested connection of a delta entity type, e.g. the `creatives` of `adGroup`.
+class NestedConnection:
+  def __init__(self, root_field: str, field: str, node_selection: str, id_type: str = 'ID!') -> None:
+    # The root field looking up one entity by ID, e.g. `adGroup`.
+    self.root_field = root_field
+    # The connection field of the entity, e.g. `creatives`.
+    self.field = field
+    # The fields selected for each node of the connection, e.g. `id`.
+    self.node_selection = node_selection
+    # The GraphQL type of the `id` argument.
+    self.id_type = id_type
+    self._documents: dict[int, str] = {}
+
+  # Returns the aliased document continuing the connection of a batch of the given size. Documents are cached, so
+  # each size is built once.
+  def get_document(self, size: int) -> str:
+    document = self._documents.get(size)
+    if document is None:
+      operation_name = f'Complete{self.root_field[0].upper()}{self.root_field[1:]}{self.field[0].upper()}{self.field[1:]}'
+      arguments = ', '.join(f'$id{i}: {self.id_type}, $after{i}: String' for i in range(size))
+      lookups = '\n'.join(f'  e{i}: {self.root_field}(id: $id{i}) {{ {self.field}(after: $after{i}) {{ nodes {{ {self.node_selection} }} pageInfo {{ hasNextPage endCursor }} }} }}'
+                          for i in range(size))
+      document = f'query {operation_name}({arguments}) {{\n{lookups}\n}}'
+      self._documents[size] = document
+    return document
+
+# The completion of the connection of one record.
+class _PendingConnection:
+  def __init__(self, entity_id: str, connection: Any) -> None:
+    self.entity_id = entity_id
+    self.connection = connection
+    # Continue after the last node the record holds if its page info was selected, otherwise start over.
+    self.cursor: Optional[str] = (connection.get('pageInfo') or {}).get('endCursor')
+    self.nodes: List[Any] = list(connection.get('nodes') or []) if self.cursor is not None else []
+    self.end_cursor = self.cursor
+
+# Completes, in place, the nested connections of `records` whose `totalCount` exceeds the nodes they hold. `execute`
+# sends a GQL document with its variables, e.g. a script's `execute_gql_request`. Returns the number of records that
+# were completed.
+def complete_connections(records: List[Any], connections: List[NestedConnection], execute: Callable[[str, dict[str, Any]], Tuple[bool, GqlResponse]],
+                         batch_size: int = 50, max_workers: int = 4) -> int:
+  completed = 0
+  for connection in connections:
+    pending = []
+    for record in records:
+      value = record.get(connection.field)
+      if value is not None and record.get('id') is not None and (value.get('totalCount') or 0) > len(value.get('nodes') or []):
+        pending.append(_PendingConnection(record['id'], value))
+    completed += len(pending)
+
+    # Each round fetches the next page of every connection that is still incomplete.
+    while len(pending) > 0:
+      batches = [pending[i:i + batch_size] for i in range(0, len(pending), batch_size)]
+      with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for _ in executor.map(lambda batch: fetch_next_pages(connection, batch, execute), batches):
+          pass
+
+      remaining = []
+      for item in pending:
+        if item.cursor is None:
+          item.connection['nodes'] = item.nodes
+          if item.connection.get('pageInfo') is not None:
+            item.connection['pageInfo']['endCursor'] = item.end_cursor
+        else:
+          remaining.append(item)
+      pending = remaining
+
+  return completed
+
+# Fetches the next page of the connection of every record of a batch. Sets the cursor of the records whose connection
+# has no more pages to `None`.
+def fetch_next_pages(connection: NestedConnection, batch: List[_PendingConnection], execute: Callable[[str, dict[str, Any]], Tuple[bool, GqlResponse]]) -> None:
+  variables: dict[str, Any] = {}
+  for i, item in enumerate(batch):
+    variables[f'id{i}'] = item.entity_id
+    variables[f'after{i}'] = item.cursor
+
+  request_success, response = execute(connection.get_document(len(batch)), variables)
+  if not request_success or not response.data:
+    print(response.errors)
+    raise Exception(f'Failed to complete the {connection.field} of {connection.root_field}s.')
+
+  for i, item in enumerate(batch):
+    entity = response.data.get(f'e{i}')
+    page = entity.get(connection.field) if entity is not None else None
+    if page is None:
+      raise Exception(f'Failed to complete the {connection.field} of {connection.root_field} {item.entity_id}.')
+
+    item.nodes.extend(page['nodes'])
+    item.end_cursor = page['pageInfo']['endCursor']
+    item.cursor = page['pageInfo']['endCursor'] if page['pageInfo']['hasNextPage'] else None
@@ -0,0 +1,119 @@
+###################################################################################
+# Delta walks for many partners in one process.
+# Rather than one process per partner, each with its own connections, the walks of
+# all partners share one worker pool, one connection pool and the transport's rate
+# limiter. Chunks are scheduled round-robin across partners, so a partner with
+# thousands of advertisers does not hold up the others, and a partner whose walk
+# fails does not stop the rest.
+###################################################################################
+
+from concurrent.futures import ThreadPoolExecutor
+import itertools
+from typing import Any, Callable, Iterator, List, Tuple
+
+from . import Transport
+from .DeltaSync import DeltaPage, DeltaResult, DeltaSync, walk_concurrently
+from .Sinks import DeltaSink
+
+# Walks the delta of one entity type for several partners over a shared worker pool.
+class PartnerFanOut:
+  def __init__(self, create_delta_sync: Callable[[], DeltaSync], max_workers: int = 4) -> None:
+    # Creates the delta engine of each partner, which holds the state of its walk. Its own `max_workers` is not used.
+    self.create_delta_sync = create_delta_sync
+    # The number of chunks walked concurrently, over all partners.
+    self.max_workers = max(1, max_workers)
+    # The delta engine of each partner of the last walk.
+    self.delta_syncs: dict[str, DeltaSync] = {}
+    # The error that stopped the walk of each partner that failed.
+    self.errors: dict[str, Exception] = {}
+
+  # Starts the walk of every partner, `max_workers` at a time, and returns the tasks of each partner that has any.
+  def start_walks(self, partner_ids: List[str], starting_minimum_tracking_version: int, resume: bool, incremental: bool) -> dict[str, List[Tuple[int, List[str], int]]]:
+    def start_walk(partner_id: str) -> Any:
+      try:
+        return self.delta_syncs[partner_id].start_walk(partner_id, starting_minimum_tracking_version, resume, incremental)
+      except Exception as error:
+        return error
+
+    with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+      outcomes = list(executor.map(start_walk, partner_ids))
+
+    partner_tasks = {}
+    for partner_id, outcome in zip(partner_ids, outcomes):
+      if isinstance(outcome, Exception):
+        print(f'Failed to start the walk of partner {partner_id}: {outcome}')
+        self.errors[partner_id] = outcome
+      elif outcome is not None:
+        partner_tasks[partner_id] = outcome
+    return partner_tasks
+
+  # Walks the delta for every partner and yields (partner ID, page) pairs as they arrive, in order within each chunk.
+  # The first chunk of every partner is scheduled before the second chunk of any, and so on. Pages are checkpointed
+  # (if the partners' engines have a checkpoint store) once the caller asks for the next one. A partner whose walk
+  # fails is recorded in `errors` and its remaining chunks are skipped; the other partners carry on.
+  def iter_pages(self, partner_ids: List[str], starting_minimum_tracking_version: int = 0, resume: bool = False, incremental: bool = False) -> Iterator[Tuple[str, DeltaPage]]:
+    self.delta_syncs = { partner_id: self.create_delta_sync() for partner_id in partner_ids }
+    self.errors = {}
+
+    # Make sure every worker can hold its own keep-alive connection.
+    if self.max_workers > Transport.pool_maxsize:
+      Transport.configure_pool(maxsize=self.max_workers)
+
+    partner_tasks = self.start_walks(partner_ids, starting_minimum_tracking_version, resume, incremental)
+    remaining_chunks = { partner_id: len(tasks) for partner_id, tasks in partner_tasks.items() }
+    # A resumed walk may have no chunks left.
+    for partner_id, tasks in partner_tasks.items():
+      if len(tasks) == 0:
+        self.delta_syncs[partner_id].finish_walk(partner_id)
+
+    # A failure is handed over as an item as well, so that it only ends the walk of its own partner.
+    def walk_chunk(partner_id: str, task: Tuple[int, List[str], int]) -> Iterator[Tuple[str, Any]]:
+      if partner_id in self.errors:
+        return
+      try:
+        for page in self.delta_syncs[partner_id].iter_chunk_pages(*task):
+          yield (partner_id, page)
+          if partner_id in self.errors:
+            return
+      except Exception as error:
+        yield (partner_id, error)
+
+    # Interleave the partners' chunks: the first of each, then the second of each, and so on.
+    rounds = itertools.zip_longest(*[[(partner_id, task) for task in tasks] for partner_id, tasks in partner_tasks.items()])
+    scheduled = [(partner_id, task) for chunk_round in rounds for partner_id, task in filter(None, chunk_round)]
+    tasks = [lambda partner_id=partner_id, task=task: walk_chunk(partner_id, task) for partner_id, task in scheduled]
+
+    for partner_id, item in walk_concurrently(tasks, self.max_workers):
+      if partner_id in self.errors:
+        continue
+      if isinstance(item, Exception):
+        print(f'Failed to walk the delta of partner {partner_id}: {item}')
+        self.errors[partner_id] = item
+        continue
+
+      yield (partner_id, item)
+
+      delta_sync = self.delta_syncs[partner_id]
+      delta_sync.finish_page(partner_id, item)
+      # A chunk that was split completes once each of its parts has.
+      remaining_chunks[partner_id] += sum(len(parts) - 1 for _, parts, _ in item.splits)
+      if not item.more_available:
+        remaining_chunks[partner_id] -= 1
+        if remaining_chunks[partner_id] == 0:
+          delta_sync.finish_walk(partner_id)
+
+  # Walks the delta for every partner, handing every page to `sinks` as it arrives, and returns the result of each
+  # partner whose walk completed (see `DeltaSync.run`). The partners that failed are in `errors`.
+  def run(self, partner_ids: List[str], starting_minimum_tracking_version: int = 0, resume: bool = False, sinks: List[DeltaSink] = (), collect_records: bool = True,
+          incremental: bool = False) -> dict[str, DeltaResult]:
+    records: dict[str, List[Any]] = { partner_id: [] for partner_id in partner_ids }
+    record_counts = { partner_id: 0 for partner_id in partner_ids }
+    for partner_id, page in self.iter_pages(partner_ids, starting_minimum_tracking_version, resume, incremental):
+      for sink in sinks:
+        sink.write_page(page)
+      if collect_records:
+        records[partner_id].extend(page.records)
+      record_counts[partner_id] += len(page.records)
+
+    return { partner_id: DeltaResult(records[partner_id], record_counts[partner_id], delta_sync.minimum_tracking_version, delta_sync.next_change_tracking_version)
+             for partner_id, delta_sync in self.delta_syncs.items() if partner_id not in self.errors }
@@ -0,0 +1,126 @@
+###################################################################################
+# Registry of constant GQL documents shared by the scripts.
+# Each document takes its cursors and inputs purely as GraphQL variables and is
+# built once at import, so every request sends byte-identical text the server can
+# cache, and each operation has a stable SHA-256 hash for persisted-query requests.
+###################################################################################
+
+import hashlib
+
+# A named GQL document along with its stable hash.
+class GqlOperation:
+  def __init__(self, name: str, document: str) -> None:
+    # The operation name, as declared in the document.
+    self.name = name
+    # The GQL document text.
+    self.document = document
+    # The SHA-256 hash of the document, as used by the persisted-query protocol.
+    self.sha256_hash = hashlib.sha256(document.encode('utf-8')).hexdigest()
+
+_operations: dict[str, GqlOperation] = {}
+
+# Registers a GQL document under its operation name and returns the `GqlOperation`.
+# Registering a different document under an existing name is an error.
+def register_operation(name: str, document: str) -> GqlOperation:
+  operation = _operations.get(name)
+  if operation is not None:
+    if operation.document != document:
+      raise Exception(f"A different document is already registered for operation '{name}'.")
+    return operation
+
+  operation = GqlOperation(name, document)
+  _operations[name] = operation
+  return operation
+
+# Returns the registered operation with the given name.
+def get_operation(name: str) -> GqlOperation:
+  operation = _operations.get(name)
+  if operation is None:
+    raise Exception(f"No operation named '{name}' is registered.")
+  return operation
+
+###################
+# Shared operations
+###################
+
+# Retrieves a page of up to 1,000 advertiser IDs for a partner. Pass `after: null` for the first page.
+GET_PARTNER_ADVERTISERS = register_operation('GetAdvertisers', """
+query GetAdvertisers($partnerId: String!, $after: String) {
+  advertisers(
+    where: {
+      partnerId: { eq: $partnerId }
+    }
+    after: $after
+    first: 1000) {
+    nodes {
+      id
+    }
+    pageInfo {
+      endCursor
+      hasNextPage
+    }
+  }
+}""")
+
+# Retrieves a page of ad group budgets, along with the budgeting version of their campaigns. The IDs are declared as
+# `[String!]!` because the `in` filters of `where` take strings rather than `ID`s, as in the campaign lookups of
+# `Campaign/Cloning` (`VerifyCloneCampaignsAreKokai`).
+GET_AD_GROUP_BUDGETS_WITH_CAMPAIGN_VERSION = register_operation('GetAdGroupBudgetsWithCampaignVersion', """
+query GetAdGroupBudgetsWithCampaignVersion($adGroupIds: [String!]!, $after: String) {
+  adGroups(
+    after: $after
+    where: { id: { in: $adGroupIds } }
+  ) {
+    nodes {
+      id
+      budget {
+        currentFlightBudget
+      }
+      campaign {
+        budgetMigrationStatus {
+          currentBudgetingVersion
+        }
+      }
+    }
+    pageInfo {
+      hasNextPage
+      endCursor
+    }
+  }
+}""")
+
+# Upgrades a campaign budget to Kokai. `$input` carries the campaign ID, budgeting version and campaign flights.
+UPGRADE_CAMPAIGN_BUDGET_TO_KOKAI = register_operation('UpgradeCampaignBudgetToKokai', """
+mutation UpgradeCampaignBudgetToKokai($input: CampaignBudgetSettingsUpdateInput!) {
+  campaignBudgetSettingsUpdate(input: $input) {
+    data {
+      campaign {
+        pacingMode
+        flights {
+          edges {
+            node {
+              budgetInAdvertiserCurrency
+              dailyTargetInAdvertiserCurrency
+              startDateInclusiveUTC
+              endDateExclusiveUTC
+              id
+              adGroupFlights {
+                edges {
+                  node {
+                    adGroupId
+                    dailyTargetInAdvertiserCurrency
+                    minimumSpendInAdvertiserCurrency
+                  }
+                }
+              }
+            }
+          }
+        }
+      }
+    }
+    userErrors {
+      field
+      message
+    }
+  }
+}""")
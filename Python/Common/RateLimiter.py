@@ -0,0 +1,121 @@
+###################################################################################
+# Client-side token-bucket rate limiting for the shared transport.
+# Every request acquires a token from the budget of the endpoint it targets before
+# it is sent, so concurrent scripts stay under the server's throttling limits
+# instead of bursting into 429s. Budgets can be shared between processes through
+# a local SQLite file.
+###################################################################################
+
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+# A token bucket that refills at `rate_per_second` up to `burst` tokens, shared by the threads of this process.
+class TokenBucket:
+  def __init__(self, rate_per_second: float, burst: int = None) -> None:
+    # The sustained number of requests allowed per second.
+    self.rate_per_second = rate_per_second
+    # The number of requests that may be sent back-to-back after an idle period.
+    self.burst = burst if burst is not None else max(1, int(rate_per_second))
+    self._tokens = float(self.burst)
+    self._updated_at = time.monotonic()
+    self._lock = threading.Lock()
+
+  # Takes a token if one is available. Returns 0 on success, otherwise the number of seconds until one will be.
+  def try_acquire(self) -> float:
+    with self._lock:
+      now = time.monotonic()
+      self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate_per_second)
+      self._updated_at = now
+
+      if self._tokens >= 1:
+        self._tokens -= 1
+        return 0
+      return (1 - self._tokens) / self.rate_per_second
+
+  # Blocks until a token is available and takes it.
+  def acquire(self) -> None:
+    while True:
+      wait = self.try_acquire()
+      if wait <= 0:
+        return
+      time.sleep(wait)
+
+# A token bucket whose state lives in a SQLite file, so every process using the same file shares the budget.
+class SqliteTokenBucket(TokenBucket):
+  def __init__(self, path: str, name: str, rate_per_second: float, burst: int = None) -> None:
+    super().__init__(rate_per_second, burst)
+    # The SQLite file holding the bucket state.
+    self.path = path
+    # The key of this bucket within the file.
+    self.name = name
+
+    with self._connect() as connection:
+      connection.execute('CREATE TABLE IF NOT EXISTS token_buckets (name TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)')
+
+  def _connect(self) -> sqlite3.Connection:
+    return sqlite3.connect(self.path, timeout=30, isolation_level=None)
+
+  def try_acquire(self) -> float:
+    connection = self._connect()
+    try:
+      # `BEGIN IMMEDIATE` takes the database write lock, serializing the read-modify-write across processes.
+      connection.execute('BEGIN IMMEDIATE')
+      # Wall-clock time is used because monotonic clocks are not comparable across processes.
+      now = time.time()
+      row = connection.execute('SELECT tokens, updated_at FROM token_buckets WHERE name = ?', (self.name,)).fetchone()
+      tokens = float(self.burst) if row is None else min(self.burst, row[0] + max(0.0, now - row[1]) * self.rate_per_second)
+
+      wait = 0.0
+      if tokens >= 1:
+        tokens -= 1
+      else:
+        wait = (1 - tokens) / self.rate_per_second
+
+      connection.execute('INSERT OR REPLACE INTO token_buckets (name, tokens, updated_at) VALUES (?, ?, ?)', (self.name, tokens, now))
+      connection.execute('COMMIT')
+      return wait
+    except:
+      if connection.in_transaction:
+        connection.execute('ROLLBACK')
+      raise
+    finally:
+      connection.close()
+
+# Holds the per-endpoint budgets. A request draws from the budget with the longest URL prefix matching its URL;
+# requests that match no budget are not limited.
+class RateLimiter:
+  def __init__(self, state_path: Optional[str] = None) -> None:
+    # If set, budgets are stored in this SQLite file and shared with every process that uses it.
+    self.state_path = state_path
+    self._buckets: dict[str, TokenBucket] = {}
+    self._lock = threading.Lock()
+
+  # Sets the budget for every URL starting with `url_prefix`. Use the bare base URL (e.g. `PROD_GQL_URL`) to
+  # budget a whole endpoint, or a REST path such as `PROD_REST_URL + '/adgroup'` to budget a single resource.
+  def set_budget(self, url_prefix: str, rate_per_second: float, burst: int = None) -> None:
+    if self.state_path is None:
+      bucket = TokenBucket(rate_per_second, burst)
+    else:
+      bucket = SqliteTokenBucket(self.state_path, url_prefix, rate_per_second, burst)
+
+    with self._lock:
+      self._buckets[url_prefix] = bucket
+
+  # Removes the budget for the given URL prefix.
+  def remove_budget(self, url_prefix: str) -> None:
+    with self._lock:
+      self._buckets.pop(url_prefix, None)
+
+  # Returns the bucket a request to `url` draws from, or `None` if it is not limited.
+  def get_bucket(self, url: str) -> Optional[TokenBucket]:
+    with self._lock:
+      matches = [prefix for prefix in self._buckets if url.startswith(prefix)]
+      return self._buckets[max(matches, key=len)] if matches else None
+
+  # Blocks until the budget for `url` allows another request.
+  def acquire(self, url: str) -> None:
+    bucket = self.get_bucket(url)
+    if bucket is not None:
+      bucket.acquire()
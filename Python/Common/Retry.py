@@ -0,0 +1,87 @@
+#################################################################################
+# Retry policy for the shared transport.
+# Transient failures (throttling, gateway errors, dropped connections) are retried
+# with exponential backoff and full jitter, honoring any `Retry-After` header.
+# Requests that are not idempotent, such as GQL mutations, are only retried when
+# the server cannot have processed them.
+#################################################################################
+
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+import random
+import re
+from typing import Optional
+
+import requests
+
+# Status codes that indicate a transient failure worth retrying.
+RETRYABLE_STATUS_CODES = (429, 500, 502, 503, 504)
+
+# Status codes where the server rejected the request before processing it, so even a mutation is safe to resend.
+UNPROCESSED_STATUS_CODES = (429,)
+
+# Describes how many times, and how long to wait between, attempts of a failed request.
+class RetryPolicy:
+  def __init__(self, max_attempts: int = 5, base_delay_seconds: float = 0.5, max_delay_seconds: float = 30.0, retryable_status_codes: tuple = RETRYABLE_STATUS_CODES) -> None:
+    # The total number of attempts, including the first one. Set to 1 to disable retries.
+    self.max_attempts = max_attempts
+    # The backoff ceiling for the first retry. It doubles for every subsequent retry.
+    self.base_delay_seconds = base_delay_seconds
+    # The upper bound of any single wait, including waits requested via `Retry-After`.
+    self.max_delay_seconds = max_delay_seconds
+    # The response status codes that are considered transient.
+    self.retryable_status_codes = retryable_status_codes
+
+  # Determines if a failed attempt (1-based) should be retried, given either the response status code or the raised error.
+  def should_retry(self, attempt: int, idempotent: bool, status_code: int = None, error: Exception = None) -> bool:
+    if attempt >= self.max_attempts:
+      return False
+
+    if error is not None:
+      # A connect timeout means the request never reached the server.
+      if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+      return idempotent and isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout))
+
+    if status_code not in self.retryable_status_codes:
+      return False
+    return idempotent or status_code in UNPROCESSED_STATUS_CODES
+
+  # Returns how long to wait (in seconds) before the next attempt after the given failed attempt (1-based).
+  # A `Retry-After` value from the server takes precedence over the computed backoff.
+  def get_delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+    if retry_after is not None:
+      return min(retry_after, self.max_delay_seconds)
+
+    # Full jitter: pick uniformly between 0 and the exponential backoff ceiling.
+    ceiling = min(self.max_delay_seconds, self.base_delay_seconds * (2 ** (attempt - 1)))
+    return random.uniform(0, ceiling)
+
+# Parses a `Retry-After` header, which is either a number of seconds or an HTTP date. Returns `None` if absent or invalid.
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+  if not value:
+    return None
+
+  value = value.strip()
+  if value.isdigit():
+    return float(value)
+
+  try:
+    retry_at = parsedate_to_datetime(value)
+  except (TypeError, ValueError):
+    return None
+
+  if retry_at.tzinfo is None:
+    retry_at = retry_at.replace(tzinfo=timezone.utc)
+  return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+# Determines if a GQL document is a mutation (as opposed to a query), ignoring comments and leading whitespace.
+def is_gql_mutation(body: str) -> bool:
+  document = re.sub(r'#[^\n]*', '', body).lstrip()
+  return document.startswith('mutation')
+
+# Determines if a REST request is safe to resend. GET and PUT are idempotent, as are POSTs to the read-only `/query/` endpoints.
+def is_rest_idempotent(method: str, url: str) -> bool:
+  if method in ('GET', 'PUT'):
+    return True
+  return '/query/' in url
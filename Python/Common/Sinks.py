@@ -0,0 +1,210 @@
+###################################################################################
+# Sinks that consume delta pages as they arrive.
+# Instead of accumulating every changed entity in memory until the walk finishes,
+# a delta walk hands each page to its sinks, which write the records out (or pass
+# them on) right away, so memory stays bounded by a page and downstream processing
+# can start immediately.
+###################################################################################
+
+from abc import ABC, abstractmethod
+import gzip
+from typing import Any, BinaryIO, Callable, List, Optional, Tuple
+
+from .Streaming import dumps
+
+try:
+  import pyarrow
+  import pyarrow.ipc
+  import pyarrow.parquet
+except ImportError:
+  pyarrow = None
+
+# Consumes the records of delta pages. Subclasses implement `write_records`, and override `close` if they hold resources.
+class DeltaSink(ABC):
+  # Consumes the records of one page.
+  @abstractmethod
+  def write_records(self, records: List[Any]) -> None:
+    pass
+
+  # Consumes one page of a delta walk.
+  def write_page(self, page: Any) -> None:
+    self.write_records(page.records)
+
+  # Releases any resources held by the sink.
+  def close(self) -> None:
+    pass
+
+  def __enter__(self) -> 'DeltaSink':
+    return self
+
+  def __exit__(self, *exc_info) -> None:
+    self.close()
+
+# Writes each record as one line of JSON (JSON Lines). The file is flushed after every page, so that what a
+# checkpoint records as processed has been handed to the operating system.
+class JsonLinesSink(DeltaSink):
+  def __init__(self, path: str, append: bool = False) -> None:
+    # The file the records are written to.
+    self.path = path
+    # The number of records written so far.
+    self.record_count = 0
+    self._file = self._open(path, 'ab' if append else 'wb')
+
+  def _open(self, path: str, mode: str) -> BinaryIO:
+    return open(path, mode)
+
+  def write_records(self, records: List[Any]) -> None:
+    self._file.write(b''.join(dumps(record) + b'\n' for record in records))
+    self._file.flush()
+    self.record_count += len(records)
+
+  def close(self) -> None:
+    self._file.close()
+
+# Writes gzip-compressed JSON Lines. Appending adds a new gzip member, which readers decompress transparently.
+class GzipJsonLinesSink(JsonLinesSink):
+  def __init__(self, path: str, append: bool = False, compresslevel: int = 6) -> None:
+    # The gzip compression level, from 1 (fastest) to 9 (smallest).
+    self.compresslevel = compresslevel
+    super().__init__(path, append)
+
+  def _open(self, path: str, mode: str) -> BinaryIO:
+    return gzip.open(path, mode, compresslevel=self.compresslevel)
+
+# Passes the records of every page to a function, e.g. to enqueue them for another system.
+class CallbackSink(DeltaSink):
+  def __init__(self, callback: Callable[[List[Any]], None]) -> None:
+    self.callback = callback
+
+  def write_records(self, records: List[Any]) -> None:
+    self.callback(records)
+
+# Returns the value at `path` within a record. If a list is crossed on the way, the values of all its items are
+# returned as a list, e.g. the IDs of `creatives.nodes.id`.
+def get_path_value(record: Any, path: Tuple[str, ...]) -> Any:
+  value = record
+  for i, key in enumerate(path):
+    if value is None:
+      return None
+    if isinstance(value, list):
+      return [get_path_value(item, path[i:]) for item in value]
+    value = value.get(key)
+  return value
+
+# Returns the Arrow type of a column type declared by a `DeltaEntity`, e.g. `int64` or `list<string>`.
+def get_arrow_type(column_type: str) -> Any:
+  if column_type.startswith('list<') and column_type.endswith('>'):
+    return pyarrow.list_(get_arrow_type(column_type[5:-1]))
+  arrow_types = { 'string': pyarrow.string(), 'int64': pyarrow.int64(), 'float64': pyarrow.float64(), 'bool': pyarrow.bool_() }
+  if column_type not in arrow_types:
+    raise Exception(f"Unknown column type '{column_type}'.")
+  return arrow_types[column_type]
+
+# Writes the records of one entity type as a Parquet file with one column per leaf field of its selection set, e.g.
+# `advertiser.id` or `budget.total`; fields under a list become list columns. Records are buffered and written one row
+# group of `row_group_size` records at a time. Every column is dictionary-encoded, which is what shrinks the repeated
+# advertiser and campaign IDs. Columns have the types the entity type declares (see `DeltaEntity.column_types`), so
+# every row group has the same schema no matter which values it holds, unless overridden in `column_types`, e.g.
+# `{ 'budget.total': pyarrow.decimal128(18, 4) }`.
+# The file is only readable once the sink is closed, and cannot be appended to. Requires `pyarrow`.
+class ParquetSink(DeltaSink):
+  def __init__(self, path: str, entity: Any, row_group_size: int = 10000, compression: str = 'zstd', column_types: Optional[dict[str, Any]] = None) -> None:
+    if pyarrow is None:
+      raise Exception('Writing columnar files requires pyarrow (`pip install pyarrow`).')
+
+    # The file the records are written to.
+    self.path = path
+    # The number of records per row group.
+    self.row_group_size = row_group_size
+    # The compression codec of the column chunks.
+    self.compression = compression
+    # The Arrow types of the columns that override the types declared by the entity type, by column name.
+    self.column_types = column_types or {}
+    # The number of records written so far.
+    self.record_count = 0
+    self._paths = entity.column_paths
+    self._names = ['.'.join(path) for path in self._paths]
+    self._columns: List[List[Any]] = [[] for _ in self._paths]
+    self._buffered = 0
+    # The columns' value types, and the schema of the file.
+    self._schema = pyarrow.schema([pyarrow.field(name, self.column_types.get(name) or get_arrow_type(entity.column_types[name])) for name in self._names])
+    self._file_schema = self._get_file_schema()
+    self._writer = self._open_writer(self._file_schema)
+
+  # Returns the schema the columns are written with.
+  def _get_file_schema(self) -> Any:
+    return self._schema
+
+  def _open_writer(self, schema: Any) -> Any:
+    return pyarrow.parquet.ParquetWriter(self.path, schema, compression=self.compression, use_dictionary=True)
+
+  # Converts the buffered values of one column into an array of the file schema.
+  def _make_array(self, index: int, values: List[Any]) -> Any:
+    return pyarrow.array(values, type=self._schema.field(index).type)
+
+  # Writes the buffered records as one row group.
+  def _write_row_group(self) -> None:
+    arrays = [self._make_array(index, values) for index, values in enumerate(self._columns)]
+    self._writer.write_table(pyarrow.Table.from_arrays(arrays, schema=self._file_schema))
+    self._columns = [[] for _ in self._paths]
+    self._buffered = 0
+
+  def write_records(self, records: List[Any]) -> None:
+    for record in records:
+      for values, path in zip(self._columns, self._paths):
+        values.append(get_path_value(record, path))
+    self._buffered += len(records)
+    self.record_count += len(records)
+
+    if self._buffered >= self.row_group_size:
+      self._write_row_group()
+
+  def close(self) -> None:
+    # Write the last, partial row group.
+    if self._buffered > 0:
+      self._write_row_group()
+    self._writer.close()
+
+# Writes the records like `ParquetSink`, but as an Arrow IPC file, e.g. for loading into pandas or DuckDB. String
+# columns are dictionary-encoded like in Parquet: each column's dictionary only grows over the file, so every record
+# batch after the first only carries the values that are new to it (a dictionary delta). The buffers are compressed with
+# `compression`, which Arrow IPC files only support as 'zstd', 'lz4' or `None` (uncompressed).
+class ArrowSink(ParquetSink):
+  def __init__(self, path: str, entity: Any, row_group_size: int = 10000, compression: str = 'zstd', column_types: Optional[dict[str, Any]] = None) -> None:
+    # The index of every value of each dictionary-encoded column so far, by column index.
+    self._dictionaries: dict[int, dict[str, int]] = {}
+    super().__init__(path, entity, row_group_size, compression, column_types)
+
+  def _get_file_schema(self) -> Any:
+    fields = []
+    for index, field in enumerate(self._schema):
+      if pyarrow.types.is_string(field.type):
+        self._dictionaries.setdefault(index, {})
+        field = field.with_type(pyarrow.dictionary(pyarrow.int32(), pyarrow.string()))
+      fields.append(field)
+    return pyarrow.schema(fields)
+
+  def _open_writer(self, schema: Any) -> Any:
+    return pyarrow.ipc.new_file(self.path, schema, options=pyarrow.ipc.IpcWriteOptions(compression=self.compression, emit_dictionary_deltas=True))
+
+  def _make_array(self, index: int, values: List[Any]) -> Any:
+    dictionary = self._dictionaries.get(index)
+    if dictionary is None:
+      return super()._make_array(index, values)
+
+    indices = [None if value is None else dictionary.setdefault(value, len(dictionary)) for value in values]
+    return pyarrow.DictionaryArray.from_arrays(pyarrow.array(indices, type=pyarrow.int32()), pyarrow.array(list(dictionary), type=pyarrow.string()))
+
+# Creates the sink for an output file: Parquet if the path ends with `.parquet` and Arrow if it ends with `.arrow`
+# (both need the `entity` type, for its columns), gzip-compressed JSON Lines if it ends with `.gz`, and JSON Lines
+# otherwise.
+def open_file_sink(path: str, append: bool = False, entity: Any = None) -> DeltaSink:
+  if path.endswith('.parquet') or path.endswith('.arrow'):
+    if append:
+      raise Exception(f'Cannot append to {path}: columnar files are written in one go.')
+    if entity is None:
+      raise Exception(f'Writing {path} requires the entity type, for its columns.')
+    return ParquetSink(path, entity) if path.endswith('.parquet') else ArrowSink(path, entity)
+  if path.endswith('.gz'):
+    return GzipJsonLinesSink(path, append)
+  return JsonLinesSink(path, append)
@@ -0,0 +1,130 @@
+###################################################################################
+# Incremental JSON decoding for large GQL responses.
+# Instead of buffering a whole delta page and decoding it into one dict tree, the
+# response stream is scanned as it arrives and each item of the requested array
+# (e.g. `data.creativeDelta.creatives`) is decoded and yielded on its own. The rest
+# of the document (`moreAvailable`, `nextChangeTrackingVersion`, `errors`, ...) is
+# kept as a small skeleton in which the array appears empty.
+# Decoding (and encoding) uses `orjson` when it is installed, and the standard `json` otherwise.
+###################################################################################
+
+import json
+import re
+from typing import Any, Callable, Iterable, Iterator, List
+
+try:
+  import orjson
+except ImportError:
+  orjson = None
+
+# Decodes a JSON document from bytes or str, using the fastest available decoder.
+def loads(content: Any) -> Any:
+  if orjson is not None:
+    return orjson.loads(content)
+  return json.loads(content)
+
+# Encodes a value as compact JSON bytes, using the fastest available encoder.
+def dumps(value: Any) -> bytes:
+  if orjson is not None:
+    return orjson.dumps(value)
+  return json.dumps(value, separators=(',', ':')).encode('utf-8')
+
+# Matches the next character that is significant to the structure of the document.
+_STRUCTURE = re.compile(rb'["{}\[\],]')
+# Matches the remainder of a string literal, up to and including its closing quote.
+_STRING_REST = re.compile(rb'[^"\\]*(?:\\.[^"\\]*)*"', re.S)
+
+# Scans a JSON document delivered as byte chunks and yields the decoded items of the array found at the
+# dot-separated object path `items_path`. Once the generator is exhausted, `on_complete` is called with the
+# decoded remainder of the document, in which that array is empty.
+def iter_array_items(chunks: Iterable[bytes], items_path: str, on_complete: Callable[[Any], None] = None) -> Iterator[Any]:
+  target: List[str] = items_path.split('.')
+  chunk_iterator = iter(chunks)
+  buffer = b''
+  position = 0
+
+  # The parts of the document outside the target array, and how far into `buffer` they have been copied.
+  skeleton: List[bytes] = []
+  copied = 0
+
+  # One `[kind, key, expecting_key]` frame per open object or array.
+  stack: List[list] = []
+
+  # While inside the target array, the nesting depth of the array and where the current item starts.
+  capture_depth = None
+  item_start = 0
+
+  while True:
+    match = _STRUCTURE.search(buffer, position)
+    string_end = None
+    if match is not None and match.group() == b'"':
+      string_end = _STRING_REST.match(buffer, match.end())
+
+    # Read more of the stream when the next token (or the rest of a string) has not arrived yet.
+    if match is None or (match.group() == b'"' and string_end is None):
+      chunk = next(chunk_iterator, None)
+      if chunk is None:
+        break
+
+      # Drop what has already been consumed, keeping the unfinished item or skeleton text.
+      if capture_depth is None:
+        skeleton.append(buffer[copied:position])
+        keep_from = position
+      else:
+        keep_from = item_start
+      buffer = buffer[keep_from:] + chunk
+      position -= keep_from
+      item_start -= keep_from
+      copied = position if capture_depth is None else 0
+      continue
+
+    token = match.group()
+    position = match.end()
+
+    if capture_depth is not None:
+      # Inside the target array only the depth matters, so that top-level items can be split out.
+      if token == b'"':
+        position = string_end.end()
+      elif token in (b'{', b'['):
+        capture_depth += 1
+      elif token == b',' and capture_depth == 1:
+        yield loads(buffer[item_start:match.start()])
+        item_start = position
+      elif token in (b'}', b']'):
+        capture_depth -= 1
+        if capture_depth == 0:
+          item = buffer[item_start:match.start()]
+          if item.strip():
+            yield loads(item)
+          # Resume copying the skeleton from the closing bracket.
+          capture_depth = None
+          copied = match.start()
+          stack.pop()
+      continue
+
+    if token == b'"':
+      position = string_end.end()
+      frame = stack[-1] if stack else None
+      if frame is not None and frame[0] == 'object' and frame[2]:
+        frame[1] = json.loads(buffer[match.start():position])
+        frame[2] = False
+    elif token == b',':
+      if stack and stack[-1][0] == 'object':
+        stack[-1][2] = True
+    elif token == b'{':
+      stack.append(['object', None, True])
+    elif token == b'[':
+      is_target = all(frame[0] == 'object' for frame in stack) and [frame[1] for frame in stack] == target
+      stack.append(['array', None, False])
+      if is_target:
+        # Copy the skeleton up to and including the opening bracket, then capture the items.
+        skeleton.append(buffer[copied:position])
+        capture_depth = 1
+        item_start = position
+    else:
+      stack.pop()
+
+  skeleton.append(buffer[copied:])
+  if on_complete is not None:
+    document = b''.join(skeleton)
+    on_complete(loads(document) if document.strip() else {})
@@ -0,0 +1,499 @@
+###################################################################################
+# Shared HTTP transport for the GraphQL and REST Platform API helpers.
+# Every `execute_gql_request` / `execute_rest_request` in the scripts delegates
+# here, so consecutive requests reuse keep-alive connections from a per-host pool
+# instead of paying a new TCP+TLS handshake for each call.
+###################################################################################
+
+from enum import Enum
+import gzip
+import json
+import threading
+import time
+from typing import Any, Callable, Iterator, List, Tuple, Union
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.request import ACCEPT_ENCODING
+
+from .CircuitBreaker import CircuitBreakers, CircuitOpenError
+from .Instrumentation import RequestEvent, get_gql_operation_name, get_rest_operation_name
+from .Queries import GqlOperation
+from .RateLimiter import RateLimiter
+from .Retry import RetryPolicy, is_gql_mutation, is_rest_idempotent, parse_retry_after
+from .Streaming import iter_array_items, loads
+
+#################################
+# Transport settings YOU can tune
+#################################
+
+# The number of keep-alive connections kept open per host. Raise this when issuing concurrent requests.
+pool_maxsize = 10
+
+# The number of distinct hosts each session keeps a connection pool for.
+pool_connections = 4
+
+# The retry policy applied to every request. Assign `Transport.retry_policy = RetryPolicy(max_attempts=1)` to disable retries.
+retry_policy = RetryPolicy()
+
+# The process-wide rate limiter every request acquires from, GQL and REST alike. No endpoint is limited until a
+# budget is set, e.g. `Transport.rate_limiter.set_budget(PROD_GQL_URL, 10)`. To share budgets with other processes
+# on this host, assign `Transport.rate_limiter = RateLimiter(state_path='ttd_rate_limits.sqlite')`.
+rate_limiter = RateLimiter()
+
+# The number of seconds to wait for a connection to be established, and for each read from the socket once it is.
+# A request that exceeds either fails with a `requests.exceptions.Timeout` instead of hanging the run.
+connect_timeout_seconds = 10
+read_timeout_seconds = 120
+
+# The per-endpoint circuit breakers every request checks before it is sent. After `failure_threshold` consecutive
+# failures to reach a base URL, requests to it raise `CircuitOpenError` immediately until `reset_timeout_seconds`
+# have passed. Assign `Transport.circuit_breakers = CircuitBreakers(failure_threshold=0)` to disable them.
+circuit_breakers = CircuitBreakers()
+
+# If `True`, JSON request bodies of at least `compress_request_min_bytes` are gzip-compressed before being sent.
+# Only enable this for endpoints that accept `Content-Encoding: gzip` request bodies.
+compress_requests = False
+
+# The smallest request body (in bytes) worth compressing.
+compress_request_min_bytes = 1024
+
+# If `True`, registered operations are first sent by hash only (persisted-query protocol), falling back to the full
+# document when the server does not know the hash yet. Requires a server with persisted queries enabled.
+use_persisted_queries = False
+
+# The error codes a server returns when it does not recognize a persisted-query hash.
+PERSISTED_QUERY_NOT_FOUND_CODES = ('PERSISTED_QUERY_NOT_FOUND', 'HC0020')
+
+# The response encodings negotiated with the server: gzip and deflate, plus Brotli (`br`) when the optional `brotli`
+# (or `brotlicffi`) package is installed (`pip install brotli`), which urllib3 then uses to decode the responses.
+ACCEPT_ENCODING_HEADER = ACCEPT_ENCODING
+
+# Represents the REST operation to execute.
+class RestOperation(Enum):
+  GET = 1
+  POST = 2
+  PUT = 3
+
+# Counts the bytes of a request and its response, both uncompressed and as sent over the wire.
+class TransferStats:
+  def __init__(self, request_bytes: int = 0, request_wire_bytes: int = 0, response_bytes: int = 0, response_wire_bytes: int = 0) -> None:
+    # The size of the request body before compression.
+    self.request_bytes = request_bytes
+    # The size of the request body as sent.
+    self.request_wire_bytes = request_wire_bytes
+    # The size of the response body after decompression.
+    self.response_bytes = response_bytes
+    # The size of the response body as received.
+    self.response_wire_bytes = response_wire_bytes
+
+  # Adds the counts of another `TransferStats` to this one.
+  def add(self, other: 'TransferStats') -> None:
+    self.request_bytes += other.request_bytes
+    self.request_wire_bytes += other.request_wire_bytes
+    self.response_bytes += other.response_bytes
+    self.response_wire_bytes += other.response_wire_bytes
+
+  def __str__(self) -> str:
+    return f'request: {self.request_wire_bytes} bytes sent ({self.request_bytes} uncompressed), response: {self.response_wire_bytes} bytes received ({self.response_bytes} uncompressed)'
+
+# Represents a response from the GQL server.
+class GqlResponse:
+  def __init__(self, data: dict[Any, Any], errors: List[Any]) -> None:
+    # This is where the return data from the GQL operation is stored.
+    self.data = data
+    # This is where any errors from the GQL operation are stored.
+    self.errors = errors
+    # This is where the byte counts of the request and response are stored.
+    self.transfer_stats = TransferStats()
+
+# Represents a GQL response whose array items are decoded one at a time as they arrive from the stream.
+class StreamingGqlResponse(GqlResponse):
+  def __init__(self, items: Iterator[Any]) -> None:
+    super().__init__({}, [])
+    # Yields the decoded items of the streamed array. `data` (with that array left empty) and `errors`
+    # are filled in once it has been exhausted.
+    self.items = items
+
+  def _complete(self, content: Any) -> None:
+    self.data = content.get('data', {})
+    self.errors = content.get('errors', [])
+
+# Represents a response from the REST server.
+class RestResponse:
+  def __init__(self, data: Any, errors: Any) -> None:
+    # This is where the data returned from the REST operation is stored.
+    self.data = data
+    # This is where any errors from the REST operation are stored.
+    self.errors = errors
+    # This is where the byte counts of the request and response are stored.
+    self.transfer_stats = TransferStats()
+
+# GQL and REST traffic get separate sessions, each keyed by the base URL (scheme and host) it talks to.
+_sessions: dict[Tuple[str, str], requests.Session] = {}
+_sessions_lock = threading.Lock()
+
+# The functions called with a `RequestEvent` after every request, e.g. `Instrumentation.record_request`.
+request_hooks: List[Callable[[RequestEvent], None]] = []
+
+# Registers a function to be called with a `RequestEvent` after every request.
+def add_request_hook(hook: Callable[[RequestEvent], None]) -> None:
+  request_hooks.append(hook)
+
+# Unregisters a function added with `add_request_hook`.
+def remove_request_hook(hook: Callable[[RequestEvent], None]) -> None:
+  request_hooks.remove(hook)
+
+# Reports a completed request to every registered hook.
+def emit_request_event(event: RequestEvent) -> None:
+  for hook in list(request_hooks):
+    hook(event)
+
+# The byte counts of every request sent by this process.
+total_transfer_stats = TransferStats()
+_transfer_stats_lock = threading.Lock()
+
+# Updates the connection pool sizes. Existing sessions may be in use by other threads, so they are not closed: they get
+# new adapters with the new sizes instead. Requests already in flight finish on the old adapters, whose connections are
+# released once those are no longer referenced.
+def configure_pool(maxsize: int = None, connections: int = None) -> None:
+  global pool_maxsize, pool_connections
+
+  with _sessions_lock:
+    if maxsize is not None:
+      pool_maxsize = maxsize
+    if connections is not None:
+      pool_connections = connections
+
+    for session in _sessions.values():
+      mount_adapter(session)
+
+# Closes every pooled session and its open connections.
+def close_sessions() -> None:
+  with _sessions_lock:
+    for session in _sessions.values():
+      session.close()
+    _sessions.clear()
+
+# Returns the base URL (scheme and host) used to select a connection pool for the given URL.
+def get_base_url(url: str) -> str:
+  parts = urlsplit(url)
+  return f'{parts.scheme}://{parts.netloc}'
+
+# Mounts an adapter with the current pool sizes on a session, for both schemes. Every session already has an adapter
+# for each scheme, so they are replaced in place: unlike `session.mount`, which reorders the adapters, this is safe
+# while other threads look adapters up on the session.
+def mount_adapter(session: requests.Session) -> None:
+  adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+  for prefix in ('https://', 'http://'):
+    session.adapters[prefix] = adapter
+
+# Returns the pooled session for the given kind of traffic ('gql', 'rest', ...) and URL, creating it on first use.
+def get_session(kind: str, url: str) -> requests.Session:
+  key = (kind, get_base_url(url))
+
+  with _sessions_lock:
+    session = _sessions.get(key)
+    if session is None:
+      session = requests.Session()
+      session.headers['Accept-Encoding'] = ACCEPT_ENCODING_HEADER
+      mount_adapter(session)
+      _sessions[key] = session
+
+  return session
+
+# Sends a request on the pooled session once `rate_limiter` allows it, retrying transient failures according to `retry_policy`.
+# Non-idempotent requests are only resent when the server cannot have processed them.
+# Returns the final response, with its `request_event` describing the attempts so far, or raises the last connection
+# error once the attempts are exhausted. The caller emits the event once it has read and decoded the response.
+# Raises `CircuitOpenError` without sending anything while the circuit breaker of the endpoint is open.
+def send_request(kind: str, method: str, url: str, idempotent: bool, operation: str = None, **kwargs) -> requests.Response:
+  session = get_session(kind, url)
+  breaker = circuit_breakers.get_breaker(get_base_url(url))
+  event = RequestEvent(kind, operation or get_rest_operation_name(method, url), method, url)
+  start_time = time.time()
+
+  kwargs.setdefault('timeout', (connect_timeout_seconds, read_timeout_seconds))
+
+  # Encode the JSON body up front, so that it can be measured and compressed.
+  if kwargs.get('json') is not None:
+    body = json.dumps(kwargs.pop('json')).encode('utf-8')
+    headers = dict(kwargs.pop('headers', None) or {})
+    headers['Content-Type'] = 'application/json'
+    event.request_bytes = len(body)
+
+    if compress_requests and event.request_bytes >= compress_request_min_bytes:
+      body = gzip.compress(body)
+      headers['Content-Encoding'] = 'gzip'
+
+    event.request_wire_bytes = len(body)
+    kwargs['data'] = body
+    kwargs['headers'] = headers
+  else:
+    kwargs.pop('json', None)
+
+  while True:
+    if breaker is not None:
+      try:
+        breaker.before_request()
+      except CircuitOpenError as error:
+        event.error = type(error).__name__
+        event.total_seconds = time.time() - start_time
+        emit_request_event(event)
+        raise
+
+    event.attempts += 1
+    rate_limiter.acquire(url)
+    attempt_start_time = time.time()
+    try:
+      response = session.request(method, url, **kwargs)
+    except requests.exceptions.RequestException as error:
+      if breaker is not None:
+        breaker.record_failure()
+      if not retry_policy.should_retry(event.attempts, idempotent, error=error):
+        event.error = type(error).__name__
+        event.latency_seconds = time.time() - attempt_start_time
+        event.total_seconds = time.time() - start_time
+        emit_request_event(event)
+        raise
+      delay = retry_policy.get_delay(event.attempts)
+      print(f'{method} {url} failed ({type(error).__name__}). Retrying in {delay:.1f}s...')
+      time.sleep(delay)
+      continue
+
+    event.latency_seconds = time.time() - attempt_start_time
+    if breaker is not None:
+      if circuit_breakers.is_failure(response.status_code):
+        breaker.record_failure()
+      else:
+        breaker.record_success()
+
+    if not retry_policy.should_retry(event.attempts, idempotent, status_code=response.status_code):
+      event.status_code = response.status_code
+      event.total_seconds = time.time() - start_time
+      response.request_event = event
+      response.transfer_stats = TransferStats(event.request_bytes, event.request_wire_bytes)
+      return response
+
+    delay = retry_policy.get_delay(event.attempts, parse_retry_after(response.headers.get('Retry-After')))
+    print(f'{method} {url} returned {response.status_code}. Retrying in {delay:.1f}s...')
+    time.sleep(delay)
+
+# Completes the byte counts of a response whose body has been fully read, and adds them to `total_transfer_stats`.
+def record_transfer(response: requests.Response, response_bytes: int) -> TransferStats:
+  stats = response.transfer_stats
+  stats.response_bytes = response_bytes
+  # `raw.tell()` counts the bytes read from the socket, before any decompression.
+  stats.response_wire_bytes = response.raw.tell() if response.raw is not None else response_bytes
+
+  with _transfer_stats_lock:
+    total_transfer_stats.add(stats)
+
+  event = response.request_event
+  event.response_bytes = stats.response_bytes
+  event.response_wire_bytes = stats.response_wire_bytes
+  return stats
+
+# Decodes a JSON response body, adding the time spent to the response's `request_event`.
+def decode_content(response: requests.Response) -> Any:
+  start_time = time.time()
+  content = loads(response.content) if len(response.content) > 0 else {}
+  response.request_event.decode_seconds += time.time() - start_time
+  return content
+
+# Determines if the server rejected a hash-only request because it does not know the persisted query.
+def is_persisted_query_not_found(errors: List[Any]) -> bool:
+  for error in errors:
+    extensions = error.get('extensions', {}) if isinstance(error, dict) else {}
+    if extensions.get('code') in PERSISTED_QUERY_NOT_FOUND_CODES:
+      return True
+  return False
+
+# Creates the dictionary for a GraphQL request from a document string or a registered `GqlOperation`.
+def build_gql_payload(body: Union[str, GqlOperation], variables: dict[str, Any]) -> dict[str, Any]:
+  document = body.document if isinstance(body, GqlOperation) else body
+
+  data: dict[str, Any] = {
+    'query': document,
+    'variables': variables
+  }
+
+  if isinstance(body, GqlOperation):
+    data['operationName'] = body.name
+    if use_persisted_queries:
+      data['extensions'] = { 'persistedQuery': { 'version': 1, 'sha256Hash': body.sha256_hash } }
+
+  return data
+
+# Executes a GQL request to the specified `gql_url`, using the provided body definition and associated variables.
+# The body is either a document string or a registered `GqlOperation`, which is also sent with its operation name
+# (and, if `use_persisted_queries` is set, by hash).
+# Queries are retried on transient failures; mutations are only retried when they were rejected unprocessed,
+# unless `idempotent` is set explicitly.
+# This indicates if the call was successful and returns the `GqlResponse`.
+def execute_gql_request(gql_url: str, token: str, body: Union[str, GqlOperation], variables: dict[str, Any], idempotent: bool = None) -> Tuple[bool, GqlResponse]:
+  # Create headers with the authorization token.
+  headers: dict[str, str] = {
+    'TTD-Auth': token
+  }
+
+  data = build_gql_payload(body, variables)
+
+  if idempotent is None:
+    idempotent = not is_gql_mutation(data['query'])
+
+  operation = body.name if isinstance(body, GqlOperation) else get_gql_operation_name(data['query'])
+
+  # Send the GraphQL request, by hash only if persisted queries are enabled.
+  transfer_stats = TransferStats()
+  if 'extensions' in data:
+    hash_only_data = { key: value for key, value in data.items() if key != 'query' }
+    response = send_request('gql', 'POST', gql_url, idempotent, operation, json=hash_only_data, headers=headers)
+    transfer_stats.add(record_transfer(response, len(response.content)))
+    content = decode_content(response)
+
+    # If the server does not know the hash yet, send the full document, which also registers it.
+    if is_persisted_query_not_found(content.get('errors', [])):
+      emit_request_event(response.request_event)
+      response = send_request('gql', 'POST', gql_url, idempotent, operation, json=data, headers=headers)
+      transfer_stats.add(record_transfer(response, len(response.content)))
+      content = decode_content(response)
+  else:
+    response = send_request('gql', 'POST', gql_url, idempotent, operation, json=data, headers=headers)
+    transfer_stats.add(record_transfer(response, len(response.content)))
+    content = decode_content(response)
+
+  emit_request_event(response.request_event)
+
+  if not response.ok:
+    print('GQL request failed!')
+    # For more verbose error messaging, uncomment the following line:
+    #print(response)
+
+  # Parse any data if it exists, otherwise, return an empty dictionary.
+  resp_data = content.get('data', {})
+  # Parse any errors if they exist, otherwise, return an empty error list.
+  errors = content.get('errors', [])
+
+  gql_response = GqlResponse(resp_data, errors)
+  gql_response.transfer_stats = transfer_stats
+  return (response.ok, gql_response)
+
+# Executes a GQL request like `execute_gql_request`, but streams the response: the items of the array at
+# `items_path` (e.g. `data.creativeDelta.creatives`) are decoded and yielded one by one as they arrive, so the
+# full page is never held in memory. The document is always sent in full, even if `use_persisted_queries` is set.
+# This indicates if the call was successful and returns the `StreamingGqlResponse`.
+def execute_gql_request_streaming(gql_url: str, token: str, body: Union[str, GqlOperation], variables: dict[str, Any], items_path: str, idempotent: bool = None) -> Tuple[bool, StreamingGqlResponse]:
+  # Create headers with the authorization token.
+  headers: dict[str, str] = {
+    'TTD-Auth': token
+  }
+
+  data = build_gql_payload(body, variables)
+  data.pop('extensions', None)
+
+  if idempotent is None:
+    idempotent = not is_gql_mutation(data['query'])
+
+  operation = body.name if isinstance(body, GqlOperation) else get_gql_operation_name(data['query'])
+
+  # Send the GraphQL request, leaving the response body unread.
+  response = send_request('gql', 'POST', gql_url, idempotent, operation, json=data, headers=headers, stream=True)
+
+  if not response.ok:
+    print('GQL request failed!')
+    # For more verbose error messaging, uncomment the following line:
+    #print(response)
+
+    # Failed responses are small, so decode them in full.
+    streaming_response = StreamingGqlResponse(iter(()))
+    streaming_response.transfer_stats = record_transfer(response, len(response.content))
+    streaming_response._complete(decode_content(response))
+    emit_request_event(response.request_event)
+    return (False, streaming_response)
+
+  # Counts the decompressed bytes as they are handed to the decoder.
+  start_time = time.time()
+  response_bytes = 0
+  def counted_chunks() -> Iterator[bytes]:
+    nonlocal response_bytes
+    for chunk in response.iter_content(chunk_size=64 * 1024):
+      response_bytes += len(chunk)
+      yield chunk
+
+  # The byte counts are complete once the stream has been read to the end.
+  def stream_items() -> Iterator[Any]:
+    try:
+      yield from iter_array_items(counted_chunks(), items_path, streaming_response._complete)
+      streaming_response.transfer_stats = record_transfer(response, response_bytes)
+      response.request_event.total_seconds += time.time() - start_time
+      emit_request_event(response.request_event)
+    finally:
+      response.close()
+
+  streaming_response = StreamingGqlResponse(stream_items())
+  return (True, streaming_response)
+
+# Downloads the file at `url` (e.g. a generated report) to `path`, writing it out as it arrives instead of holding it
+# in memory. The request is reported to the request hooks as `operation`, since such URLs are unique. This indicates if the download was successful and returns its byte counts.
+def download_file(url: str, path: str, headers: dict[str, str] = None, operation: str = 'Download') -> Tuple[bool, TransferStats]:
+  response = send_request('download', 'GET', url, True, operation, headers=headers, stream=True)
+  response_bytes = 0
+  try:
+    if response.ok:
+      with open(path, 'wb') as file:
+        for chunk in response.iter_content(chunk_size=64 * 1024):
+          file.write(chunk)
+          response_bytes += len(chunk)
+    else:
+      print(f'Download failed with status {response.status_code}.')
+      response_bytes = len(response.content)
+
+    transfer_stats = record_transfer(response, response_bytes)
+    emit_request_event(response.request_event)
+  finally:
+    response.close()
+
+  return (response.ok, transfer_stats)
+
+# Executes a REST request to the specified `url` using the provided headers and body definition.
+# GETs, PUTs and `/query/` POSTs are retried on transient failures; other POSTs are only retried when they were
+# rejected unprocessed, unless `idempotent` is set explicitly.
+# This indicates if the call was successful and returns the `RestResponse`.
+def execute_rest_request(operation: RestOperation, url: str, headers: dict[str, str], body: Any = None, idempotent: bool = None) -> Tuple[bool, RestResponse]:
+  if operation == RestOperation.GET:
+    method = 'GET'
+  elif operation == RestOperation.POST:
+    method = 'POST'
+  elif operation == RestOperation.PUT:
+    method = 'PUT'
+  else:
+    raise Exception(f'Unrecognized operation type: {operation}')
+
+  if idempotent is None:
+    idempotent = is_rest_idempotent(method, url)
+
+  if operation == RestOperation.GET:
+    response = send_request('rest', method, url, idempotent, headers = headers)
+  else:
+    response = send_request('rest', method, url, idempotent, headers = headers, json = body)
+
+  transfer_stats = record_transfer(response, len(response.content))
+  content = decode_content(response)
+  emit_request_event(response.request_event)
+
+  # Check if the response returned a 200.
+  if response.status_code != 200:
+    error_info = content
+    # For more verbose error messaging, uncomment the following line:
+    #print(error_info)
+    error_message = error_info.get('Message', 'REST call failed. No error message provided.')
+    rest_response = RestResponse(None, error_message)
+    request_success = False
+  else:
+    rest_response = RestResponse(content, None)
+    request_success = True
+
+  rest_response.transfer_stats = transfer_stats
+  return (request_success, rest_response)
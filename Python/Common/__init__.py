@@ -0,0 +1,5 @@
+###########################################################################
+# Shared helpers used by the Platform API sample scripts.
+# The scripts add the parent `Python` directory to `sys.path` so that they
+# can import these modules as `Common.<Module>`.
+###########################################################################
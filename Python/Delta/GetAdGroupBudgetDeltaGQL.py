@@ -2,11 +2,18 @@
 # This script will use `LastChangeTrackingVersion` to retrieve all the budgets of the affected ad groups under an advertiser.
 #############################################################################################################################
 
-from enum import Enum
-import json
-import requests
+from concurrent.futures import ThreadPoolExecutor
+import os
+import sys
 from typing import Any, List, Tuple
 
+# Make the shared helpers in `Python/Common` importable when running this script directly.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from Common import Transport
+from Common.Queries import GET_AD_GROUP_BUDGETS_WITH_CAMPAIGN_VERSION
+from Common.Transport import GqlResponse, RestOperation, RestResponse
+
 ###########
 # Constants
 ###########
@@ -19,12 +26,6 @@ PROD_GQL_URL = 'https://desk.thetradedesk.com/graphql'
 EXTERNAL_SB_REST_URL = 'https://ext-api.sb.thetradedesk.com/v3'
 PROD_REST_URL = 'https://api.thetradedesk.com/v3'
 
-# Represents the REST operation to execute.
-class RestOperation(Enum):
-  GET = 1
-  POST = 2
-  PUT = 3
-
 #############################
 # Variables for YOU to define
 #############################
@@ -51,78 +52,25 @@ target_advertiser_id = 'ADVERTISER_ID_PLACEHOLDER'
 # If set to `None`, the script will update this value to the latest change tracking version.
 last_change_tracking_version = None
 
+# The number of ad group IDs sent with each budget query. Each batch walks its own pages.
+ad_groups_batch_size = 500
+
+# The number of batches queried concurrently. Set to 1 to query the batches one after another.
+max_workers = 4
+
 ################
 # Helper Methods
 ################
 
-# Represents a response from the GQL server.
-class GqlResponse:
-  def __init__(self, data: dict[Any, Any], errors: List[Any]) -> None:
-    # This is where the return data from the GQL operation is stored.
-    self.data = data
-    # This is where any errors from the GQL operation are stored.
-    self.errors = errors
-
 # Executes a GQL request to the specified gql_url, using the provided body definition and associated variables.
 # This indicates if the call was successful and returns the `GqlResponse`.
 def execute_gql_request(body, variables) -> Tuple[bool, GqlResponse]:
-  # Create headers with the authorization token.
-  headers: dict[str, str] = {
-    'TTD-Auth': token
-  }
-
-  # Create a dictionary for the GraphQL request.
-  data: dict[str, Any] = {
-    'query': body,
-    'variables': variables
-  }
-
-  # Send the GraphQL request.
-  response = requests.post(url=gql_url, json=data, headers=headers)
-  content = json.loads(response.content) if len(response.content) > 0 else {}
-
-  if not response.ok:
-    print('GQL request failed!')
-    # For more verbose error messaging, uncomment the following line:
-    #print(response)
-
-  # Parse any data if it exists, otherwise, return an empty dictionary.
-  resp_data = content.get('data', {})
-  # Parse any errors if they exist, otherwise, return an empty error list.
-  errors = content.get('errors', [])
-
-  return (response.ok, GqlResponse(resp_data, errors))
-
-# Represents a response from the REST server.
-class RestResponse:
-  def __init__(self, data: Any, errors: Any) -> None:
-    # This is where the data returned from the REST operation is stored.
-    self.data = data
-    # This is where any errors from the REST operation are stored.
-    self.errors = errors
+  return Transport.execute_gql_request(gql_url, token, body, variables)
 
 # Executes a REST request to the specified `rest_url` using the provided body definition and associated variables.
 # This indicates if the call was successful and returns the `RestResponse`.
-def execute_rest_request(operation: RestOperation, url: str, body: Any) -> Tuple[bool, RestResponse]:
-  if operation == RestOperation.GET:
-    response = requests.get(url, headers = rest_headers)
-  elif operation == RestOperation.POST:
-    response = requests.post(url, headers = rest_headers, json = body)
-  elif operation == RestOperation.PUT:
-    response = requests.put(url, headers = rest_headers, json = body)
-  else:
-    raise Exception(f'Unrecognized operation type: {operation}')
-
-  # Check if the response returned a 200.
-  if response.status_code != 200:
-    error_info = response.json()
-    # For more verbose error messaging, uncomment the following line:
-    #print(error_info)
-    error_message = error_info.get('Message', 'REST call failed. No error message provided.')
-    return (False, RestResponse(None, error_message))
-  else:
-    data = response.json()
-    return (True, RestResponse(data, None))
+def execute_rest_request(operation: RestOperation, url: str, body: Any = None) -> Tuple[bool, RestResponse]:
+  return Transport.execute_rest_request(operation, url, rest_headers, body)
 
 # This calls POST /delta/adgroup/query/advertiser to retrieve delta information for the advertiser.
 def run_delta_query(advertiser_id: str, change_tracking_version: int) -> Any:
@@ -167,37 +115,14 @@ def run_delta_query_get_all(advertiser_id: str, change_tracking_version: int) ->
 
 # A GQL query to retrieve a paginated list of ad group budgets.
 def get_budget_with_campaign_version(ad_groups: List[str], cursor: str) -> Any:
-  # IMPORTANT: Be sure to use double quotes (") instead of single quotes (') for strings.
-  ad_groups = format(ad_groups).replace("'",'"')
-
-  # Construct the GraphQL query dynamically based on cursor availability.
-  after_clause = f'after: "{cursor}",' if cursor else ''
-
-  query = f"""
-  query {{
-    adGroups({after_clause}
-      where: {{ id: {{ in: {ad_groups} }} }}
-    ) {{
-      nodes {{
-        id
-        budget {{
-          currentFlightBudget
-        }}
-        campaign{{
-          budgetMigrationStatus {{
-            currentBudgetingVersion
-          }}
-        }}
-      }}
-      pageInfo{{
-        hasNextPage
-        endCursor
-      }}
-    }}
-  }}"""
+  # Define the variables in the query. The cursor is `None` for the first page.
+  variables: dict[str, Any] = {
+    'adGroupIds': ad_groups,
+    'after': cursor
+  }
 
   # Send the GraphQL request.
-  request_success, response = execute_gql_request(query,{})
+  request_success, response = execute_gql_request(GET_AD_GROUP_BUDGETS_WITH_CAMPAIGN_VERSION, variables)
 
   if not request_success:
     print(response.errors)
@@ -205,6 +130,36 @@ def get_budget_with_campaign_version(ad_groups: List[str], cursor: str) -> Any:
 
   return response.data
 
+# Retrieves the budgets of one batch of ad groups, walking every page of the batch.
+def get_budgets_for_batch(ad_groups: List[str]) -> List[Any]:
+  nodes = []
+  cursor = None
+  has_more_pages = True
+
+  # While there are more pages to query, keep making calls.
+  while has_more_pages:
+    graphql_result = get_budget_with_campaign_version(ad_groups, cursor)
+
+    has_more_pages = graphql_result['adGroups']['pageInfo']['hasNextPage']
+
+    cursor = graphql_result['adGroups']['pageInfo']['endCursor']
+
+    nodes.extend(graphql_result['adGroups']['nodes'])
+
+  return nodes
+
+# Retrieves the budgets of every ad group in batches of `ad_groups_batch_size`, `max_workers` batches at a time.
+# The ad groups are returned in batch order.
+def get_budgets(ad_groups: List[str]) -> List[Any]:
+  batches = [ad_groups[i:i + ad_groups_batch_size] for i in range(0, len(ad_groups), ad_groups_batch_size)]
+
+  # Make sure every worker can hold its own keep-alive connection.
+  if max_workers > Transport.pool_maxsize:
+    Transport.configure_pool(maxsize=max_workers)
+
+  with ThreadPoolExecutor(max_workers=max_workers) as executor:
+    return [node for nodes in executor.map(get_budgets_for_batch, batches) for node in nodes]
+
 ########################################################################################################################
 # Execution Flow:
 #  1. Retrieve updated ad groups with one of the Delta REST endpoints and include the `LastChangeTrackingVersion` value.
@@ -221,32 +176,21 @@ ad_groups, last_change_tracking_version = run_delta_query_get_all(target_adverti
 print('Here are the ad group IDs returned by the delta query:')
 print(ad_groups)
 
-# This is the start of the paginated GraphQL query for retrieving ad group budgets.
-# It is called until there are no more pages left.
-cursor = None
-has_more_pages = True
+# Retrieve the ad group budgets with the paginated GraphQL query, one batch of ad group IDs at a time.
 kokai_adgroup_results = []
 solimar_adgroup_results = []
 
-# While there are more pages to query, keep making calls.
-while has_more_pages:
-  graphql_result = get_budget_with_campaign_version(ad_groups, cursor)
-
-  has_more_pages = graphql_result['adGroups']['pageInfo']['hasNextPage']
+for ad_group in get_budgets(ad_groups):
+  version = ad_group['campaign']['budgetMigrationStatus']['currentBudgetingVersion']
+  ad_group_id = ad_group['id']
+  budget = ad_group['budget']['currentFlightBudget']
 
-  cursor = graphql_result['adGroups']['pageInfo']['endCursor']
-
-  for ad_group in graphql_result['adGroups']['nodes']:
-    version = ad_group['campaign']['budgetMigrationStatus']['currentBudgetingVersion']
-    ad_group_id = ad_group['id']
-    budget = ad_group['budget']['currentFlightBudget']
-
-    # Check the version to verify that it is a Kokai ad group.
-    if version == 'KOKAI':
-      kokai_adgroup_results.append((ad_group_id, budget))
-    else:
-      # If it's not a Kokai ad group, it's a Solimar ad group.
-      solimar_adgroup_results.append((ad_group_id, budget))
+  # Check the version to verify that it is a Kokai ad group.
+  if version == 'KOKAI':
+    kokai_adgroup_results.append((ad_group_id, budget))
+  else:
+    # If it's not a Kokai ad group, it's a Solimar ad group.
+    solimar_adgroup_results.append((ad_group_id, budget))
 
 print('Here are the Kokai ad group budgets:')
 print(kokai_adgroup_results)
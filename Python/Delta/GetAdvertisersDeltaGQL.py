@@ -2,10 +2,19 @@
 # This script will retrieve all advertiser deltas for a partner.
 #################################################################
 
-import json
-import requests
-import time
-from typing import Any, List, Tuple
+import os
+import sys
+
+# Make the shared helpers in `Python/Common` importable when running this script directly.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from Common import Transport
+from Common.Checkpoints import CheckpointStore
+from Common.DeltaEntities import ADVERTISER_DELTA
+from Common.DeltaSync import DeltaSync
+from Common.EntityStore import EntityStore, EntityStoreSink
+from Common.Instrumentation import Instrumentation
+from Common.Sinks import open_file_sink
 
 ###########
 # Constants
@@ -45,155 +54,75 @@ changed_advertisers_list = []
 # Helper Methods
 ################
 
+# If `True`, a per-operation summary of request latencies, payload sizes, status codes and retries is printed at the end of the run.
 show_timings = False
 
-# Represents a response from the GQL server.
-class GqlResponse:
-  def __init__(self, data: dict[Any, Any], errors: List[Any]) -> None:
-    # This is where the return data from the GQL operation is stored.
-    self.data = data
-    # This is where any errors from the GQL operation are stored.
-    self.errors = errors
-
-
-# Executes a GQL request to the specified gql_url, using the provided body definition and associated variables.
-# This indicates if the call was successful and returns the `GqlResponse`.
-def execute_gql_request(body, variables) -> Tuple[bool, GqlResponse]:
-  # Create headers with the authorization token.
-  headers: dict[str, str] = {
-    'TTD-Auth': token
-  }
-
-  # Create a dictionary for the GraphQL request.
-  data: dict[str, Any] = {
-    'query': body,
-    'variables': variables
-  }
-
-  # Send the GraphQL request.
-  response = requests.post(url=gql_url, json=data, headers=headers)
-  content = json.loads(response.content) if len(response.content) > 0 else {}
-
-  if not response.ok:
-    print('GQL request failed!')
-    # For more verbose error messaging, uncomment the following line:
-    # print(response)
-
-  # Parse any data if it exists, otherwise, return an empty dictionary.
-  resp_data = content.get('data', {})
-  # Parse any errors if they exist, otherwise, return an empty error list.
-  errors = content.get('errors', [])
-
-  return (response.ok, GqlResponse(resp_data, errors))
-
-def log_timing(text:str, start_time, end_time) -> str:
-  if show_timings:
-    print(f'{text}: {(end_time - start_time):.2f} seconds')
-
-# A GraphQL query to retrieve the current minimum (earliest) change-tracking version for a partner.
-def get_current_minimum_tracking_version(partner_id: str) -> Any:
-  query = """
-  query GetAdvertisersDeltaMinimumVersion($partnerIds: [ID!]!) {
-    advertiserDelta(
-      input: {
-        changeTrackingVersion: 0
-        ids: $partnerIds
-      }
-    ) {
-      currentMinimumTrackingVersion
-    }
-  }"""
-
-  # Define the variables in the query.
-  variables: dict[str, Any] = {
-    'partnerIds': [partner_id]
-  }
-
-  # Send the GraphQL request.
-  request_success, response = execute_gql_request(query, variables)
-
-  if not request_success:
-    print(response.errors)
-    raise Exception('Failed to retrieve current minimum tracking version.')
-
-  return response.data['advertiserDelta']['currentMinimumTrackingVersion']
-
-
-# A GraphQL query to retrieve the advertisers' delta for the specified partner.
-def get_advertisers_delta(partner_id: str, change_tracking_version: int) -> Any:
-  query = """
-  query GetAdvertisersDelta($changeTrackingVersion: Long!, $partnerIds: [ID!]!) {
-    advertiserDelta(
-      input: {
-        changeTrackingVersion: $changeTrackingVersion
-        ids: $partnerIds
-      }
-    ) {
-      nextChangeTrackingVersion
-      moreAvailable
-      advertisers {
-        id
-        name
-        partner{
-            id
-        }
-        isArchived
-      }
-    }
-  }"""
-
-  # Define the variables in the query.
-  variables: dict[str, Any] = {
-    'changeTrackingVersion': change_tracking_version,
-    'partnerIds': [partner_id]
-  }
-
-  # Send the GraphQL request.
-  request_success, response = execute_gql_request(query, variables)
-
-  if not request_success:
-    print(response.errors)
-    raise Exception('Failed to retrieve advertiser delta.')
-
-  return response.data['advertiserDelta']
+# If set, the per-operation metrics are also written to this JSON file at the end of the run.
+metrics_output_path = None
 
+# The fields selected for each changed entity: 'full' (everything), 'core' (without the heavy nested fields, such as the
+# creatives of ad groups or the audit feedback of creatives) or 'ids-only' (the IDs, the advertiser and whether the entity
+# was archived, which is enough to invalidate caches). See the profiles in `Common/DeltaEntities.py`.
+projection_profile = 'full'
 
-########################################################
-# Execution Flow:
-#  1. Get the minimum (earliest) change-tracking version.
-#  2. Retrieve all the advertiser deltas for the specified partner.
-########################################################
-start_time = time.time()
+# If set, the changed entities are written to this JSON Lines file as each page arrives instead of being collected in
+# the output list. A path ending with `.gz` writes gzip-compressed JSON Lines, and one ending with `.parquet` (or `.arrow`)
+# a columnar file with one typed column per selected field (requires pyarrow). When resuming, the file is appended to,
+# which columnar files do not support.
+output_path = None
 
-# Get the minimum (earliest) change-tracking version if the `starting_minimum_tracking_version` is not specified.
-minimum_tracking_version = get_current_minimum_tracking_version(target_partner_id) if starting_minimum_tracking_version == 0 else starting_minimum_tracking_version
-print(f'Minimum tracking version: {minimum_tracking_version}')
+# If set, the progress of the walk is checkpointed to this SQLite file after every page.
+checkpoint_path = None
 
-i = 0
+# If `True` and the last walk checkpointed to `checkpoint_path` did not complete, it is continued where it stopped
+# instead of starting over. Only the entities retrieved after its checkpoints are returned.
+resume = False
 
-more_available = True
-next_page_minimum_tracking_version = minimum_tracking_version
-print(f'Processing chunk {i}')
-i += 1
-while (more_available):
-  # Get advertisers for this partner.
-  data = get_advertisers_delta(target_partner_id, next_page_minimum_tracking_version)
+# If `True`, every advertiser continues from the watermark (the last version it was walked to) recorded in
+# `checkpoint_path` instead of from `starting_minimum_tracking_version`, which only applies to advertisers without one.
+incremental = False
 
-  for advertiser in data['advertisers']:
-    changed_advertisers_list.append(advertiser)
+# If set, the changed entities are also upserted into this SQLite file, which holds the current state of every entity by
+# ID (archived ones as tombstones) for lookups by ID, advertiser or campaign, see `Common/EntityStore.py`.
+entity_store_path = None
 
-  more_available = data['moreAvailable']
-  next_page_minimum_tracking_version = data['nextChangeTrackingVersion']
+# Collects per-operation metrics for every request sent by this script.
+instrumentation = Instrumentation()
+Transport.add_request_hook(instrumentation.record_request)
 
-  # Captures the maximum (latest) change-tracking version.
-  if not more_available:
-    next_change_tracking_version = data['nextChangeTrackingVersion']
+# The advertisers delta, selecting the fields of `projection_profile`.
+delta_entity = ADVERTISER_DELTA.get_profile(projection_profile)
 
-end_time = time.time()
+# Walks the advertisers delta with the shared delta engine.
+delta_sync = DeltaSync(gql_url, token, delta_entity, instrumentation=instrumentation,
+                       checkpoint_store=CheckpointStore(checkpoint_path) if checkpoint_path else None)
+
+
+########################################################
+# Execution Flow:
+#  1. Get the minimum (earliest) change-tracking version.
+#  2. Retrieve all the advertiser deltas for the specified partner.
+########################################################
+sinks = [open_file_sink(output_path, append=resume, entity=delta_entity)] if output_path else []
+if entity_store_path:
+  sinks.append(EntityStoreSink(EntityStore(entity_store_path), delta_entity))
+try:
+  result = delta_sync.run(target_partner_id, starting_minimum_tracking_version, resume, sinks, collect_records=not output_path, incremental=incremental)
+finally:
+  for sink in sinks:
+    sink.close()
+
+changed_advertisers_list = result.records
+next_change_tracking_version = result.next_change_tracking_version
 
 # Output data.
 print()
 print('Output data:')
 print(f'Next minimum change tracking version: {next_change_tracking_version}')
-print(f'Changed advertiser count: {len(changed_advertisers_list)}')
-log_timing('Total processing time', start_time, end_time)
+print(f'Changed advertiser count: {result.record_count}')
+# Output metrics.
+if show_timings:
+  print()
+  instrumentation.print_summary()
+if metrics_output_path:
+  instrumentation.write_json(metrics_output_path)
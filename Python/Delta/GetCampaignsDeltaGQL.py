@@ -2,10 +2,21 @@
 # This script will retrieve all campaigns delta for a partner.
 #################################################################
 
-import json
-import requests
-import time
-from typing import Any, List, Tuple
+import os
+import sys
+
+# Make the shared helpers in `Python/Common` importable when running this script directly.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from Common import Transport
+from Common.AdaptiveChunking import AdaptiveChunker
+from Common.AdvertiserRoster import AdvertiserRoster
+from Common.Checkpoints import CheckpointStore
+from Common.DeltaEntities import CAMPAIGN_DELTA
+from Common.DeltaSync import DeltaSync
+from Common.EntityStore import EntityStore, EntityStoreSink
+from Common.Instrumentation import Instrumentation
+from Common.Sinks import open_file_sink
 
 ###########
 # Constants
@@ -45,244 +56,107 @@ changed_campaigns_list = []
 # Helper Methods
 ################
 
+# If `True`, a per-operation summary of request latencies, payload sizes, status codes and retries is printed at the end of the run.
 show_timings = False
 
+# If set, the per-operation metrics are also written to this JSON file at the end of the run.
+metrics_output_path = None
+
+# The number of advertiser IDs sent with each delta query.
 advertisers_chunk_size = 100
 
-# Represents a response from the GQL server.
-class GqlResponse:
-  def __init__(self, data: dict[Any, Any], errors: List[Any]) -> None:
-    # This is where the return data from the GQL operation is stored.
-    self.data = data
-    # This is where any errors from the GQL operation are stored.
-    self.errors = errors
-
-
-# Executes a GQL request to the specified gql_url, using the provided body definition and associated variables.
-# This indicates if the call was successful and returns the `GqlResponse`.
-def execute_gql_request(body, variables) -> Tuple[bool, GqlResponse]:
-  # Create headers with the authorization token.
-  headers: dict[str, str] = {
-    'TTD-Auth': token
-  }
-
-  # Create a dictionary for the GraphQL request.
-  data: dict[str, Any] = {
-    'query': body,
-    'variables': variables
-  }
-
-  # Send the GraphQL request.
-  response = requests.post(url=gql_url, json=data, headers=headers)
-  content = json.loads(response.content) if len(response.content) > 0 else {}
-
-  if not response.ok:
-    print('GQL request failed!')
-    # For more verbose error messaging, uncomment the following line:
-    # print(response)
-
-  # Parse any data if it exists, otherwise, return an empty dictionary.
-  resp_data = content.get('data', {})
-  # Parse any errors if they exist, otherwise, return an empty error list.
-  errors = content.get('errors', [])
-
-  return (response.ok, GqlResponse(resp_data, errors))
-
-def log_timing(text:str, start_time, end_time) -> str:
-  if show_timings:
-    print(f'{text}: {(end_time - start_time):.2f} seconds')
-
-# A GQL query to retrieve all advertisers globally.
-def get_all_advertisers(partner_id: str, cursor: str) -> Any:
-  after_clause = f'after: "{cursor}",' if cursor else ''
-
-  query = f"""
-  query GetAdvertisers($partnerId: String!) {{
-    advertisers(
-      where: {{
-        partnerId: {{ eq: $partnerId }}
-      }}
-      {after_clause}
-      first: 1000) {{
-      nodes {{
-        id
-      }}
-      pageInfo {{
-        endCursor
-        hasNextPage
-      }}
-    }}
-  }}"""
-
-  # Define the variables in the query.
-  variables: dict[str, Any] = {
-    'partnerId': partner_id
-  }
-
-  # Send the GraphQL request.
-  request_success, response = execute_gql_request(query,variables)
-
-  if not request_success:
-    print(response.errors)
-    raise Exception('Failed to fetch advertisers.')
-
-  return response.data
-
-
-# A GQL query to retrieve the current minimum (earliest) tracking version for an advertiser.
-def get_current_minimum_tracking_version(advertiser_id: str) -> Any:
-  query = """
-  query GetCampaignsDeltaMinimumVersion($advertiserIds: [ID!]!) {
-    campaignDelta(
-      input: {
-        advertiser: {
-          changeTrackingVersion: 0
-          ids: $advertiserIds
-        }
-      }
-    ) {
-      currentMinimumTrackingVersion
-    }
-  }"""
-
-  # Define the variables in the query.
-  variables: dict[str, Any] = {
-    'advertiserIds': [advertiser_id]
-  }
-
-  # Send the GraphQL request.
-  request_success, response = execute_gql_request(query, variables)
-
-  if not request_success:
-    print(response.errors)
-    raise Exception('Failed to retrieve current minimum tracking version.')
-
-  return response.data['campaignDelta']['currentMinimumTrackingVersion']
-
-
-# A GQL query to retrieve the campaigns delta for an advertiser.
-def get_campaigns_delta(advertiser_ids: list[str], change_tracking_version: int) -> Any:
-  query = """
-  query GetCampaignsDelta($changeTrackingVersion: Long!, $advertiserIds: [ID!]!) {
-    campaignDelta(
-      input: {
-        advertiser: {
-          changeTrackingVersion: $changeTrackingVersion
-          ids: $advertiserIds
-        }
-      }
-    ) {
-      nextChangeTrackingVersion
-      moreAvailable
-      campaigns {
-        advertiser {
-          id
-        }
-        name
-        timeZone
-        timeZoneIANA
-        isArchived
-        createdAtUtc
-        lastUpdatedAtUtc
-        conversionReportingColumns {
-          totalCount
-          nodes {
-            reportingColumnId
-            trackingTag {
-                id
-            }
-          }
-        }
-        budget {
-          total
-        }
-      }
-    }
-  }"""
-
-  # Define the variables in the query.
-  variables: dict[str, Any] = {
-    'changeTrackingVersion': change_tracking_version,
-    'advertiserIds': advertiser_ids
-  }
-
-  # Send the GraphQL request.
-  request_success, response = execute_gql_request(query, variables)
-
-  if not request_success:
-    print(response.errors)
-    raise Exception('Failed to retrieve campaign delta.')
-
-  return response.data['campaignDelta']
+# The number of advertiser chunks walked concurrently. Each chunk still walks its own pages in order.
+# Set to 1 to process the chunks one after another.
+max_workers = 1
 
+# If `True`, `advertisers_chunk_size` is only the starting point: the chunk size is tuned from the observed page
+# latencies, sizes and errors (and kept in `checkpoint_path` for the next run), hot advertisers get chunks of their
+# own, and chunks whose query fails are split in two.
+adaptive_chunking = False
 
-########################################################
-# Execution Flow:
-#  1. Retrieve advertisers IDs (limit to advertisers_chunk_size at a time).
-#  2. Get the minimum (earliest) tracking version.
-#  3. Retrieve all the campaign deltas.
-########################################################
-advertiser_ids = []
-has_next = True
-cursor = None
+# If `True`, each delta page is decoded incrementally as it arrives instead of being buffered and decoded in full, and
+# its records are handed over (written out, stored, ...) in batches while the rest of the page is still being read.
+stream_responses = False
 
-start_time = time.time()
+# The fields selected for each changed entity: 'full' (everything), 'core' (without the heavy nested fields, such as the
+# creatives of ad groups or the audit feedback of creatives) or 'ids-only' (the IDs, the advertiser and whether the entity
+# was archived, which is enough to invalidate caches). See the profiles in `Common/DeltaEntities.py`.
+projection_profile = 'full'
 
-while has_next:
-  print(f"Retrieving advertisers after cursor: {cursor}")
-  advertiser_data = get_all_advertisers(target_partner_id, cursor)
+# If `True`, the conversion reporting columns of a campaign are completed when the delta returns only part of them (fewer nodes
+# than their `totalCount`), with follow-up queries batching up to `connection_batch_size` records each.
+# Off by default, as the delta queries then also select the `totalCount` and `pageInfo` of those connections.
+complete_nested_connections = False
 
-  # Retrieve advertiser IDs.
-  for node in advertiser_data['advertisers']['nodes']:
-    advertiser_ids.append(node['id'])
+# The number of records whose nested connections are completed with each follow-up query.
+connection_batch_size = 50
 
-  # Update pagination information.
-  has_next = advertiser_data['advertisers']['pageInfo']['hasNextPage']
-  cursor = advertiser_data['advertisers']['pageInfo']['endCursor']
+# If set, the changed entities are written to this JSON Lines file as each page arrives instead of being collected in
+# the output list. A path ending with `.gz` writes gzip-compressed JSON Lines, and one ending with `.parquet` (or `.arrow`)
+# a columnar file with one typed column per selected field (requires pyarrow). When resuming, the file is appended to,
+# which columnar files do not support.
+output_path = None
 
-print(f'Number of advertiserIds: {len(advertiser_ids)}')
+# If set, the progress of the walk is checkpointed to this SQLite file after every page.
+checkpoint_path = None
 
-# Get the current minimum (earliest) tracking version if a `starting_minimum_tracking_version` is not specified.
-minimum_tracking_version = get_current_minimum_tracking_version(advertiser_ids[0]) if starting_minimum_tracking_version == 0 else starting_minimum_tracking_version
-print(f'Minimum tracking version: {minimum_tracking_version}')
+# If `True` and the last walk checkpointed to `checkpoint_path` did not complete, it is continued where it stopped
+# instead of starting over. Only the entities retrieved after its checkpoints are returned.
+resume = False
 
-# Retrieve campaigns. Splitting advertisers list into chunks of advertisers_chunk_size.
-advertiser_chunks = [advertiser_ids[i:i + advertisers_chunk_size] for i in range(0, len(advertiser_ids), advertisers_chunk_size)]
+# If `True`, every advertiser continues from the watermark (the last version it was walked to) recorded in
+# `checkpoint_path` instead of from `starting_minimum_tracking_version`, which only applies to advertisers without one.
+incremental = False
 
-i = 0
-first_advertiser = True
-for chunk in advertiser_chunks:
-  more_available = True
-  next_page_minimum_tracking_version = minimum_tracking_version
-  
-  print(f'Processing chunk {i}')
-  chunk_start_time = time.time()
-  i += 1
-  while (more_available):
-  # Retrieve the campaigns for this chunk of advertisers.
-    data = get_campaigns_delta(chunk, next_page_minimum_tracking_version)
+# If set, the partner's advertiser IDs are cached in this SQLite file and brought up to date through `advertiserDelta`
+# (usually a single request) instead of being enumerated 1,000 at a time on every run.
+advertiser_cache_path = None
 
-    for campaign in data['campaigns']:
-      changed_campaigns_list.append(campaign)
+# If set, the changed entities are also upserted into this SQLite file, which holds the current state of every entity by
+# ID (archived ones as tombstones) for lookups by ID, advertiser or campaign, see `Common/EntityStore.py`.
+entity_store_path = None
 
-    more_available = data['moreAvailable']
-    next_page_minimum_tracking_version = data['nextChangeTrackingVersion']
+# Collects per-operation metrics for every request sent by this script.
+instrumentation = Instrumentation()
+Transport.add_request_hook(instrumentation.record_request)
 
-    # Captures the maximum (latest) change-tracking version.
-    # Do this at the end of the first advertiser we finish going through.
-    if not more_available and first_advertiser:
-      next_change_tracking_version = data['nextChangeTrackingVersion']
-      first_advertiser = False
+# The campaigns delta, selecting the fields of `projection_profile`.
+delta_entity = CAMPAIGN_DELTA.get_profile(projection_profile)
 
-  chunk_end_time = time.time()
-  log_timing('Chunk processing time', chunk_start_time, chunk_end_time)
+# Walks the campaigns delta with the shared delta engine.
+delta_sync = DeltaSync(gql_url, token, delta_entity, advertisers_chunk_size, max_workers, stream_responses, instrumentation=instrumentation,
+                       checkpoint_store=CheckpointStore(checkpoint_path) if checkpoint_path else None,
+                       advertiser_roster=AdvertiserRoster(advertiser_cache_path, gql_url, token, instrumentation=instrumentation) if advertiser_cache_path else None,
+                       chunker=AdaptiveChunker(advertisers_chunk_size) if adaptive_chunking else None,
+                       complete_nested_connections=complete_nested_connections, connection_batch_size=connection_batch_size)
 
-# All done.
-end_time = time.time()
+
+########################################################
+# Execution Flow:
+#  1. Retrieve advertisers IDs (limit to advertisers_chunk_size at a time).
+#  2. Get the minimum (earliest) tracking version.
+#  3. Retrieve all the campaign deltas.
+########################################################
+sinks = [open_file_sink(output_path, append=resume, entity=delta_entity)] if output_path else []
+if entity_store_path:
+  sinks.append(EntityStoreSink(EntityStore(entity_store_path), delta_entity))
+try:
+  result = delta_sync.run(target_partner_id, starting_minimum_tracking_version, resume, sinks, collect_records=not output_path, incremental=incremental)
+finally:
+  for sink in sinks:
+    sink.close()
+
+changed_campaigns_list = result.records
+next_change_tracking_version = result.next_change_tracking_version
 
 # Output data.
 print()
 print('Output data:')
 print(f'Next minimum change tracking version: {next_change_tracking_version}')
-print(f'Changed campaigns count: {len(changed_campaigns_list)}')
-log_timing('Total processing time', start_time, end_time)
+print(f'Changed campaigns count: {result.record_count}')
+# Output metrics.
+if show_timings:
+  print()
+  instrumentation.print_summary()
+if metrics_output_path:
+  instrumentation.write_json(metrics_output_path)
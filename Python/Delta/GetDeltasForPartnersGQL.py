@@ -0,0 +1,172 @@
+#################################################################
+# This script will retrieve the delta of an existing entity type
+# (ad groups, campaigns, creatives, ...) for several partners at
+# once, fanning the partners' walks out over a shared pool of
+# workers.
+#################################################################
+
+import os
+import sys
+
+# Make the shared helpers in `Python/Common` importable when running this script directly.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from Common import Transport
+from Common.AdaptiveChunking import AdaptiveChunker
+from Common.AdvertiserRoster import AdvertiserRoster
+from Common.Checkpoints import CheckpointStore
+from Common.DeltaEntities import DELTA_ENTITIES
+from Common.DeltaSync import DeltaSync
+from Common.EntityStore import EntityStore, EntityStoreSink
+from Common.Instrumentation import Instrumentation
+from Common.PartnerFanOut import PartnerFanOut
+from Common.Sinks import open_file_sink
+
+###########
+# Constants
+###########
+
+# Define the GQL Platform API endpoint URLs.
+EXTERNAL_SB_GQL_URL = 'https://ext-api.sb.thetradedesk.com/graphql'
+PROD_GQL_URL = 'https://desk.thetradedesk.com/graphql'
+
+#############################
+# Variables for YOU to define
+#############################
+
+# Define the GraphQL Platform API endpoint URL this script will use.
+gql_url = EXTERNAL_SB_GQL_URL
+
+# Replace the placeholder value with your actual API token.
+token = 'AUTH_TOKEN_PLACEHOLDER'
+
+# Partner IDs to retrive data for.
+target_partner_ids = ['PARTNER_ID_PLACEHOLDER']
+
+# The entity type to retrieve (see `DELTA_ENTITIES`), e.g. 'adGroups', 'campaigns', 'creatives' or 'trackingTags'.
+entity_name = 'adGroups'
+
+# The minimum (earliest) tracking version to start queying with. If 0, the current minimum tracking version will be fetched.
+starting_minimum_tracking_version = 0
+
+#############################
+# Output variables
+#############################
+
+# The tracking version for the next iteration of fetching data, by partner ID.
+next_change_tracking_versions = {}
+
+# The entities that have been updated and should be processed by your system, by partner ID.
+changed_entities_by_partner = {}
+
+################
+# Helper Methods
+################
+
+# If `True`, a per-operation summary of request latencies, payload sizes, status codes and retries is printed at the end of the run.
+show_timings = False
+
+# If set, the per-operation metrics are also written to this JSON file at the end of the run.
+metrics_output_path = None
+
+# The number of advertiser IDs sent with each delta query.
+advertisers_chunk_size = 100
+
+# The number of advertiser chunks walked concurrently, over all partners. Chunks are scheduled round-robin across
+# partners, so a large partner does not hold up the others.
+max_workers = 8
+
+# If set, requests to `gql_url` are limited to this many per second, over all partners and workers.
+requests_per_second = 0
+
+# If `True`, the advertiser chunk size is tuned from the observed page latencies, sizes and errors (and kept in
+# `checkpoint_path` for the next run), hot advertisers get chunks of their own, and chunks whose query fails are split in two.
+adaptive_chunking = False
+
+# If `True`, each delta page is decoded incrementally as it arrives instead of being buffered and decoded in full, and
+# its records are handed over (written out, stored, ...) in batches while the rest of the page is still being read.
+stream_responses = False
+
+# The fields selected for each changed entity: 'full' (everything), 'core' (without the heavy nested fields, such as the
+# creatives of ad groups or the audit feedback of creatives) or 'ids-only' (the IDs, the advertiser and whether the entity
+# was archived, which is enough to invalidate caches). See the profiles in `Common/DeltaEntities.py`.
+projection_profile = 'full'
+
+# If `True`, the nested connections the delta returns only part of (fewer nodes than their `totalCount`), such as the
+# creatives of ad groups or the conversion reporting columns of campaigns, are completed with follow-up queries.
+# Off by default, as the delta queries then also select the `totalCount` and `pageInfo` of those connections.
+complete_nested_connections = False
+
+# If set, the changed entities of every partner are written to this JSON Lines file as each page arrives instead of being collected in
+# the output dictionary. A path ending with `.gz` writes gzip-compressed JSON Lines, and one ending with `.parquet` (or `.arrow`)
+# a columnar file with one typed column per selected field (requires pyarrow). When resuming, the file is appended to,
+# which columnar files do not support.
+output_path = None
+
+# If set, the progress of every partner's walk is checkpointed to this SQLite file after every page.
+checkpoint_path = None
+
+# If `True`, the walks checkpointed to `checkpoint_path` that did not complete are continued where they stopped.
+resume = False
+
+# If `True`, every advertiser continues from the watermark recorded in `checkpoint_path`.
+incremental = False
+
+# If set, the partners' advertiser IDs are cached in this SQLite file and brought up to date through `advertiserDelta`.
+advertiser_cache_path = None
+
+# If set, the changed entities are also upserted into this SQLite file, which holds the current state of every entity by
+# ID (archived ones as tombstones) for lookups by ID, advertiser or campaign, see `Common/EntityStore.py`.
+entity_store_path = None
+
+# Collects per-operation metrics for every request sent by this script.
+instrumentation = Instrumentation()
+Transport.add_request_hook(instrumentation.record_request)
+
+# The requests of every partner draw from the same budget.
+if requests_per_second:
+  Transport.rate_limiter.set_budget(gql_url, requests_per_second)
+
+entity = DELTA_ENTITIES[entity_name].get_profile(projection_profile)
+
+# Creates the delta engine holding the walk of one partner.
+def create_delta_sync() -> DeltaSync:
+  return DeltaSync(gql_url, token, entity, advertisers_chunk_size, stream_responses=stream_responses, instrumentation=instrumentation,
+                   checkpoint_store=CheckpointStore(checkpoint_path) if checkpoint_path else None,
+                   advertiser_roster=AdvertiserRoster(advertiser_cache_path, gql_url, token, instrumentation=instrumentation) if advertiser_cache_path else None,
+                   chunker=AdaptiveChunker(advertisers_chunk_size) if adaptive_chunking else None,
+                   complete_nested_connections=complete_nested_connections)
+
+fan_out = PartnerFanOut(create_delta_sync, max_workers)
+
+
+########################################################
+# Execution Flow:
+#  1. Retrieve the advertiser IDs and the minimum (earliest) tracking version of every partner.
+#  2. Retrieve the deltas of every partner's chunks over a shared pool of workers.
+########################################################
+sinks = [open_file_sink(output_path, append=resume, entity=entity)] if output_path else []
+if entity_store_path:
+  sinks.append(EntityStoreSink(EntityStore(entity_store_path), entity))
+try:
+  results = fan_out.run(target_partner_ids, starting_minimum_tracking_version, resume, sinks, collect_records=not output_path, incremental=incremental)
+finally:
+  for sink in sinks:
+    sink.close()
+
+changed_entities_by_partner = { partner_id: result.records for partner_id, result in results.items() }
+next_change_tracking_versions = { partner_id: result.next_change_tracking_version for partner_id, result in results.items() }
+
+# Output data.
+print()
+print('Output data:')
+for partner_id, result in results.items():
+  print(f'Partner {partner_id}: next minimum change tracking version {result.next_change_tracking_version}, changed {entity_name} count {result.record_count}')
+for partner_id, error in fan_out.errors.items():
+  print(f'Partner {partner_id}: failed: {error}')
+# Output metrics.
+if show_timings:
+  print()
+  instrumentation.print_summary()
+if metrics_output_path:
+  instrumentation.write_json(metrics_output_path)
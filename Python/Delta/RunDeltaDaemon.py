@@ -0,0 +1,163 @@
+#################################################################
+# This script will continuously poll the deltas of a partner.
+#################################################################
+
+import os
+import signal
+import sys
+
+# Make the shared helpers in `Python/Common` importable when running this script directly.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from Common import Transport
+from Common.AdaptiveChunking import AdaptiveChunker
+from Common.AdvertiserRoster import AdvertiserRoster
+from Common.Checkpoints import CheckpointStore
+from Common.DeltaDaemon import DeltaDaemon
+from Common.DeltaEntities import DELTA_ENTITIES
+from Common.DeltaSync import DeltaSync
+from Common.EntityStore import EntityStore, EntityStoreSink
+from Common.Instrumentation import Instrumentation
+from Common.Sinks import open_file_sink
+
+###########
+# Constants
+###########
+
+# Define the GQL Platform API endpoint URLs.
+EXTERNAL_SB_GQL_URL = 'https://ext-api.sb.thetradedesk.com/graphql'
+PROD_GQL_URL = 'https://desk.thetradedesk.com/graphql'
+
+#############################
+# Variables for YOU to define
+#############################
+
+# Define the GraphQL Platform API endpoint URL this script will use.
+gql_url = EXTERNAL_SB_GQL_URL
+
+# Replace the placeholder value with your actual API token.
+token = 'AUTH_TOKEN_PLACEHOLDER'
+
+# Partner ID to retrive data for.
+target_partner_id = 'PARTNER_ID_PLACEHOLDER'
+
+# The entity types to poll (see `DELTA_ENTITIES`), each with the number of seconds between two of its polls.
+poll_intervals_seconds = {
+  'adGroups': 60,
+  'campaigns': 60,
+  'creatives': 300,
+  'trackingTags': 300
+}
+
+# Each poll is delayed by a random number of seconds up to this, so that the entity types do not poll in lockstep.
+poll_jitter_seconds = 10
+
+# The fields selected for each changed entity: 'full' (everything), 'core' (without the heavy nested fields, such as the
+# creatives of ad groups or the audit feedback of creatives) or 'ids-only' (the IDs, the advertiser and whether the entity
+# was archived, which is enough to invalidate caches). See the profiles in `Common/DeltaEntities.py`.
+projection_profile = 'full'
+
+# If `True`, the nested connections the delta returns only part of (fewer nodes than their `totalCount`), such as the
+# creatives of ad groups or the conversion reporting columns of campaigns, are completed with follow-up queries.
+# Off by default, as the delta queries then also select the `totalCount` and `pageInfo` of those connections.
+complete_nested_connections = False
+
+# The changed entities of each entity type are appended to `<entity type>.jsonl` in this directory as each page arrives.
+output_directory = 'delta_output'
+
+# If set, the changed entities of every entity type are also upserted into this SQLite file, which holds their current
+# state by ID (archived ones as tombstones) for lookups by ID, advertiser or campaign, see `Common/EntityStore.py`.
+entity_store_path = None
+
+# If set, every advertiser's watermark is loaded from this SQLite file at startup and written back to it every
+# `checkpoint_interval_seconds` and on shutdown. Without it, a restarted daemon walks every delta from the current
+# minimum tracking version again.
+checkpoint_path = None
+
+# The number of seconds between two checkpoints. The current minimum tracking versions are refreshed at the same time.
+checkpoint_interval_seconds = 300
+
+# If set, the partner's advertiser IDs are cached in this SQLite file and brought up to date through `advertiserDelta`.
+advertiser_cache_path = None
+
+# The number of seconds the partner's advertiser IDs are reused for before being refreshed.
+roster_refresh_seconds = 300
+
+################
+# Helper Methods
+################
+
+# If `True`, a per-operation summary of request latencies, payload sizes, status codes and retries is printed on shutdown.
+show_timings = False
+
+# If set, the per-operation metrics are also written to this JSON file on shutdown.
+metrics_output_path = None
+
+# The number of advertiser IDs sent with each delta query.
+advertisers_chunk_size = 100
+
+# The number of advertiser chunks walked concurrently. Each chunk still walks its own pages in order.
+# Set to 1 to process the chunks one after another.
+max_workers = 1
+
+# If `True`, the advertiser chunk size of each entity type is tuned from the observed page latencies, sizes and errors
+# over the polls, and chunks whose query fails are split in two.
+adaptive_chunking = False
+
+# If `True`, each delta page is decoded incrementally as it arrives instead of being buffered and decoded in full, and
+# its records are handed over (written out, stored, ...) in batches while the rest of the page is still being read.
+stream_responses = False
+
+# Collects per-operation metrics for every request sent by this script.
+instrumentation = Instrumentation()
+Transport.add_request_hook(instrumentation.record_request)
+
+# The advertiser roster is shared by every entity type.
+advertiser_roster = AdvertiserRoster(advertiser_cache_path, gql_url, token, instrumentation=instrumentation) if advertiser_cache_path else None
+
+daemon = DeltaDaemon(target_partner_id, CheckpointStore(checkpoint_path) if checkpoint_path else None, checkpoint_interval_seconds, roster_refresh_seconds)
+
+# Stop after the poll in progress on `SIGTERM`, like on Ctrl+C.
+signal.signal(signal.SIGTERM, lambda signal_number, frame: daemon.stop())
+
+
+########################################################
+# Execution Flow:
+#  1. Retrieve the advertiser IDs and the minimum (earliest) tracking version of every entity type.
+#  2. Poll each entity type whenever it is due, continuing every advertiser from its watermark.
+#  3. Checkpoint the watermarks periodically and on shutdown.
+########################################################
+os.makedirs(output_directory, exist_ok=True)
+
+sinks = []
+try:
+  for entity_name, poll_interval_seconds in poll_intervals_seconds.items():
+    entity = DELTA_ENTITIES[entity_name].get_profile(projection_profile)
+    entity_sinks = [open_file_sink(os.path.join(output_directory, f'{entity_name}.jsonl'), append=True)]
+    if entity_store_path:
+      entity_sinks.append(EntityStoreSink(EntityStore(entity_store_path), entity))
+    sinks.extend(entity_sinks)
+
+    delta_sync = DeltaSync(gql_url, token, entity, advertisers_chunk_size, max_workers, stream_responses, instrumentation=instrumentation, advertiser_roster=advertiser_roster,
+                           chunker=AdaptiveChunker(advertisers_chunk_size) if adaptive_chunking else None,
+                           complete_nested_connections=complete_nested_connections)
+    daemon.add_entity(delta_sync, entity_sinks, poll_interval_seconds, poll_jitter_seconds)
+
+  daemon.run()
+except KeyboardInterrupt:
+  print('Stopping.')
+finally:
+  for sink in sinks:
+    sink.close()
+
+# Output data.
+print()
+print('Output data:')
+for poller in daemon.pollers:
+  print(f'{poller.delta_sync.entity.name}: {poller.record_count} changed in {poller.poll_count} poll(s)')
+# Output metrics.
+if show_timings:
+  print()
+  instrumentation.print_summary()
+if metrics_output_path:
+  instrumentation.write_json(metrics_output_path)
@@ -2,9 +2,15 @@
 # This script outlines how to use GraphQL to configure and download dimension-specific performance reports for advertisers, campaigns, and ad groups from a generated URL.
 ###########################################################################################################################################################################
 
-import json
-import requests
-from typing import Any, List, Tuple
+import os
+import sys
+from typing import Any, Tuple
+
+# Make the shared helpers in `Python/Common` importable when running this script directly.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from Common import Transport
+from Common.Transport import GqlResponse
 
 ###########
 # Constants
@@ -35,48 +41,19 @@ target_advertiser_id = "ADVERTISER_ID_PLACEHOLDER"
 # - If the `target_{entity}_id` value is provided and the `input_report_type` value is not provided, the script will set the `input_report_type` value to `AD_GROUP`.
 input_report_type = "INPUT_REPORT_TYPE_PLACEHOLDER"
 
+# If set, the generated report is downloaded from its URL to this file. It is written out as it arrives, so even a large
+# report is never held in memory.
+report_output_path = None
+
 
 ################
 # Helper Methods
 ################
 
-# Represents a response from the GQL server.
-class GqlResponse:
-    def __init__(self, data: dict[Any, Any], errors: List[Any]) -> None:
-        # This is where return data from the GQL operation is stored.
-        self.data = data
-        # This is where any errors from the GQL operation are stored.
-        self.errors = errors
-
 # Executes a GQL request to the specified gql_url, using the provided body definition and associated variables.
 # This indicates if the call was successful and returns the `GqlResponse`.
 def execute_gql_request(body, variables) -> Tuple[bool, GqlResponse]:
-    # Create headers with the authorization token.
-    headers: dict[str, str] = {
-        'TTD-Auth': token
-    }
-
-    # Create a dictionary for the GraphQL request.
-    data: dict[str, Any] = {
-        'query': body,
-        'variables': variables
-    }
-
-    # Send the GraphQL request.
-    response = requests.post(url=gql_url, json=data, headers=headers)
-    content = json.loads(response.content) if len(response.content) > 0 else {}
-
-    if not response.ok:
-        print('GQL request failed!')
-        # For more verbose error messaging, uncomment the following line:
-        #print(response)
-
-    # Parse any data if it exists, otherwise, return an empty dictionary.
-    resp_data = content.get('data', {})
-    # Parse any errors if they exist, otherwise, return an empty error list.
-    errors = content.get('errors', [])
-
-    return (response.ok, GqlResponse(resp_data, errors))
+    return Transport.execute_gql_request(gql_url, token, body, variables)
 
 # Executes the mutation to download the report.
 def execute_report( report_type: str, entity_id: str, entity_type: str ) -> Tuple[bool, GqlResponse]:
@@ -160,4 +137,12 @@ if not request_success:
     raise Exception('Could not execute the report.')
 else:
     print("Success executing the report.")
-    print(response.data)
\ No newline at end of file
+    print(response.data)
+
+    # Download the report from the generated URL.
+    report_data = next(iter(response.data.values()))['data']
+    if report_output_path and report_data is not None and report_data['url']:
+        download_success, transfer_stats = Transport.download_file(report_data['url'], report_output_path, operation='Report download')
+        if not download_success:
+            raise Exception('Could not download the report.')
+        print(f'Downloaded the report to {report_output_path} ({transfer_stats.response_bytes} bytes).')
\ No newline at end of file
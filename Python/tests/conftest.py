@@ -0,0 +1,135 @@
+###################################################################################
+# Shared fixtures of the tests.
+# `fake_server` serves canned responses from a local HTTP server, so that the
+# transport is exercised end to end, and `FakeDeltaApi` answers the delta queries
+# of a walk (advertisers, minimum versions and delta pages) with generated records.
+###################################################################################
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import os
+import re
+import sys
+import threading
+from typing import Any, Callable, List, Optional, Tuple
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Common import Transport
+from Common.CircuitBreaker import CircuitBreakers
+from Common.RateLimiter import RateLimiter
+from Common.Retry import RetryPolicy
+from Common.Transport import GqlResponse
+
+# A local HTTP server answering every request with `handler(method, path, body)`, which returns a
+# (status code, payload, headers) tuple; a payload that is not bytes is sent as JSON.
+class FakeServer:
+  def __init__(self) -> None:
+    self.handler: Callable[[str, str, bytes], Tuple[int, Any, dict[str, str]]] = lambda method, path, body: (200, {}, {})
+    # The (method, path, body) of every request received.
+    self.requests: List[Tuple[str, str, bytes]] = []
+    self._lock = threading.Lock()
+
+    server = self
+    class RequestHandler(BaseHTTPRequestHandler):
+      protocol_version = 'HTTP/1.1'
+
+      def log_message(self, *args) -> None:
+        pass
+
+      def do_POST(self) -> None:
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        with server._lock:
+          server.requests.append((self.command, self.path, body))
+        status_code, payload, headers = server.handler(self.command, self.path, body)
+        content = payload if isinstance(payload, bytes) else json.dumps(payload).encode('utf-8')
+
+        self.send_response(status_code)
+        for name, value in (headers or {}).items():
+          self.send_header(name, value)
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+      do_GET = do_POST
+      do_PUT = do_POST
+
+    self._server = ThreadingHTTPServer(('127.0.0.1', 0), RequestHandler)
+    # The base URL of the server.
+    self.url = f'http://127.0.0.1:{self._server.server_address[1]}'
+    threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+  def close(self) -> None:
+    self._server.shutdown()
+    self._server.server_close()
+
+# Answers the queries of delta walks: every partner has the given advertisers, and every chunk of advertisers has
+# `pages` pages of `records_per_page` records from `minimum_tracking_version` on. Pages are versioned one apart, and
+# each record belongs to an advertiser of its chunk.
+class FakeDeltaApi:
+  def __init__(self, advertiser_ids: List[str], pages: int = 2, records_per_page: int = 2, minimum_tracking_version: int = 100) -> None:
+    self.advertiser_ids = advertiser_ids
+    self.pages = pages
+    self.records_per_page = records_per_page
+    self.minimum_tracking_version = minimum_tracking_version
+    # If set, the delta queries whose variables it returns `True` for fail with a GQL error and no data.
+    self.fail_when: Optional[Callable[[dict[str, Any]], bool]] = None
+    # The variables of every delta page query received.
+    self.delta_queries: List[dict[str, Any]] = []
+    self._lock = threading.Lock()
+
+  # Returns the response payload of a GQL document with its variables.
+  def get_payload(self, document: str, variables: dict[str, Any]) -> Any:
+    if 'advertisers(' in document:
+      return { 'data': { 'advertisers': { 'nodes': [{ 'id': id } for id in self.advertiser_ids], 'pageInfo': { 'endCursor': None, 'hasNextPage': False } } } }
+
+    root_field = re.search(r'\b([a-z]\w*Delta)\s*\(', document).group(1)
+    if 'currentMinimumTrackingVersion' in document:
+      return { 'data': { root_field: { 'currentMinimumTrackingVersion': self.minimum_tracking_version } } }
+
+    version = variables['changeTrackingVersion']
+    page_index = version - self.minimum_tracking_version
+    data = { 'nextChangeTrackingVersion': version + 1, 'moreAvailable': page_index + 1 < self.pages }
+    items_key = re.search(r'moreAvailable\s+(\w+)\s*\{', document)
+    if items_key is None:
+      # The latest-version walk selects no entities.
+      return { 'data': { root_field: data } }
+
+    with self._lock:
+      self.delta_queries.append(variables)
+    if self.fail_when is not None and self.fail_when(variables):
+      return { 'data': None, 'errors': [{ 'message': 'The query is too complex.' }] }
+
+    scope_ids = variables.get('advertiserIds') or variables.get('partnerIds')
+    data[items_key.group(1)] = [{ 'id': f'{scope_ids[j % len(scope_ids)]}-{version}-{j}', 'advertiser': { 'id': scope_ids[j % len(scope_ids)] }, 'isArchived': False }
+                                for j in range(self.records_per_page)]
+    return { 'data': { root_field: data } }
+
+  # Stands in for `Transport.execute_gql_request`.
+  def execute_gql_request(self, gql_url: str, token: str, body: Any, variables: dict[str, Any], idempotent: bool = None) -> Tuple[bool, GqlResponse]:
+    payload = self.get_payload(getattr(body, 'document', body), variables)
+    return (True, GqlResponse(payload.get('data'), payload.get('errors', [])))
+
+  # Serves the queries over HTTP, as the handler of a `FakeServer`.
+  def handle_request(self, method: str, path: str, body: bytes) -> Tuple[int, Any, dict[str, str]]:
+    request = json.loads(body)
+    return (200, self.get_payload(request['query'], request.get('variables') or {}), {})
+
+# Restores the transport's module state around each test: retries without delays, no rate limits, fresh circuit
+# breakers and fresh sessions.
+@pytest.fixture(autouse=True)
+def transport(monkeypatch):
+  monkeypatch.setattr(Transport, 'retry_policy', RetryPolicy(base_delay_seconds=0, max_delay_seconds=0))
+  monkeypatch.setattr(Transport, 'rate_limiter', RateLimiter())
+  monkeypatch.setattr(Transport, 'circuit_breakers', CircuitBreakers())
+  Transport.close_sessions()
+  yield Transport
+  Transport.close_sessions()
+
+@pytest.fixture
+def fake_server():
+  server = FakeServer()
+  yield server
+  server.close()
@@ -0,0 +1,159 @@
+import pytest
+import requests
+
+from Common import Transport
+from Common.AdaptiveChunking import AdaptiveChunker
+from Common.Checkpoints import CheckpointStore
+from Common.CircuitBreaker import CircuitOpenError
+from Common.DeltaEntities import CAMPAIGN_DELTA
+from Common.DeltaSync import DeltaSync
+
+from conftest import FakeDeltaApi
+
+@pytest.fixture
+def api(monkeypatch):
+  api = FakeDeltaApi(['a1', 'a2', 'a3', 'a4'], pages=2, records_per_page=2)
+  monkeypatch.setattr(Transport, 'execute_gql_request', api.execute_gql_request)
+  return api
+
+def test_should_split_query_errors_and_read_timeouts_only():
+  chunker = AdaptiveChunker()
+
+  assert chunker.should_split(Exception('Failed to retrieve campaigns delta.'))
+  assert chunker.should_split(requests.exceptions.ReadTimeout())
+  assert not chunker.should_split(requests.exceptions.ConnectionError())
+  assert not chunker.should_split(CircuitOpenError('https://api.example.com', 10))
+  assert not chunker.should_split(KeyError('campaigns'))
+
+def test_split_halves_the_chunk():
+  chunker = AdaptiveChunker()
+
+  assert chunker.split(['a1', 'a2', 'a3', 'a4', 'a5']) == [['a1', 'a2'], ['a3', 'a4', 'a5']]
+
+def test_make_chunks_isolates_active_advertisers():
+  chunker = AdaptiveChunker(initial_size=3, target_records_per_chunk=100)
+  chunker.activity = { 'hot': 150, 'warm1': 60, 'warm2': 50 }
+
+  chunks = chunker.make_chunks(['idle1', 'warm1', 'idle2', 'hot', 'warm2', 'idle3', 'idle4'])
+
+  assert chunks == [['hot'], ['warm1', 'warm2'], ['idle1', 'idle2', 'idle3'], ['idle4']]
+
+def test_slow_or_failed_pages_halve_the_chunk_size():
+  chunker = AdaptiveChunker(initial_size=100, min_size=10, target_page_seconds=5)
+
+  chunker.observe_page(100, 8, 500, 1000)
+  assert chunker.chunk_size == 50
+  chunker.observe_page(100, 1, 0, 0, failed=True)
+  assert chunker.chunk_size == 50
+  chunker.observe_page(50, 1, 0, 0, failed=True)
+  assert chunker.chunk_size == 25
+  # Chunks smaller than twice the minimum are not halved, so the size never drops below it.
+  for _ in range(5):
+    chunker.observe_page(chunker.chunk_size, 1, 0, 0, failed=True)
+  assert chunker.chunk_size == 12
+
+def test_hill_climb_reverses_when_throughput_drops():
+  chunker = AdaptiveChunker(initial_size=100, step=1.25, window=2)
+
+  for _ in range(2):
+    chunker.observe_page(100, 1, 1000, 0)
+  assert chunker.chunk_size == 125
+
+  # Pages of the larger size are slower, so the next step goes back down.
+  for _ in range(2):
+    chunker.observe_page(125, 2, 1000, 0)
+  assert chunker.chunk_size == 100
+
+  # Smaller chunks do not measure the current size.
+  chunker.observe_page(30, 0.1, 1000, 0)
+  assert chunker._samples == []
+
+def test_observe_chunk_smooths_activity():
+  chunker = AdaptiveChunker()
+  counts = {}
+  chunker.count_records([{ 'advertiser': { 'id': 'a1' } }, { 'advertiser': { 'id': 'a1' } }, { 'id': 'x' }], counts)
+  assert counts == { 'a1': 2 }
+
+  chunker.observe_chunk(['a1', 'a2'], counts)
+  chunker.observe_chunk(['a1', 'a2'], { 'a1': 6 })
+
+  assert chunker.activity == { 'a1': 3.5, 'a2': 0 }
+
+def test_failing_chunks_are_split_until_their_queries_succeed(api):
+  api.fail_when = lambda variables: len(variables['advertiserIds']) > 1
+  delta_sync = DeltaSync('https://api.example.com/graphql', 'token', CAMPAIGN_DELTA, chunker=AdaptiveChunker(initial_size=4, min_size=1))
+
+  pages = list(delta_sync.iter_pages('p1'))
+
+  assert [page.scope_ids for page in pages] == [['a1'], ['a1'], ['a2'], ['a2'], ['a3'], ['a3'], ['a4'], ['a4']]
+  assert sorted(record['advertiser']['id'] for page in pages for record in page.records) == ['a1'] * 4 + ['a2'] * 4 + ['a3'] * 4 + ['a4'] * 4
+  # The first page of the first part carries every split that led to it; each other part carries its own.
+  assert [(scope_ids, parts) for scope_ids, parts, _ in pages[0].splits] == [(['a1', 'a2', 'a3', 'a4'], [['a1', 'a2'], ['a3', 'a4']]), (['a1', 'a2'], [['a1'], ['a2']])]
+  assert [(scope_ids, parts) for scope_ids, parts, _ in pages[4].splits] == [(['a3', 'a4'], [['a3'], ['a4']])]
+  assert all(len(page.splits) == 0 for page in pages[1:4] + pages[5:])
+  assert delta_sync.next_change_tracking_version == 102
+
+def test_chunk_failing_part_way_is_split_from_the_failed_page(api):
+  api.fail_when = lambda variables: len(variables['advertiserIds']) > 2 and variables['changeTrackingVersion'] == 101
+  delta_sync = DeltaSync('https://api.example.com/graphql', 'token', CAMPAIGN_DELTA, chunker=AdaptiveChunker(initial_size=4, min_size=1))
+
+  pages = list(delta_sync.iter_pages('p1'))
+
+  assert [(page.scope_ids, page.change_tracking_version) for page in pages] == [(['a1', 'a2', 'a3', 'a4'], 100), (['a1', 'a2'], 101), (['a3', 'a4'], 101)]
+  assert [split[2] for split in pages[1].splits] == [101]
+
+def test_errors_that_should_not_split_fail_the_walk(api, monkeypatch):
+  def execute_gql_request(*args, **kwargs):
+    raise requests.exceptions.ConnectionError('Connection refused.')
+  delta_sync = DeltaSync('https://api.example.com/graphql', 'token', CAMPAIGN_DELTA, chunker=AdaptiveChunker(initial_size=4, min_size=1))
+  delta_sync.plan_chunks('p1')
+  monkeypatch.setattr(Transport, 'execute_gql_request', execute_gql_request)
+
+  with pytest.raises(requests.exceptions.ConnectionError):
+    list(delta_sync.walk_chunks([(0, ['a1', 'a2', 'a3', 'a4'], 100)]))
+
+def test_single_advertiser_chunk_that_fails_is_not_split(api):
+  api.fail_when = lambda variables: 'a2' in variables['advertiserIds']
+  delta_sync = DeltaSync('https://api.example.com/graphql', 'token', CAMPAIGN_DELTA, chunker=AdaptiveChunker(initial_size=4, min_size=1))
+
+  with pytest.raises(Exception, match='Failed to retrieve campaigns delta.'):
+    list(delta_sync.iter_pages('p1'))
+
+def test_splits_are_checkpointed_and_resumed(api, tmp_path):
+  store = CheckpointStore(str(tmp_path / 'checkpoints.db'))
+  api.fail_when = lambda variables: len(variables['advertiserIds']) > 2
+  create_delta_sync = lambda: DeltaSync('https://api.example.com/graphql', 'token', CAMPAIGN_DELTA, checkpoint_store=store, chunker=AdaptiveChunker(initial_size=4, min_size=1))
+
+  # Process the first page of the first part only.
+  pages = create_delta_sync().iter_pages('p1')
+  next(pages)
+  next(pages)
+  pages.close()
+
+  assert [(checkpoint.scope_ids, checkpoint.change_tracking_version, checkpoint.completed) for checkpoint in store.get_chunk_checkpoints('p1', 'campaigns')] == \
+    [(['a1', 'a2'], 101, False), (['a3', 'a4'], 100, False)]
+
+  api.delta_queries.clear()
+  result = create_delta_sync().run('p1', resume=True)
+
+  # The resumed walk continues each part on its own, without querying the whole chunk again.
+  assert [(variables['advertiserIds'], variables['changeTrackingVersion']) for variables in api.delta_queries] == \
+    [(['a1', 'a2'], 101), (['a3', 'a4'], 100), (['a3', 'a4'], 101)]
+  assert result.record_count == 6
+  assert store.get_completed_version('p1', 'campaigns') == 102
+
+def test_resumed_part_that_is_split_again_keeps_its_place(monkeypatch, tmp_path):
+  api = FakeDeltaApi(['a1', 'a2', 'a3', 'a4', 'a5'], pages=2, records_per_page=2)
+  api.fail_when = lambda variables: len(variables['advertiserIds']) > 1
+  monkeypatch.setattr(Transport, 'execute_gql_request', api.execute_gql_request)
+  store = CheckpointStore(str(tmp_path / 'checkpoints.db'))
+  # A walk that split its first chunk and completed the first part only.
+  store.start_run('p1', 'campaigns', 100, [(['a1', 'a2', 'a3', 'a4'], 100), (['a5'], 100)])
+  store.split_chunk('p1', 'campaigns', 0, ['a1', 'a2', 'a3', 'a4'], [['a1', 'a2'], ['a3', 'a4']], 100)
+  store.save_chunk_checkpoint('p1', 'campaigns', ['a1', 'a2'], 102, True)
+
+  DeltaSync('https://api.example.com/graphql', 'token', CAMPAIGN_DELTA, checkpoint_store=store, chunker=AdaptiveChunker(initial_size=4, min_size=1)).run('p1', resume=True)
+
+  assert [(checkpoint.chunk_index, checkpoint.scope_ids) for checkpoint in store.get_chunk_checkpoints('p1', 'campaigns')] == \
+    [(0, ['a1', 'a2']), (0, ['a3']), (0, ['a4']), (1, ['a5'])]
+  assert store.get_completed_version('p1', 'campaigns') == 102
@@ -0,0 +1,105 @@
+import re
+import threading
+
+from Common.Batching import GqlBatcher, GqlLookupError
+from Common.Transport import GqlResponse
+
+# Looks up campaigns by ID from `campaigns`, reporting unknown IDs as errors on their alias like the API does.
+class FakeCampaignApi:
+  def __init__(self, campaigns: dict) -> None:
+    self.campaigns = campaigns
+    # The variables of every document received.
+    self.requests = []
+    self._lock = threading.Lock()
+
+  def execute(self, document: str, variables: dict) -> tuple:
+    with self._lock:
+      self.requests.append(variables)
+
+    data = {}
+    errors = []
+    for alias, variable in re.findall(r'(e\d+): campaign\(id: \$(id\d+)\)', document):
+      campaign = self.campaigns.get(variables[variable])
+      data[alias] = campaign
+      if campaign is None:
+        errors.append({ 'message': f'Campaign {variables[variable]} was not found.', 'path': [alias] })
+    return (True, GqlResponse(data, errors))
+
+def test_document_aliases_each_lookup():
+  batcher = GqlBatcher(lambda document, variables: None, 'campaign', 'id name')
+
+  document = batcher.get_document(2)
+
+  assert document == 'query Batch_campaign($id0: ID!, $id1: ID!) {\n  e0: campaign(id: $id0) { id name }\n  e1: campaign(id: $id1) { id name }\n}'
+  assert batcher.get_document(2) is document
+
+def test_load_many_sends_one_document_per_batch():
+  api = FakeCampaignApi({ str(i): { 'id': str(i) } for i in range(250) })
+  batcher = GqlBatcher(api.execute, 'campaign', 'id', max_batch_size=100)
+
+  results = batcher.load_many([str(i) for i in range(250)] + ['0', '1'])
+
+  assert results == { str(i): { 'id': str(i) } for i in range(250) }
+  assert [len(variables) for variables in api.requests] == [100, 100, 50]
+
+def test_load_many_fails_only_the_lookups_whose_alias_has_errors():
+  api = FakeCampaignApi({ 'a': { 'id': 'a' }, 'c': { 'id': 'c' } })
+  batcher = GqlBatcher(api.execute, 'campaign', 'id')
+
+  results = batcher.load_many(['a', 'b', 'c'])
+
+  assert results['a'] == { 'id': 'a' }
+  assert results['c'] == { 'id': 'c' }
+  assert isinstance(results['b'], GqlLookupError)
+  assert results['b'].errors == [{ 'message': 'Campaign b was not found.', 'path': ['e1'] }]
+
+def test_missing_entity_without_an_error_resolves_to_none():
+  batcher = GqlBatcher(lambda document, variables: (True, GqlResponse({ 'e0': { 'id': 'a' }, 'e1': None }, [])), 'campaign', 'id')
+
+  assert batcher.load_many(['a', 'b']) == { 'a': { 'id': 'a' }, 'b': None }
+
+def test_errors_without_a_path_do_not_fail_the_lookups_that_returned_data():
+  response = GqlResponse({ 'e0': { 'id': 'a' }, 'e1': None }, [{ 'message': 'The query is deprecated.' }])
+  batcher = GqlBatcher(lambda document, variables: (True, response), 'campaign', 'id')
+
+  assert batcher.load_many(['a', 'b']) == { 'a': { 'id': 'a' }, 'b': None }
+
+def test_failed_request_fails_every_lookup_without_data():
+  response = GqlResponse({}, [{ 'message': 'Unauthorized' }])
+  batcher = GqlBatcher(lambda document, variables: (False, response), 'campaign', 'id')
+
+  results = batcher.load_many(['a', 'b'])
+
+  assert all(isinstance(result, Exception) and not isinstance(result, GqlLookupError) and 'Unauthorized' in str(result) for result in results.values())
+
+def test_raised_errors_fail_every_lookup_of_the_batch():
+  error = ConnectionError('Connection reset.')
+  def execute(document, variables):
+    raise error
+  batcher = GqlBatcher(execute, 'campaign', 'id')
+
+  assert batcher.load_many(['a', 'b']) == { 'a': error, 'b': error }
+
+def test_loads_within_the_window_are_coalesced():
+  api = FakeCampaignApi({ str(i): { 'id': str(i) } for i in range(5) })
+  batcher = GqlBatcher(api.execute, 'campaign', 'id', window_seconds=0.05)
+
+  futures = [batcher.load(str(i)) for i in range(5)]
+
+  assert [future.result(timeout=5) for future in futures] == [{ 'id': str(i) } for i in range(5)]
+  assert len(api.requests) == 1
+
+def test_full_batch_is_sent_without_waiting_for_the_window():
+  api = FakeCampaignApi({ str(i): { 'id': str(i) } for i in range(3) })
+  batcher = GqlBatcher(api.execute, 'campaign', 'id', max_batch_size=2, window_seconds=60)
+
+  first = batcher.load('0')
+  second = batcher.load('1')
+  assert first.result(timeout=5) == { 'id': '0' }
+  assert second.result(timeout=5) == { 'id': '1' }
+
+  third = batcher.load('2')
+  assert not third.done()
+  batcher.flush()
+  assert third.result(timeout=5) == { 'id': '2' }
+  assert len(api.requests) == 2
@@ -0,0 +1,123 @@
+import itertools
+
+import pytest
+
+from Common import Transport
+from Common.Checkpoints import CheckpointStore
+from Common.DeltaEntities import CAMPAIGN_DELTA
+from Common.DeltaSync import DeltaSync
+from Common.Sinks import CallbackSink
+
+from conftest import FakeDeltaApi
+
+@pytest.fixture
+def store(tmp_path):
+  return CheckpointStore(str(tmp_path / 'checkpoints.db'))
+
+@pytest.fixture
+def api(monkeypatch):
+  # Two chunks of two advertisers, with three pages each.
+  api = FakeDeltaApi(['a1', 'a2', 'a3', 'a4'], pages=3, records_per_page=2)
+  monkeypatch.setattr(Transport, 'execute_gql_request', api.execute_gql_request)
+  return api
+
+def create_delta_sync(store: CheckpointStore) -> DeltaSync:
+  return DeltaSync('https://api.example.com/graphql', 'token', CAMPAIGN_DELTA, advertisers_chunk_size=2, checkpoint_store=store)
+
+def test_run_lifecycle(store):
+  store.start_run('p1', 'campaigns', 100, [(['a1', 'a2'], 100), (['a3'], 105)])
+
+  assert store.get_incomplete_run('p1', 'campaigns') == 100
+  assert store.get_incomplete_run('p1', 'adGroups') is None
+  assert [(checkpoint.scope_ids, checkpoint.change_tracking_version, checkpoint.completed) for checkpoint in store.get_chunk_checkpoints('p1', 'campaigns')] == \
+    [(['a1', 'a2'], 100, False), (['a3'], 105, False)]
+
+  store.save_chunk_checkpoint('p1', 'campaigns', ['a1', 'a2'], 110, True)
+  store.save_chunk_checkpoint('p1', 'campaigns', ['a3'], 107, False)
+  assert [(checkpoint.change_tracking_version, checkpoint.completed) for checkpoint in store.get_chunk_checkpoints('p1', 'campaigns')] == [(110, True), (107, False)]
+  assert store.get_watermarks('p1', 'campaigns') == { 'a1': 110, 'a2': 110, 'a3': 107 }
+
+  store.complete_run('p1', 'campaigns', 108)
+  assert store.get_incomplete_run('p1', 'campaigns') is None
+  assert store.get_completed_version('p1', 'campaigns') == 108
+
+def test_new_run_discards_the_chunks_of_the_previous_one(store):
+  store.start_run('p1', 'campaigns', 100, [(['a1'], 100), (['a2'], 100)])
+  store.start_run('p1', 'campaigns', 200, [(['a3'], 200)])
+
+  assert [checkpoint.scope_ids for checkpoint in store.get_chunk_checkpoints('p1', 'campaigns')] == [['a3']]
+
+def test_split_chunk_replaces_it_by_its_parts_in_place(store):
+  store.start_run('p1', 'campaigns', 100, [(['a1', 'a2', 'a3', 'a4'], 100), (['a5'], 100)])
+
+  store.split_chunk('p1', 'campaigns', 0, ['a1', 'a2', 'a3', 'a4'], [['a1', 'a2'], ['a3', 'a4']], 102)
+
+  assert [(checkpoint.scope_ids, checkpoint.change_tracking_version) for checkpoint in store.get_chunk_checkpoints('p1', 'campaigns')] == \
+    [(['a1', 'a2'], 102), (['a3', 'a4'], 102), (['a5'], 100)]
+
+def test_tuning_state_is_kept_per_partner_and_entity(store):
+  store.save_activity('p1', 'campaigns', { 'a1': 3.5 })
+  store.save_chunk_size('p1', 'campaigns', 40)
+  store.save_watermarks('p1', 'campaigns', { 'a1': 120 })
+
+  assert store.get_activity('p1', 'campaigns') == { 'a1': 3.5 }
+  assert store.get_chunk_size('p1', 'campaigns') == 40
+  assert store.get_chunk_size('p2', 'campaigns') is None
+  assert store.get_watermarks('p1', 'adGroups') == {}
+
+def test_interrupted_walk_resumes_from_its_checkpoints(store, api):
+  walked = []
+  pages = create_delta_sync(store).iter_pages('p1')
+  # Process the three pages of the first chunk and the first page of the second; the page after those is retrieved
+  # but never processed.
+  for page in itertools.islice(pages, 5):
+    walked.append((page.scope_ids, page.change_tracking_version))
+  pages.close()
+  assert walked == [(['a1', 'a2'], 100), (['a1', 'a2'], 101), (['a1', 'a2'], 102), (['a3', 'a4'], 100), (['a3', 'a4'], 101)]
+  assert store.get_incomplete_run('p1', 'campaigns') == 100
+
+  api.delta_queries.clear()
+  result = create_delta_sync(store).run('p1', resume=True)
+
+  # Only the page that was not processed and the ones after it are retrieved again.
+  assert [(variables['advertiserIds'], variables['changeTrackingVersion']) for variables in api.delta_queries] == [(['a3', 'a4'], 101), (['a3', 'a4'], 102)]
+  assert [record['id'] for record in result.records] == ['a3-101-0', 'a4-101-1', 'a3-102-0', 'a4-102-1']
+  assert result.minimum_tracking_version == 100
+  assert result.next_change_tracking_version == 103
+  assert store.get_incomplete_run('p1', 'campaigns') is None
+  assert store.get_completed_version('p1', 'campaigns') == 103
+
+def test_pages_are_checkpointed_only_once_every_sink_has_consumed_them(store, api):
+  def fail_on_second_chunk(records):
+    if records[0]['advertiser']['id'] == 'a3':
+      raise Exception('The sink is full.')
+
+  with pytest.raises(Exception, match='The sink is full.'):
+    create_delta_sync(store).run('p1', sinks=[CallbackSink(fail_on_second_chunk)])
+
+  assert [(checkpoint.change_tracking_version, checkpoint.completed) for checkpoint in store.get_chunk_checkpoints('p1', 'campaigns')] == [(103, True), (100, False)]
+
+def test_resume_without_an_incomplete_walk_starts_a_new_one(store, api):
+  create_delta_sync(store).run('p1')
+  api.delta_queries.clear()
+
+  result = create_delta_sync(store).run('p1', resume=True)
+
+  assert len(api.delta_queries) == 6
+  assert result.record_count == 12
+
+def test_resumed_walk_with_every_chunk_completed_only_completes_the_run(store, api):
+  pages = create_delta_sync(store).iter_pages('p1')
+  for _ in pages:
+    pass
+  # Simulate a walk that died after its last page was checkpointed but before the run was completed.
+  store.start_run('p1', 'campaigns', 100, [(['a1', 'a2'], 100), (['a3', 'a4'], 100)])
+  store.save_chunk_checkpoint('p1', 'campaigns', ['a1', 'a2'], 103, True)
+  store.save_chunk_checkpoint('p1', 'campaigns', ['a3', 'a4'], 103, True)
+  api.delta_queries.clear()
+
+  result = create_delta_sync(store).run('p1', resume=True)
+
+  assert api.delta_queries == []
+  assert result.record_count == 0
+  assert store.get_completed_version('p1', 'campaigns') == 103
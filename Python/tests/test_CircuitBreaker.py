@@ -0,0 +1,98 @@
+import time
+
+import pytest
+
+from Common import Transport
+from Common.CircuitBreaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitBreakers, CircuitOpenError
+from Common.Retry import RetryPolicy
+
+def test_breaker_opens_after_consecutive_failures():
+  breaker = CircuitBreaker('https://api.example.com', failure_threshold=3, reset_timeout_seconds=30)
+
+  for _ in range(2):
+    breaker.before_request()
+    breaker.record_failure()
+  assert breaker.state == CLOSED
+
+  breaker.before_request()
+  breaker.record_failure()
+  assert breaker.state == OPEN
+  with pytest.raises(CircuitOpenError) as error:
+    breaker.before_request()
+  assert 0 < error.value.retry_in_seconds <= 30
+
+def test_success_resets_the_failure_count():
+  breaker = CircuitBreaker('https://api.example.com', failure_threshold=2)
+
+  breaker.record_failure()
+  breaker.record_success()
+  breaker.record_failure()
+
+  assert breaker.state == CLOSED
+
+def test_breaker_lets_a_probe_through_once_the_timeout_has_passed():
+  breaker = CircuitBreaker('https://api.example.com', failure_threshold=1, reset_timeout_seconds=0.05)
+  breaker.record_failure()
+  time.sleep(0.06)
+
+  breaker.before_request()
+  assert breaker.state == HALF_OPEN
+  # Only one probe is allowed in flight.
+  with pytest.raises(CircuitOpenError):
+    breaker.before_request()
+
+  breaker.record_success()
+  assert breaker.state == CLOSED
+  breaker.before_request()
+
+def test_failed_probe_reopens_the_breaker():
+  breaker = CircuitBreaker('https://api.example.com', failure_threshold=3, reset_timeout_seconds=0.05)
+  for _ in range(3):
+    breaker.record_failure()
+  time.sleep(0.06)
+
+  breaker.before_request()
+  breaker.record_failure()
+
+  assert breaker.state == OPEN
+  with pytest.raises(CircuitOpenError):
+    breaker.before_request()
+
+def test_breakers_are_kept_per_base_url():
+  breakers = CircuitBreakers(failure_threshold=1)
+
+  assert breakers.get_breaker('https://a.example.com') is breakers.get_breaker('https://a.example.com')
+  assert breakers.get_breaker('https://a.example.com') is not breakers.get_breaker('https://b.example.com')
+  assert CircuitBreakers(failure_threshold=0).get_breaker('https://a.example.com') is None
+
+  breakers.get_breaker('https://a.example.com').record_failure()
+  breakers.reset()
+  assert breakers.get_breaker('https://a.example.com').state == CLOSED
+
+def test_throttling_does_not_count_as_a_failure():
+  breakers = CircuitBreakers()
+
+  assert breakers.is_failure(503)
+  assert not breakers.is_failure(429)
+  assert not breakers.is_failure(400)
+
+def test_open_breaker_fails_requests_without_sending_them(fake_server, monkeypatch):
+  monkeypatch.setattr(Transport, 'retry_policy', RetryPolicy(max_attempts=1))
+  monkeypatch.setattr(Transport, 'circuit_breakers', CircuitBreakers(failure_threshold=2))
+  fake_server.handler = lambda method, path, body: (502, {}, {})
+
+  for _ in range(2):
+    request_success, _ = Transport.execute_gql_request(fake_server.url, 'token', 'query { partners { totalCount } }', {})
+    assert not request_success
+
+  with pytest.raises(CircuitOpenError):
+    Transport.execute_gql_request(fake_server.url, 'token', 'query { partners { totalCount } }', {})
+  assert len(fake_server.requests) == 2
+
+def test_retries_stop_once_the_breaker_opens(fake_server, monkeypatch):
+  monkeypatch.setattr(Transport, 'circuit_breakers', CircuitBreakers(failure_threshold=3))
+  fake_server.handler = lambda method, path, body: (503, {}, {})
+
+  with pytest.raises(CircuitOpenError):
+    Transport.execute_gql_request(fake_server.url, 'token', 'query { partners { totalCount } }', {})
+  assert len(fake_server.requests) == 3
@@ -0,0 +1,109 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from Common import Transport
+from Common.DeltaEntities import CAMPAIGN_DELTA
+from Common.DeltaSync import DeltaSync
+from Common.EntityStore import EntityStore, EntityStoreSink, merge_records
+
+from conftest import FakeDeltaApi
+
+@pytest.fixture
+def store(tmp_path):
+  store = EntityStore(str(tmp_path / 'entities.db'))
+  yield store
+  store.close()
+
+def campaign(id: str, advertiser_id: str = 'a1', **fields) -> dict:
+  return { 'id': id, 'advertiser': { 'id': advertiser_id }, **fields }
+
+def test_merge_records_merges_nested_objects_and_replaces_the_rest():
+  stored = { 'id': '1', 'name': 'Old', 'budget': { 'total': 10, 'currency': 'USD' }, 'tags': ['a', 'b'] }
+
+  merged = merge_records(stored, { 'id': '1', 'budget': { 'total': 20 }, 'tags': ['c'] })
+
+  assert merged == { 'id': '1', 'name': 'Old', 'budget': { 'total': 20, 'currency': 'USD' }, 'tags': ['c'] }
+  assert stored['budget'] == { 'total': 10, 'currency': 'USD' }
+
+def test_upsert_folds_changes_into_the_current_state(store):
+  store.upsert('campaigns', [campaign('c1', name='First'), campaign('c2', name='Second')], 100)
+  store.upsert('campaigns', [campaign('c1', name='Renamed')], 101)
+
+  assert store.get('campaigns', 'c1')['name'] == 'Renamed'
+  assert store.get('campaigns', 'c2')['name'] == 'Second'
+  assert store.get('campaigns', 'c3') is None
+  assert store.count('campaigns') == 2
+
+def test_older_pages_do_not_revert_newer_state(store):
+  store.upsert('campaigns', [campaign('c1', name='New')], 105)
+  store.upsert('campaigns', [campaign('c1', name='Old')], 100)
+
+  assert store.get('campaigns', 'c1')['name'] == 'New'
+
+def test_slimmer_records_keep_the_fields_they_do_not_select(store):
+  store.upsert('campaigns', [campaign('c1', name='Full', timeZone='UTC', budget={ 'total': 10, 'currency': 'USD' })], 100)
+  store.upsert('campaigns', [{ 'id': 'c1', 'isArchived': False, 'budget': { 'total': 20 } }], 101)
+
+  assert store.get('campaigns', 'c1') == campaign('c1', name='Full', timeZone='UTC', budget={ 'total': 20, 'currency': 'USD' }, isArchived=False)
+
+def test_record_listed_twice_on_a_page_keeps_its_latest_state(store):
+  store.upsert('campaigns', [campaign('c1', name='Stored', timeZone='UTC')], 100)
+
+  store.upsert('campaigns', [campaign('c1', name='First'), { 'id': 'c1', 'timeZone': 'CET' }], 101)
+
+  assert store.get('campaigns', 'c1') == campaign('c1', name='First', timeZone='CET')
+
+def test_archived_entities_are_kept_as_tombstones(store):
+  store.upsert('campaigns', [campaign('c1'), campaign('c2')], 100)
+  store.upsert('campaigns', [campaign('c1', isArchived=True)], 102)
+
+  assert store.get('campaigns', 'c1') is None
+  assert store.get('campaigns', 'c1', include_archived=True)['isArchived']
+  assert store.count('campaigns') == 1
+  assert store.count('campaigns', include_archived=True) == 2
+  assert store.get_archived_ids('campaigns') == ['c1']
+  assert store.get_archived_ids('campaigns', since_version=103) == []
+
+def test_lookups_by_advertiser_and_campaign(store):
+  store.upsert('campaigns', [campaign('c1', 'a1'), campaign('c2', 'a1'), campaign('c3', 'a2')], 100)
+  store.upsert('adGroups', [{ 'id': 'g1', 'advertiser': { 'id': 'a1' }, 'campaign': { 'id': 'c1' } }, { 'id': 'g2', 'campaign': { 'id': 'c2' } }], 100)
+
+  assert sorted(record['id'] for record in store.get_by_advertiser('campaigns', 'a1')) == ['c1', 'c2']
+  assert [record['id'] for record in store.get_by_campaign('adGroups', 'c1')] == ['g1']
+  assert sorted(record['id'] for record in store.get_many('campaigns', ['c1', 'c3', 'c9'])) == ['c1', 'c3']
+  assert store.get('adGroups', 'c1') is None
+
+def test_records_without_an_id_are_skipped(store):
+  assert store.upsert('campaigns', [campaign('c1'), { 'name': 'No ID' }], 100) == 1
+  assert store.count('campaigns') == 1
+
+def test_concurrent_upserts_merge_every_field(tmp_path):
+  store = EntityStore(str(tmp_path / 'entities.db'))
+  store.upsert('campaigns', [campaign(f'c{i}') for i in range(50)], 100)
+
+  # Each thread sets its own field of every campaign; none may overwrite another's.
+  def upsert_field(field: str) -> None:
+    thread_store = EntityStore(store.path)
+    try:
+      thread_store.upsert('campaigns', [{ 'id': f'c{i}', field: True } for i in range(50)], 100)
+    finally:
+      thread_store.close()
+
+  with ThreadPoolExecutor(max_workers=4) as executor:
+    list(executor.map(upsert_field, ['f0', 'f1', 'f2', 'f3']))
+
+  assert all(all(record.get(field) for field in ('f0', 'f1', 'f2', 'f3')) for record in store.get_many('campaigns', [f'c{i}' for i in range(50)]))
+  store.close()
+
+def test_sink_upserts_every_page_of_a_walk(store, monkeypatch):
+  api = FakeDeltaApi(['a1', 'a2'], pages=2, records_per_page=3)
+  monkeypatch.setattr(Transport, 'execute_gql_request', api.execute_gql_request)
+  delta_sync = DeltaSync('https://api.example.com/graphql', 'token', CAMPAIGN_DELTA)
+
+  delta_sync.run('p1', sinks=[EntityStoreSink(store, CAMPAIGN_DELTA)], collect_records=False)
+
+  assert store.count('campaigns') == 6
+  assert sorted(record['id'] for record in store.get_by_advertiser('campaigns', 'a2')) == ['a2-100-1', 'a2-101-1']
+  with pytest.raises(Exception, match='need whole pages'):
+    EntityStoreSink(store, CAMPAIGN_DELTA).write_records([campaign('c1')])
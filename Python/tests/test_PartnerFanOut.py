@@ -0,0 +1,98 @@
+import pytest
+
+from Common import Transport
+from Common.Checkpoints import CheckpointStore
+from Common.DeltaEntities import CAMPAIGN_DELTA
+from Common.DeltaSync import DeltaSync
+from Common.PartnerFanOut import PartnerFanOut
+from Common.Transport import GqlResponse
+
+from conftest import FakeDeltaApi
+
+# The advertisers of each partner. Partner `p3` cannot be accessed.
+ADVERTISER_IDS = { 'p1': ['a1', 'a2', 'a3', 'a4'], 'p2': ['b1', 'b2'] }
+
+@pytest.fixture
+def api(monkeypatch):
+  api = FakeDeltaApi([], pages=2, records_per_page=2)
+
+  def execute_gql_request(gql_url, token, body, variables, idempotent=None):
+    if 'partnerId' in variables:
+      if variables['partnerId'] not in ADVERTISER_IDS:
+        return (False, GqlResponse({}, [{ 'message': 'Forbidden' }]))
+      advertisers = { 'nodes': [{ 'id': id } for id in ADVERTISER_IDS[variables['partnerId']]], 'pageInfo': { 'endCursor': None, 'hasNextPage': False } }
+      return (True, GqlResponse({ 'advertisers': advertisers }, []))
+    return api.execute_gql_request(gql_url, token, body, variables, idempotent)
+
+  monkeypatch.setattr(Transport, 'execute_gql_request', execute_gql_request)
+  return api
+
+def create_fan_out(max_workers: int = 1, checkpoint_store: CheckpointStore = None) -> PartnerFanOut:
+  return PartnerFanOut(lambda: DeltaSync('https://api.example.com/graphql', 'token', CAMPAIGN_DELTA, advertisers_chunk_size=2, checkpoint_store=checkpoint_store), max_workers)
+
+def test_every_partner_is_walked(api):
+  results = create_fan_out(max_workers=4).run(['p1', 'p2'])
+
+  assert results['p1'].record_count == 8
+  assert results['p2'].record_count == 4
+  assert sorted(record['advertiser']['id'] for record in results['p2'].records) == ['b1', 'b1', 'b2', 'b2']
+  assert results['p1'].next_change_tracking_version == results['p2'].next_change_tracking_version == 102
+
+def test_chunks_are_scheduled_round_robin_across_partners(api):
+  pages = list(create_fan_out().iter_pages(['p1', 'p2']))
+
+  # The first chunk of every partner comes before the second chunk of any.
+  assert [(partner_id, page.scope_ids, page.change_tracking_version) for partner_id, page in pages] == [
+    ('p1', ['a1', 'a2'], 100), ('p1', ['a1', 'a2'], 101),
+    ('p2', ['b1', 'b2'], 100), ('p2', ['b1', 'b2'], 101),
+    ('p1', ['a3', 'a4'], 100), ('p1', ['a3', 'a4'], 101),
+  ]
+
+def test_partner_that_fails_to_start_does_not_stop_the_others(api):
+  fan_out = create_fan_out(max_workers=2)
+
+  results = fan_out.run(['p1', 'p3', 'p2'])
+
+  assert sorted(results) == ['p1', 'p2']
+  assert list(fan_out.errors) == ['p3']
+  assert str(fan_out.errors['p3']) == 'Failed to fetch advertisers.'
+
+def test_partner_that_fails_part_way_does_not_stop_the_others(api):
+  api.fail_when = lambda variables: 'a3' in variables['advertiserIds'] and variables['changeTrackingVersion'] == 101
+  fan_out = create_fan_out(max_workers=2)
+
+  results = fan_out.run(['p1', 'p2'])
+
+  assert list(results) == ['p2']
+  assert results['p2'].record_count == 4
+  assert str(fan_out.errors['p1']) == 'Failed to retrieve campaigns delta.'
+
+def test_each_partner_is_checkpointed_and_completed_on_its_own(api, tmp_path):
+  store = CheckpointStore(str(tmp_path / 'checkpoints.db'))
+  api.fail_when = lambda variables: 'a3' in variables['advertiserIds'] and variables['changeTrackingVersion'] == 101
+
+  create_fan_out(max_workers=2, checkpoint_store=store).run(['p1', 'p2'])
+
+  assert store.get_completed_version('p2', 'campaigns') == 102
+  assert store.get_incomplete_run('p1', 'campaigns') == 100
+  assert [(checkpoint.change_tracking_version, checkpoint.completed) for checkpoint in store.get_chunk_checkpoints('p1', 'campaigns')] == [(102, True), (101, False)]
+
+  # Resuming only walks what the failed partner has left.
+  api.fail_when = None
+  api.delta_queries.clear()
+  results = create_fan_out(checkpoint_store=store).run(['p1'], resume=True)
+
+  assert [(variables['advertiserIds'], variables['changeTrackingVersion']) for variables in api.delta_queries] == [(['a3', 'a4'], 101)]
+  assert results['p1'].record_count == 2
+  assert store.get_completed_version('p1', 'campaigns') == 102
+
+def test_resumed_partner_with_no_chunks_left_completes(api, tmp_path):
+  store = CheckpointStore(str(tmp_path / 'checkpoints.db'))
+  store.start_run('p2', 'campaigns', 100, [(['b1', 'b2'], 100)])
+  store.save_chunk_checkpoint('p2', 'campaigns', ['b1', 'b2'], 102, True)
+
+  results = create_fan_out(checkpoint_store=store).run(['p2'], resume=True)
+
+  assert api.delta_queries == []
+  assert results['p2'].next_change_tracking_version == 102
+  assert store.get_completed_version('p2', 'campaigns') == 102
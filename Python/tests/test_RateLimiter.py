@@ -0,0 +1,69 @@
+import time
+
+from Common import Transport
+from Common.RateLimiter import RateLimiter, SqliteTokenBucket, TokenBucket
+
+def test_token_bucket_allows_a_burst_then_waits_for_a_refill():
+  bucket = TokenBucket(rate_per_second=10, burst=3)
+
+  assert [bucket.try_acquire() for _ in range(3)] == [0, 0, 0]
+  wait = bucket.try_acquire()
+  assert 0 < wait <= 0.1
+
+  time.sleep(wait + 0.01)
+  assert bucket.try_acquire() == 0
+
+def test_token_bucket_burst_defaults_to_the_rate():
+  assert TokenBucket(rate_per_second=5).burst == 5
+  assert TokenBucket(rate_per_second=0.5).burst == 1
+
+def test_token_bucket_acquire_blocks_to_the_rate():
+  bucket = TokenBucket(rate_per_second=20, burst=1)
+
+  start_time = time.monotonic()
+  for _ in range(5):
+    bucket.acquire()
+
+  # The first token is available right away, the other four take 1/20s each.
+  assert time.monotonic() - start_time >= 0.19
+
+def test_sqlite_token_buckets_share_the_budget(tmp_path):
+  path = str(tmp_path / 'budgets.db')
+  first = SqliteTokenBucket(path, 'gql', rate_per_second=1, burst=2)
+  second = SqliteTokenBucket(path, 'gql', rate_per_second=1, burst=2)
+  other = SqliteTokenBucket(path, 'rest', rate_per_second=1, burst=2)
+
+  assert first.try_acquire() == 0
+  assert second.try_acquire() == 0
+  assert first.try_acquire() > 0
+  assert second.try_acquire() > 0
+  assert other.try_acquire() == 0
+
+def test_rate_limiter_uses_the_longest_matching_prefix():
+  limiter = RateLimiter()
+  limiter.set_budget('https://api.example.com/v3', 10)
+  limiter.set_budget('https://api.example.com/v3/adgroup', 2)
+
+  assert limiter.get_bucket('https://api.example.com/v3/campaign').rate_per_second == 10
+  assert limiter.get_bucket('https://api.example.com/v3/adgroup/query/campaign').rate_per_second == 2
+  assert limiter.get_bucket('https://other.example.com/graphql') is None
+
+  limiter.remove_budget('https://api.example.com/v3/adgroup')
+  assert limiter.get_bucket('https://api.example.com/v3/adgroup').rate_per_second == 10
+
+def test_rate_limiter_with_a_state_path_uses_shared_buckets(tmp_path):
+  limiter = RateLimiter(str(tmp_path / 'budgets.db'))
+  limiter.set_budget('https://api.example.com', 5)
+
+  assert isinstance(limiter.get_bucket('https://api.example.com/graphql'), SqliteTokenBucket)
+
+def test_requests_wait_for_the_budget_of_their_endpoint(fake_server):
+  Transport.rate_limiter.set_budget(fake_server.url, rate_per_second=20, burst=1)
+  fake_server.handler = lambda method, path, body: (200, { 'data': {} }, {})
+
+  start_time = time.monotonic()
+  for _ in range(4):
+    Transport.execute_gql_request(fake_server.url, 'token', 'query { partners { totalCount } }', {})
+
+  assert time.monotonic() - start_time >= 0.14
+  assert len(fake_server.requests) == 4
@@ -0,0 +1,110 @@
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+import pytest
+import requests
+
+from Common import Transport
+from Common.Retry import RetryPolicy, is_gql_mutation, is_rest_idempotent, parse_retry_after
+
+def test_should_retry_transient_status_codes_of_idempotent_requests():
+  policy = RetryPolicy()
+  for status_code in (429, 500, 502, 503, 504):
+    assert policy.should_retry(1, True, status_code=status_code)
+  for status_code in (200, 400, 401, 404):
+    assert not policy.should_retry(1, True, status_code=status_code)
+
+def test_should_retry_only_unprocessed_responses_of_non_idempotent_requests():
+  policy = RetryPolicy()
+  assert policy.should_retry(1, False, status_code=429)
+  for status_code in (500, 502, 503, 504):
+    assert not policy.should_retry(1, False, status_code=status_code)
+
+def test_should_retry_connection_errors():
+  policy = RetryPolicy()
+  assert policy.should_retry(1, False, error=requests.exceptions.ConnectTimeout())
+  assert policy.should_retry(1, True, error=requests.exceptions.ReadTimeout())
+  assert not policy.should_retry(1, False, error=requests.exceptions.ReadTimeout())
+  assert policy.should_retry(1, True, error=requests.exceptions.ConnectionError())
+  assert not policy.should_retry(1, False, error=requests.exceptions.ConnectionError())
+
+def test_should_retry_stops_after_max_attempts():
+  policy = RetryPolicy(max_attempts=3)
+  assert policy.should_retry(2, True, status_code=503)
+  assert not policy.should_retry(3, True, status_code=503)
+  assert not policy.should_retry(3, False, error=requests.exceptions.ConnectTimeout())
+
+def test_get_delay_uses_full_jitter_below_the_exponential_ceiling():
+  policy = RetryPolicy(base_delay_seconds=0.5, max_delay_seconds=3)
+  for attempt, ceiling in ((1, 0.5), (2, 1), (3, 2), (4, 3), (10, 3)):
+    delays = [policy.get_delay(attempt) for _ in range(200)]
+    assert all(0 <= delay <= ceiling for delay in delays)
+
+def test_get_delay_honors_retry_after_up_to_the_maximum():
+  policy = RetryPolicy(max_delay_seconds=10)
+  assert policy.get_delay(1, retry_after=4) == 4
+  assert policy.get_delay(1, retry_after=60) == 10
+
+def test_parse_retry_after():
+  assert parse_retry_after(None) is None
+  assert parse_retry_after('') is None
+  assert parse_retry_after('7') == 7
+  assert parse_retry_after('soon') is None
+  assert 25 < parse_retry_after(format_datetime(datetime.now(timezone.utc) + timedelta(seconds=30), usegmt=True)) <= 30
+  assert parse_retry_after(format_datetime(datetime.now(timezone.utc) - timedelta(seconds=30), usegmt=True)) == 0
+
+def test_is_gql_mutation():
+  assert is_gql_mutation('mutation { campaignCreate { id } }')
+  assert is_gql_mutation('# Creates a campaign.\n  mutation CreateCampaign { campaignCreate { id } }')
+  assert not is_gql_mutation('query { campaign(id: "1") { id } }')
+  assert not is_gql_mutation('{ campaign(id: "1") { id } }')
+
+def test_is_rest_idempotent():
+  assert is_rest_idempotent('GET', 'https://api.example.com/v3/campaign/1')
+  assert is_rest_idempotent('PUT', 'https://api.example.com/v3/campaign')
+  assert is_rest_idempotent('POST', 'https://api.example.com/v3/campaign/query/advertiser')
+  assert not is_rest_idempotent('POST', 'https://api.example.com/v3/campaign')
+
+def test_queries_are_retried_until_they_succeed(fake_server):
+  responses = [(503, {}, {}), (502, {}, {}), (200, { 'data': { 'campaign': { 'id': '1' } } }, {})]
+  fake_server.handler = lambda method, path, body: responses.pop(0)
+
+  request_success, response = Transport.execute_gql_request(fake_server.url, 'token', 'query { campaign(id: "1") { id } }', {})
+
+  assert request_success
+  assert response.data == { 'campaign': { 'id': '1' } }
+  assert len(fake_server.requests) == 3
+
+def test_mutations_are_not_resent_after_a_server_error(fake_server):
+  fake_server.handler = lambda method, path, body: (503, { 'errors': [{ 'message': 'Unavailable' }] }, {})
+
+  request_success, response = Transport.execute_gql_request(fake_server.url, 'token', 'mutation { campaignArchive(input: { id: "1" }) { id } }', {})
+
+  assert not request_success
+  assert response.errors == [{ 'message': 'Unavailable' }]
+  assert len(fake_server.requests) == 1
+
+def test_throttled_mutations_are_resent(fake_server):
+  responses = [(429, {}, { 'Retry-After': '0' }), (200, { 'data': { 'campaignArchive': { 'id': '1' } } }, {})]
+  fake_server.handler = lambda method, path, body: responses.pop(0)
+
+  request_success, _ = Transport.execute_gql_request(fake_server.url, 'token', 'mutation { campaignArchive(input: { id: "1" }) { id } }', {})
+
+  assert request_success
+  assert len(fake_server.requests) == 2
+
+def test_retries_give_up_after_max_attempts(fake_server, monkeypatch):
+  monkeypatch.setattr(Transport, 'retry_policy', RetryPolicy(max_attempts=3, base_delay_seconds=0))
+  fake_server.handler = lambda method, path, body: (500, {}, {})
+
+  request_success, _ = Transport.execute_gql_request(fake_server.url, 'token', 'query { campaign(id: "1") { id } }', {})
+
+  assert not request_success
+  assert len(fake_server.requests) == 3
+
+def test_connection_errors_are_raised_once_the_attempts_are_exhausted(monkeypatch):
+  monkeypatch.setattr(Transport, 'retry_policy', RetryPolicy(max_attempts=2, base_delay_seconds=0))
+
+  # Nothing listens on the discard port.
+  with pytest.raises(requests.exceptions.ConnectionError):
+    Transport.execute_gql_request('http://127.0.0.1:9', 'token', 'query { campaign(id: "1") { id } }', {})
@@ -0,0 +1,115 @@
+import json
+
+import pytest
+
+from Common.DeltaDaemon import DeltaDaemon
+from Common.DeltaEntities import CAMPAIGN_DELTA
+from Common.DeltaSync import DeltaSync
+from Common.Sinks import CallbackSink
+from Common.Streaming import dumps, iter_array_items, loads
+
+from conftest import FakeDeltaApi
+
+ITEMS = [
+  { 'id': '1', 'name': 'Quotes " and \\ backslashes', 'tags': ['a', 'b'] },
+  { 'id': '2', 'name': 'Brackets ] } [ { and commas, inside strings', 'nested': { 'items': [{ 'x': 1 }, { 'x': [2, 3] }] } },
+  { 'id': '3', 'name': 'Unicode é中', 'empty': {}, 'none': None },
+]
+
+DOCUMENT = json.dumps({
+  'data': { 'campaignDelta': { 'nextChangeTrackingVersion': 42, 'campaigns': ITEMS, 'moreAvailable': True } },
+  'errors': [{ 'message': 'A [warning], with "quotes".' }],
+}).encode('utf-8')
+
+# Returns the document split into chunks of `size` bytes.
+def split(document: bytes, size: int) -> list:
+  return [document[i:i + size] for i in range(0, len(document), size)]
+
+def decode(chunks: list, items_path: str = 'data.campaignDelta.campaigns') -> tuple:
+  completed = []
+  items = list(iter_array_items(chunks, items_path, completed.append))
+  return (items, completed[0])
+
+@pytest.mark.parametrize('chunk_size', [1, 2, 3, 7, 64, len(DOCUMENT)])
+def test_items_are_decoded_whatever_the_chunk_boundaries(chunk_size):
+  items, remainder = decode(split(DOCUMENT, chunk_size))
+
+  assert items == ITEMS
+  assert remainder == {
+    'data': { 'campaignDelta': { 'nextChangeTrackingVersion': 42, 'campaigns': [], 'moreAvailable': True } },
+    'errors': [{ 'message': 'A [warning], with "quotes".' }],
+  }
+
+def test_only_the_array_at_the_path_is_streamed():
+  document = json.dumps({ 'data': { 'other': { 'campaigns': [{ 'id': 'x' }] }, 'campaignDelta': { 'campaigns': [{ 'id': 'y' }] } } }).encode('utf-8')
+
+  items, remainder = decode(split(document, 5))
+
+  assert items == [{ 'id': 'y' }]
+  assert remainder == { 'data': { 'other': { 'campaigns': [{ 'id': 'x' }] }, 'campaignDelta': { 'campaigns': [] } } }
+
+def test_empty_array_yields_no_items():
+  items, remainder = decode([b'{"data": {"campaignDelta": {"campaigns": [ ], "moreAvailable": false}}}'])
+
+  assert items == []
+  assert remainder == { 'data': { 'campaignDelta': { 'campaigns': [], 'moreAvailable': False } } }
+
+def test_null_data_completes_with_the_errors():
+  items, remainder = decode(split(b'{"data": null, "errors": [{"message": "The query is too complex."}]}', 4))
+
+  assert items == []
+  assert remainder == { 'data': None, 'errors': [{ 'message': 'The query is too complex.' }] }
+
+def test_empty_document_completes_with_an_empty_object():
+  assert decode([]) == ([], {})
+
+def test_dumps_and_loads_round_trip():
+  for item in ITEMS:
+    assert loads(dumps(item)) == item
+  assert loads(dumps(ITEMS).decode('utf-8')) == ITEMS
+
+def test_streamed_walk_hands_over_records_in_partial_pages(fake_server):
+  api = FakeDeltaApi(['a1', 'a2'], pages=2, records_per_page=5)
+  fake_server.handler = api.handle_request
+  delta_sync = DeltaSync(fake_server.url, 'token', CAMPAIGN_DELTA, stream_responses=True, stream_batch_size=2)
+
+  pages = list(delta_sync.iter_pages('p1'))
+
+  assert [(len(page.records), page.partial) for page in pages] == [(2, True), (2, True), (1, False), (2, True), (2, True), (1, False)]
+  assert [record['id'] for page in pages for record in page.records] == [f'{("a1", "a2")[j % 2]}-{version}-{j}' for version in (100, 101) for j in range(5)]
+  # Partial pages do not move the walk forward; the page they belong to does.
+  assert [page.next_change_tracking_version for page in pages] == [100, 100, 101, 101, 101, 102]
+  assert delta_sync.next_change_tracking_version == 102
+
+def test_streamed_walk_matches_a_buffered_one(fake_server):
+  api = FakeDeltaApi(['a1', 'a2', 'a3'], pages=3, records_per_page=7)
+  fake_server.handler = api.handle_request
+
+  streamed = DeltaSync(fake_server.url, 'token', CAMPAIGN_DELTA, stream_responses=True, stream_batch_size=3).run('p1')
+  buffered = DeltaSync(fake_server.url, 'token', CAMPAIGN_DELTA).run('p1')
+
+  assert streamed.records == buffered.records
+  assert streamed.record_count == 21
+  assert streamed.next_change_tracking_version == buffered.next_change_tracking_version == 103
+
+def test_partial_pages_do_not_move_the_daemon_watermarks(fake_server):
+  api = FakeDeltaApi(['a1', 'a2'], pages=2, records_per_page=5)
+  fake_server.handler = api.handle_request
+  daemon = DeltaDaemon('p1')
+  # The watermarks as each batch of records is handed over, i.e. after the pages before it.
+  watermarks = []
+  poller = daemon.add_entity(DeltaSync(fake_server.url, 'token', CAMPAIGN_DELTA, stream_responses=True, stream_batch_size=2), [CallbackSink(lambda records: watermarks.append(dict(poller.watermarks)))])
+  poller.minimum_tracking_version = 100
+
+  assert daemon.poll(poller) == 10
+  assert watermarks == [{}, {}, {}, { 'a1': 101, 'a2': 101 }, { 'a1': 101, 'a2': 101 }, { 'a1': 101, 'a2': 101 }]
+  assert poller.watermarks == { 'a1': 102, 'a2': 102 }
+
+def test_streamed_page_with_null_data_fails(fake_server):
+  api = FakeDeltaApi(['a1'])
+  api.fail_when = lambda variables: True
+  fake_server.handler = api.handle_request
+  delta_sync = DeltaSync(fake_server.url, 'token', CAMPAIGN_DELTA, stream_responses=True)
+
+  with pytest.raises(Exception, match='Failed to retrieve campaigns delta.'):
+    delta_sync.run('p1')
@@ -0,0 +1,21 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from Common import Transport
+
+def test_configure_pool_resizes_live_sessions_without_closing_them(fake_server, monkeypatch):
+  monkeypatch.setattr(Transport, 'pool_maxsize', Transport.pool_maxsize)
+  fake_server.handler = lambda method, path, body: (200, { 'data': { 'partners': { 'totalCount': 1 } } }, {})
+  session = Transport.get_session('gql', fake_server.url)
+
+  # Resize the pool while requests are in flight on the session.
+  def execute(index: int) -> bool:
+    if index == 10:
+      Transport.configure_pool(maxsize=40)
+    request_success, _ = Transport.execute_gql_request(fake_server.url, 'token', 'query { partners { totalCount } }', {})
+    return request_success
+
+  with ThreadPoolExecutor(max_workers=8) as executor:
+    assert all(executor.map(execute, range(40)))
+
+  assert Transport.get_session('gql', fake_server.url) is session
+  assert session.get_adapter(fake_server.url)._pool_maxsize == 40